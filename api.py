@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from config import get_secret
+from query import PRICE_CEILING, SORTS, catalog_version, get_facets, get_products
+
+# Headless JSON API over the catalog for other services:
+#   GET /products  get_products filters and sort (deal|price|newest) -> {"products": [...]}
+#   GET /facets    same filters -> counts per category, tag and price bucket
+#   GET /search    AI search (intent, products, recommendations)
+# Catalog reads carry an ETag derived from the catalog version and the query,
+# so clients revalidating with If-None-Match get a 304 without a DB query.
+# Each worker process keeps one engine (config.engine) and its pool for all
+# requests; blocking queries run in Starlette's threadpool.
+
+API_WORKERS = int(get_secret("API_WORKERS", 4))
+MAX_LIMIT = 200
+# Seconds a worker reuses the catalog version before asking the DB again
+CATALOG_VERSION_TTL = float(get_secret("CATALOG_VERSION_TTL", 2))
+
+class _VersionCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.value = None
+        self.expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self.expires:
+            with self._lock:
+                if now >= self.expires:
+                    self.value = catalog_version()
+                    self.expires = now + self.ttl
+        return self.value
+
+_version = _VersionCache(CATALOG_VERSION_TTL)
+
+class BadRequest(ValueError):
+    pass
+
+def _number(params, name, cast=float, default=None):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be a number")
+
+# Page size from ?limit=, clamped to 1..MAX_LIMIT (a negative LIMIT means
+# no limit on SQLite)
+def _limit(params):
+    return max(1, min(_number(params, "limit", int, 30), MAX_LIMIT))
+
+def parse_filters(params):
+    tags = [t for t in params.get("tags", "").split(",") if t] or None
+    return {
+        "tags": sorted(tags) if tags else None,
+        "category": params.get("category") or None,
+        "keyword": params.get("keyword") or params.get("q") or None,
+        "min_price": _number(params, "min_price"),
+        "max_price": _number(params, "max_price"),
+        "min_rating": _number(params, "min_rating"),
+    }
+
+def _jsonable(product):
+    return {
+        k: v.isoformat() if isinstance(v, datetime) else v
+        for k, v in product.items() if not k.startswith("_")
+    }
+
+def _etag(request, version):
+    key = f"{version}|{request.url.path}|{sorted(request.query_params.multi_items())}"
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+# If-None-Match is "*" or a comma-separated list of entity tags; the weak
+# comparison used for GET ignores the W/ prefix
+def _etag_matches(if_none_match, etag):
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+# Serve `compute()` as JSON with an ETag, or 304 if the client's copy is current
+async def _cached_json(request, compute):
+    version = await run_in_threadpool(_version.get)
+    etag = _etag(request, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        body = await run_in_threadpool(compute)
+    except BadRequest as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(body, headers=headers)
+
+async def products(request):
+    def compute():
+        filters = parse_filters(request.query_params)
+        limit = _limit(request.query_params)
+        sort = request.query_params.get("sort") or None
+        if sort is not None and sort not in SORTS:
+            raise BadRequest(f"sort must be one of {', '.join(SORTS)}")
+        rows = [_jsonable(p) for p in get_products(limit=limit, sort=sort, **filters)]
+        return {"count": len(rows), "products": rows}
+    return await _cached_json(request, compute)
+
+async def facets(request):
+    return await _cached_json(request, lambda: get_facets(**parse_filters(request.query_params)))
+
+async def search(request):
+    # Imported on first use so catalog-only workers don't load the LLM stack
+    from search_flow import ai_search
+    params = request.query_params
+    if not params.get("q"):
+        return JSONResponse({"error": "q is required"}, status_code=400)
+    try:
+        result = await ai_search(
+            params["q"],
+            tag_filter=[t for t in params.get("tags", "").split(",") if t],
+            min_price=_number(params, "min_price", default=0),
+            max_price=_number(params, "max_price", default=PRICE_CEILING),
+            min_rating=_number(params, "min_rating", default=0),
+            provider=params.get("provider") or None,
+            limit=_limit(params),
+        )
+    except BadRequest as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    result["products"] = [_jsonable(p) for p in result["products"]]
+    return JSONResponse(result)
+
+async def health(request):
+    return JSONResponse({"status": "ok", "catalog_version": await run_in_threadpool(_version.get)})
+
+app = Starlette(
+    routes=[
+        Route("/products", products),
+        Route("/facets", facets),
+        Route("/search", search),
+        Route("/health", health),
+    ],
+    middleware=[Middleware(GZipMiddleware, minimum_size=1000)],
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the catalog as a JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    args = parser.parse_args()
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
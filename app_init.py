@@ -0,0 +1,75 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+# Process-wide app setup. Streamlit re-executes the whole script on every
+# widget interaction, so everything here is meant to run once per process
+# (streamlit_app wraps it in st.cache_resource) instead of once per rerun.
+
+# Seconds between background connectivity probes
+HEALTH_CHECK_INTERVAL = 30
+
+# Schema upgrade and seeding. Raises on failure: st.cache_resource does not
+# cache exceptions, so a transient startup error is retried on the next rerun.
+def init_database():
+    from populate_db import populate
+    # Creates tables (and missing columns), then seeds if the DB is empty
+    populate()
+
+# Seconds a Postgres read replica may trail the primary before it is
+# reported unhealthy
+REPLICA_MAX_LAG = 30
+
+# Replay lag of a Postgres standby in seconds; 0 on a primary or a caught-up
+# standby (an idle primary would otherwise look like growing lag)
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Periodic SELECT 1 against each engine (the writer and the reader or
+# replica) on a daemon thread; reruns read the last result
+class HealthMonitor:
+    def __init__(self, *engines, interval=HEALTH_CHECK_INTERVAL):
+        # The same engine passed as writer and reader is probed once
+        self.engines = list(dict.fromkeys(engines))
+        self.interval = interval
+        self.ok = False
+        self.error = None
+        self.checked_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _probe(self, engine):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            if engine.dialect.name == "postgresql":
+                lag = conn.execute(_REPLICA_LAG_SQL).scalar()
+                if lag is not None and lag > REPLICA_MAX_LAG:
+                    raise RuntimeError(f"read replica {engine.url.host} is {lag:.0f}s behind the primary")
+
+    def check(self):
+        try:
+            for engine in self.engines:
+                self._probe(engine)
+            self.ok, self.error = True, None
+        except Exception as e:
+            self.ok, self.error = False, e
+        self.checked_at = time.time()
+        return self.ok
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    # First probe is synchronous so the first render has a real answer
+    def start(self):
+        if self._thread is None:
+            self.check()
+            self._thread = threading.Thread(target=self._run, name="db-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
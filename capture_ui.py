@@ -1,10 +1,103 @@
+import argparse
 import asyncio
-from playwright.async_api import async_playwright
-import time
+import json
 import os
 import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from playwright.async_api import async_playwright
+
+APP_URL = "http://localhost:8502"
+
+# Searches and filter changes replayed by the benchmark, once per round
+BENCH_SEARCHES = ["bag", "iPhone", "Switch", "Sony"]
+BENCH_REPORT = "bench_ui.json"
+
+# Streamlit marks the app root with data-test-script-state. Count every
+# run start and finish so a wait can tell "the rerun triggered by my action"
+# apart from an older run, without fixed sleeps.
+RUN_COUNTER_JS = """
+(() => {
+  window.__stStarts = 0;
+  window.__stRuns = 0;
+  let last = null;
+  const observer = new MutationObserver(() => {
+    const app = document.querySelector('[data-testid="stApp"]');
+    const state = app && app.getAttribute('data-test-script-state');
+    if (!state || state === last) return;
+    if (state === 'running') window.__stStarts += 1;
+    if (last === 'running' && state === 'notRunning') window.__stRuns += 1;
+    last = state;
+  });
+  document.addEventListener('DOMContentLoaded', () => observer.observe(document.body, {
+    subtree: true, childList: true, attributes: true, attributeFilter: ['data-test-script-state'],
+  }));
+})();
+"""
+
+# Elements left over from the previous run are marked data-stale="true"
+# until the current run re-emits them
+FRESH = '[data-testid="stElementContainer"]:not([data-stale="true"])'
+# First product card in the results grid, or the "no products found" notice
+# for an empty result. Both render inside the app's st.container(key="results"),
+# so AI recommendations and warnings ("AI unavailable", DB errors) don't match.
+RESULTS = ".st-key-results"
+RESULT_SELECTOR = (f'{RESULTS} {FRESH} [data-testid="stLinkButton"], '
+                   f'{RESULTS} {FRESH} [data-testid="stAlertContainer"]')
+RECOMMENDATIONS_TEXT = "Top 3 AI Recommendations"
+
+async def new_app_page(context):
+    await context.add_init_script(RUN_COUNTER_JS)
+    return await context.new_page()
+
+async def runs(page):
+    return await page.evaluate("[window.__stStarts, window.__stRuns]")
 
-async def capture():
+async def wait_for_start(page, before, timeout=60000):
+    await page.wait_for_function(f"window.__stStarts > {before[0]}", timeout=timeout, polling="raf")
+
+async def wait_for_run(page, before, timeout=60000):
+    await page.wait_for_function(f"window.__stRuns > {before[1]}", timeout=timeout, polling="raf")
+
+# Start a rerun with `action` and wait for `selector` to be rendered by it;
+# returns (ms to selector, run counters from before the action)
+async def time_to_fresh(page, action, selector):
+    before = await runs(page)
+    start = time.perf_counter()
+    await action()
+    await wait_for_start(page, before)
+    await page.wait_for_selector(selector, state="visible")
+    return (time.perf_counter() - start) * 1000, before
+
+# Load the app and wait for its first script run to finish; returns ms
+async def load_app(page, url, timeout=60000):
+    start = time.perf_counter()
+    await page.goto(url, timeout=timeout)
+    await page.wait_for_selector("h1", timeout=timeout)
+    await wait_for_run(page, [0, 0], timeout)
+    return (time.perf_counter() - start) * 1000
+
+# Run `action` and wait for the rerun it triggers; returns ms
+async def timed_rerun(page, action):
+    before = await runs(page)
+    start = time.perf_counter()
+    await action()
+    await wait_for_run(page, before)
+    return (time.perf_counter() - start) * 1000
+
+async def search(page, term):
+    box = page.get_by_label("🔎 Search for products")
+    await box.fill(term)
+    await box.press("Enter")
+
+async def capture(url=APP_URL):
     video_dir = "showcase/temp_video"
     if os.path.exists(video_dir):
         shutil.rmtree(video_dir)
@@ -12,15 +105,13 @@ async def capture():
 
     async with async_playwright() as p:
         browser = await p.chromium.launch()
-        
+
         # 1. Pre-load for stability
         print("Pre-loading app...")
         temp_context = await browser.new_context()
-        temp_page = await temp_context.new_page()
+        temp_page = await new_app_page(temp_context)
         try:
-            await temp_page.goto("http://localhost:8502", timeout=60000)
-            await temp_page.wait_for_selector("h1", timeout=60000)
-            await asyncio.sleep(8) 
+            await load_app(temp_page, url)
         except Exception as e:
             print(f"Pre-load warning: {e}")
         await temp_context.close()
@@ -31,39 +122,31 @@ async def capture():
             record_video_dir=video_dir,
             record_video_size={'width': 1280, 'height': 720}
         )
-        page = await context.new_page()
-        
+        page = await new_app_page(context)
+
         try:
             print("Recording ultra-snappy demo...")
-            await page.goto("http://localhost:8502")
-            await page.wait_for_selector("h1")
-            
-            await asyncio.sleep(1)
+            await load_app(page, url)
             await page.screenshot(path="showcase/landing.png")
 
             # Rapid search
-            search_box = page.get_by_label("🔎 Search for products")
-            await search_box.fill("bag")
-            await page.keyboard.press("Enter")
-            
-            await asyncio.sleep(3) 
+            await timed_rerun(page, lambda: search(page, "bag"))
             await page.screenshot(path="showcase/default_search_bag.png")
 
-            # Toggle AI
+            # Toggle AI and wait for the recommendations to render
             print("Toggling AI Assistant...")
-            await page.get_by_text("AI Assistant (LLM-powered search & recommendations)").click()
-            
-            # Wait just enough for AI recommendations to appear
-            await asyncio.sleep(7) 
-            
+            ai_toggle = page.get_by_text("AI Assistant (LLM-powered search & recommendations)")
+            _, before = await time_to_fresh(page, ai_toggle.click, f"{FRESH} >> text={RECOMMENDATIONS_TEXT}")
+            await wait_for_run(page, before)
+
             await page.screenshot(path="showcase/ai_search_bag.png")
-            
+
             # No final pause - cut immediately
             print("Demo sequence complete.")
-            
+
         except Exception as e:
             print(f"Error: {e}")
-        
+
         await context.close()
         await browser.close()
 
@@ -73,26 +156,162 @@ async def capture():
             video_path = os.path.join(video_dir, videos[0])
             raw_video = "showcase/raw_demo.webm"
             shutil.move(video_path, raw_video)
-            
+
             final_gif = "showcase/demo_ai_search.gif"
-            
+
             print("Trimming and converting to ultra-snappy GIF...")
             # -ss 1: Start 1 second in
             # -t 11: Limit duration to 11 seconds total
-            import subprocess
             cmd = [
-                "ffmpeg", "-y", "-i", raw_video, 
-                "-ss", "1", "-t", "11", 
-                "-vf", "fps=10,scale=800:-1:flags=lanczos", 
+                "ffmpeg", "-y", "-i", raw_video,
+                "-ss", "1", "-t", "11",
+                "-vf", "fps=10,scale=800:-1:flags=lanczos",
                 final_gif
             ]
             subprocess.run(cmd, check=True)
             print(f"Ultra-snappy GIF saved to {final_gif}")
-            
+
     if os.path.exists(video_dir):
         shutil.rmtree(video_dir)
     if os.path.exists("showcase/raw_demo.webm"):
         os.remove("showcase/raw_demo.webm")
 
+# Start the app on a throwaway SQLite DB, with the LLM stub and local
+# thumbnails, so runs are comparable across commits and need no network
+def start_local_app(port, llm_latency=0.3):
+    from PIL import Image
+    from llm_stub import start_stub
+
+    work_dir = tempfile.mkdtemp(prefix="bench_ui_")
+    stub, stub_url = start_stub(latency=llm_latency, seed=0)
+    # Seeded products use picsum URLs ending in .../400/400
+    Image.new("RGB", (400, 400), "gray").save(os.path.join(work_dir, "400"), format="JPEG")
+    env = dict(
+        os.environ,
+        DB_URL=f"sqlite:///{work_dir}/bench.db",
+        LLM_METRICS_DB_URL=f"sqlite:///{work_dir}/metrics.db",
+        THUMBNAIL_SOURCE_DIR=work_dir,
+        THUMBNAIL_DIR=os.path.join(work_dir, "thumbnails"),
+        OPENROUTER_BASE_URL=stub_url,
+        OPENROUTER_API_KEY="stub",
+        GROQ_BASE_URL=stub_url,
+        GROQ_API_KEY="stub",
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "streamlit_app.py", "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://localhost:{port}"
+    for _ in range(300):
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1):
+                break
+        except OSError:
+            time.sleep(0.1)
+    return app, stub, url
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _summary(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))] if ordered else None
+    return {
+        "n": len(samples),
+        "p50_ms": statistics.median(samples) if samples else None,
+        "p95_ms": p95,
+        "mean_ms": statistics.mean(samples) if samples else None,
+        "samples_ms": [round(s, 1) for s in samples],
+    }
+
+# Scripted searches and filter changes; per-metric latency samples in ms
+async def benchmark(url, rounds=3):
+    metrics = {name: [] for name in ("page_load", "first_result", "search_rerun", "recommendations",
+                                     "filter_rerun", "clear_rerun")}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        context = await browser.new_context(viewport={'width': 1280, 'height': 720})
+        page = await new_app_page(context)
+        metrics["page_load"].append(await load_app(page, url))
+        ai_toggle = page.get_by_text("AI Assistant (LLM-powered search & recommendations)")
+        price_slider = page.get_by_role("slider").first
+
+        for _ in range(rounds):
+            for term in BENCH_SEARCHES:
+                # Time to the first product card and to the end of the rerun
+                start = time.perf_counter()
+                first, before = await time_to_fresh(page, lambda: search(page, term), RESULT_SELECTOR)
+                metrics["first_result"].append(first)
+                await wait_for_run(page, before)
+                metrics["search_rerun"].append((time.perf_counter() - start) * 1000)
+
+                # Same search through the AI flow
+                rec, before = await time_to_fresh(page, ai_toggle.click, f"{FRESH} >> text={RECOMMENDATIONS_TEXT}")
+                metrics["recommendations"].append(rec)
+                await wait_for_run(page, before)
+                await timed_rerun(page, ai_toggle.click)
+
+                # Filter change on the current results
+                await price_slider.focus()
+                metrics["filter_rerun"].append(await timed_rerun(page, lambda: page.keyboard.press("ArrowRight")))
+                metrics["filter_rerun"].append(await timed_rerun(page, lambda: page.keyboard.press("ArrowLeft")))
+
+                metrics["clear_rerun"].append(await timed_rerun(page, lambda: search(page, "")))
+
+        await context.close()
+        await browser.close()
+    return {name: _summary(samples) for name, samples in metrics.items()}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def run_benchmark(url=None, rounds=3, report_path=BENCH_REPORT, llm_latency=0.3):
+    app = stub = None
+    if url is None:
+        app, stub, url = start_local_app(_free_port(), llm_latency)
+    try:
+        metrics = asyncio.run(benchmark(url, rounds))
+    finally:
+        if app:
+            app.terminate()
+            app.wait()
+        if stub:
+            stub.shutdown()
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "url": url,
+        "local_backends": app is not None,
+        "llm_latency_s": llm_latency if app is not None else None,
+        "rounds": rounds,
+        "searches": BENCH_SEARCHES,
+        "metrics": metrics,
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, m in metrics.items():
+        if m["n"]:
+            print(f"{name:<16} n={m['n']:<3} p50 {m['p50_ms']:>8.1f} ms  p95 {m['p95_ms']:>8.1f} ms")
+    print(f"📄 Report written to {report_path}")
+    return report
+
 if __name__ == "__main__":
-    asyncio.run(capture())
+    parser = argparse.ArgumentParser(description="Capture UI screenshots/GIF, or benchmark UI latency")
+    parser.add_argument("--benchmark", action="store_true", help="measure latencies instead of recording a demo")
+    parser.add_argument("--url", help="app to drive; benchmark mode starts a local app with stub backends if omitted")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM seconds per response")
+    parser.add_argument("--report", default=BENCH_REPORT)
+    args = parser.parse_args()
+    if args.benchmark:
+        run_benchmark(args.url, args.rounds, args.report, args.llm_latency)
+    else:
+        asyncio.run(capture(args.url or APP_URL))
@@ -1,11 +1,13 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
 from sqlalchemy.orm import sessionmaker
 import streamlit as st
 
 # Load environment variables (fallback for local dev)
 from dotenv import load_dotenv
 load_dotenv()
+# After load_dotenv so TRACE_* settings in .env apply
+import tracing
 
 # Helper to get secret from Streamlit or Environment
 def get_secret(key, default=None):
@@ -19,16 +21,76 @@ def get_secret(key, default=None):
 # Primary DB connection (e.g. NeonDB from .env or st.secrets)
 # Fallback to local SQLite if no DB_URL is found
 DB_URL = get_secret("DB_URL", "sqlite:///./mercari_local.db")
+# Optional Postgres read replica for catalog reads (query.py); may lag the
+# primary slightly, so anything that writes keeps using SessionLocal
+DB_READ_URL = get_secret("DB_READ_URL")
+
+# SQLite profile, applied to every connection of a file database. WAL lets
+# readers run alongside the writer instead of blocking on its journal;
+# synchronous=NORMAL is durable across crashes in WAL mode (only a power cut
+# can lose the last commits) and saves an fsync per transaction.
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # in KiB: 64 MB page cache for the writer
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+# Readers go through the 256 MB mmap, which the OS page cache shares across
+# connections, so each keeps only a small private cache (in KiB). With the
+# pool capped at SQLITE_READ_POOL_SIZE that is 64 MB for all readers.
+SQLITE_READ_CACHE_SIZE = -8000
+# Readers beyond the pool wait for a connection; SQLite reads are CPU-bound,
+# so more connections than cores would add memory, not throughput
+SQLITE_READ_POOL_SIZE = int(get_secret("SQLITE_READ_POOL_SIZE", 8))
+# Seconds a write waits for the single writer connection
+SQLITE_WRITE_TIMEOUT = float(get_secret("SQLITE_WRITE_TIMEOUT", 30))
+
+def _apply_sqlite_pragmas(engine, pragmas, read_only=False):
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+# (writer, reader) engines for a database URL. File SQLite gets one pooled
+# writer connection, so writes queue in the pool rather than failing with
+# "database is locked", and a pool of query_only reader connections.
+# Postgres reads go to read_url if set. Otherwise both are the same engine.
+def create_engines(url, read_url=None, pragmas=SQLITE_PRAGMAS):
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:") or not pragmas:
+            engine = create_engine(url, connect_args=connect_args)
+            return engine, engine
+        writer = create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0,
+                               pool_timeout=SQLITE_WRITE_TIMEOUT)
+        reader = create_engine(url, connect_args=connect_args, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0)
+        _apply_sqlite_pragmas(writer, pragmas)
+        read_pragmas = {**pragmas, "cache_size": SQLITE_READ_CACHE_SIZE} if "cache_size" in pragmas else pragmas
+        _apply_sqlite_pragmas(reader, read_pragmas, read_only=True)
+        return writer, reader
+    # For Postgres, use pool_pre_ping to handle idle connections
+    writer = create_engine(url, pool_pre_ping=True)
+    reader = create_engine(read_url, pool_pre_ping=True) if read_url else writer
+    return writer, reader
 
 try:
-    if DB_URL.startswith("sqlite"):
-        engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
-    else:
-        # For Postgres, use pool_pre_ping to handle idle connections
-        engine = create_engine(DB_URL, pool_pre_ping=True)
+    engine, read_engine = create_engines(DB_URL, DB_READ_URL)
 except Exception as e:
     print(f"❌ Critical: Could not create database engine for {DB_URL}. Error: {e}")
     # Fallback to local SQLite if Postgres engine creation fails
-    engine = create_engine("sqlite:///./mercari_local.db", connect_args={"check_same_thread": False})
+    engine, read_engine = create_engines("sqlite:///./mercari_local.db")
+
+# SQL statement timing when TRACE_ENABLED is set
+tracing.instrument_engine(engine)
+if read_engine is not engine:
+    tracing.instrument_engine(read_engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Read-only sessions for catalog queries
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import heapq
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+from models import CrawlKeyword, ensure_schema
+from config import engine as default_engine, get_secret
+from tag_matcher import normalize
+
+# Demand-driven crawling. The app logs what users search for; each keyword
+# keeps an exponentially decayed popularity. A fixed budget of upstream
+# requests per hour is spent one keyword at a time on whichever keyword has
+# the highest (popularity + prior) x staleness, so popular keywords are
+# re-crawled often and rarely searched ones only occasionally, at the same
+# total request volume as the old uniform batch.
+
+# Popularity halves after this many hours without searches
+POPULARITY_HALF_LIFE_HOURS = float(get_secret("CRAWL_POPULARITY_HALF_LIFE_HOURS", 24))
+# Upstream requests per hour: the old daily batch (88 seed keywords x one
+# search + 5 item requests) spread over the day
+CRAWL_REQUESTS_PER_HOUR = float(get_secret("CRAWL_REQUESTS_PER_HOUR", 88 * 6 / 24))
+CRAWL_ITEMS_PER_KEYWORD = 5
+# Baseline demand so seed keywords nobody searched for still get refreshed
+SEED_PRIOR = 0.1
+# Staleness stops growing after this long, so a never-crawled niche
+# keyword cannot outrank everything that is actually searched
+MAX_STALENESS_HOURS = 72.0
+# A keyword is never re-crawled sooner than this
+MIN_RECRAWL_INTERVAL = timedelta(minutes=30)
+# Longer search terms are natural-language queries, not crawl keywords
+MAX_KEYWORD_CHARS = 40
+MAX_KEYWORD_WORDS = 3
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def normalize_keyword(term):
+    keyword = " ".join(normalize(term).split())
+    return keyword if 2 <= len(keyword) <= MAX_KEYWORD_CHARS else None
+
+# Keywords credited for one search: the intent's keywords when the search
+# was parsed by the LLM, otherwise the term itself if it is short enough to
+# be a keyword rather than a natural-language request
+def search_keywords(term, intent=None):
+    candidates = list((intent or {}).get("keywords") or [])
+    if not candidates:
+        keyword = normalize_keyword(term)
+        return [keyword] if keyword and len(keyword.split()) <= MAX_KEYWORD_WORDS else []
+    return sorted({k for k in map(normalize_keyword, candidates) if k})
+
+def decayed(popularity, since, now):
+    if since is None:
+        return popularity
+    hours = max((now - since).total_seconds() / 3600, 0.0)
+    return popularity * 0.5 ** (hours / POPULARITY_HALF_LIFE_HOURS)
+
+def staleness_hours(last_crawled_at, now):
+    if last_crawled_at is None:
+        return MAX_STALENESS_HOURS
+    return min((now - last_crawled_at).total_seconds() / 3600, MAX_STALENESS_HOURS)
+
+def priority(row, now):
+    if row.last_crawled_at is not None and now - row.last_crawled_at < MIN_RECRAWL_INTERVAL:
+        return None
+    return (decayed(row.popularity, row.popularity_at, now) + SEED_PRIOR) * staleness_hours(row.last_crawled_at, now)
+
+# INSERT ... ON CONFLICT DO NOTHING for keywords not yet tracked, so two
+# processes adding the same new keyword don't fail with an IntegrityError
+def _insert_missing(session, keywords):
+    if not keywords:
+        return
+    dialect_insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+    session.execute(
+        dialect_insert(CrawlKeyword).on_conflict_do_nothing(index_elements=[CrawlKeyword.keyword]),
+        [{"keyword": k, "popularity": 0.0, "searches": 0} for k in keywords],
+    )
+
+# Add one search to each keyword's decayed popularity. Rows are locked in
+# keyword order on Postgres so concurrent writers neither lose increments
+# nor deadlock; SQLite serializes writers anyway.
+def record_searches(keywords, engine=None, now=None):
+    now = now or _utcnow()
+    counts = Counter(keywords)
+    with sessionmaker(bind=engine or default_engine)() as session:
+        _insert_missing(session, sorted(counts))
+        rows = session.scalars(
+            select(CrawlKeyword).where(CrawlKeyword.keyword.in_(counts))
+            .order_by(CrawlKeyword.keyword).with_for_update()
+        )
+        for row in rows:
+            row.popularity = decayed(row.popularity, row.popularity_at, now) + counts[row.keyword]
+            row.popularity_at = now
+            row.searches += counts[row.keyword]
+        session.commit()
+
+def seed_keywords(keywords, engine=None):
+    with sessionmaker(bind=engine or default_engine)() as session:
+        _insert_missing(session, sorted(set(filter(None, map(normalize_keyword, keywords)))))
+        session.commit()
+
+def mark_crawled(keyword, engine=None, now=None):
+    with sessionmaker(bind=engine or default_engine)() as session:
+        row = session.get(CrawlKeyword, keyword)
+        if row is not None:
+            row.last_crawled_at = now or _utcnow()
+            session.commit()
+
+# The n keywords most worth crawling now, best first
+def next_keywords(n=1, engine=None, now=None):
+    now = now or _utcnow()
+    with sessionmaker(bind=engine or default_engine)() as session:
+        scored = ((priority(row, now), row.keyword) for row in session.query(CrawlKeyword))
+        return [k for p, k in heapq.nlargest(n, ((p, k) for p, k in scored if p is not None))]
+
+# Search logging from the app: enqueue and return, a daemon thread writes
+_log_queue = None
+_log_lock = threading.Lock()
+
+def _log_writer(q, engine):
+    while True:
+        batch = [q.get()]
+        while not q.empty() and len(batch) < 100:
+            batch.append(q.get_nowait())
+        try:
+            record_searches([k for keywords in batch for k in keywords], engine)
+        except Exception as e:
+            print(f"⚠️ Could not record searches: {e}")
+        finally:
+            for _ in batch:
+                q.task_done()
+
+def log_search(term, intent=None, engine=None):
+    global _log_queue
+    keywords = search_keywords(term, intent)
+    if not keywords:
+        return
+    with _log_lock:
+        if _log_queue is None:
+            _log_queue = queue.Queue()
+            threading.Thread(target=_log_writer, args=(_log_queue, engine or default_engine), daemon=True).start()
+    _log_queue.put(keywords)
+
+# Block until every logged search is written (tests, shutdown)
+def flush():
+    if _log_queue is not None:
+        _log_queue.join()
+
+async def _scrape_keyword(keyword, items_per_keyword):
+    from scraper import scrape_mercari
+    return await scrape_mercari([keyword], items_per_keyword=items_per_keyword)
+
+# Crawl continuously within the request budget: one search plus one detail
+# request per item for each keyword, paced so the hourly total is fixed.
+# `scrape` is an async callable (keyword, items_per_keyword).
+async def run_scheduler(engine=None, requests_per_hour=CRAWL_REQUESTS_PER_HOUR,
+                        items_per_keyword=CRAWL_ITEMS_PER_KEYWORD, scrape=None, max_crawls=None,
+                        sleep=asyncio.sleep, clock=_utcnow):
+    engine = engine or default_engine
+    scrape = scrape or _scrape_keyword
+    interval = (1 + items_per_keyword) * 3600 / requests_per_hour
+    crawls = 0
+    while max_crawls is None or crawls < max_crawls:
+        started = time.monotonic()
+        picked = next_keywords(1, engine, clock())
+        if picked:
+            keyword = picked[0]
+            print(f"🕷️ Crawling '{keyword}'")
+            try:
+                await scrape(keyword, items_per_keyword)
+            except Exception as e:
+                print(f"Error crawling '{keyword}': {e}")
+            # Marked even on failure so one broken keyword can't eat the budget
+            mark_crawled(keyword, engine, clock())
+            crawls += 1
+        await sleep(max(interval - (time.monotonic() - started), 0))
+    return crawls
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl Mercari continuously, prioritized by search demand")
+    parser.add_argument("--requests-per-hour", type=float, default=CRAWL_REQUESTS_PER_HOUR)
+    parser.add_argument("--items-per-keyword", type=int, default=CRAWL_ITEMS_PER_KEYWORD)
+    args = parser.parse_args()
+
+    from scraper import KEYWORDS
+    ensure_schema(default_engine)
+    seed_keywords(KEYWORDS)
+    asyncio.run(run_scheduler(requests_per_hour=args.requests_per_hour, items_per_keyword=args.items_per_keyword))
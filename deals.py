@@ -0,0 +1,290 @@
+import argparse
+import bisect
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, inspect, select, update
+from models import CategoryPriceSketch, PriceObservation, Product, ensure_schema
+from config import engine, SessionLocal
+
+# Deal scores. Every price observed in a category is folded into a t-digest
+# kept in category_price_sketches, so "how cheap is this listing for its
+# category" is one CDF lookup against ~100 centroids instead of a scan of
+# the category. The score is stored on the product when it is ingested and
+# refreshed for the whole category only when the category has grown by
+# RESCORE_GROWTH since its last refresh, which keeps the cost per ingested
+# price amortized O(1) while scores track the distribution.
+#
+# Sketches are read-modify-written per ingest transaction; two processes
+# ingesting the same category at once can lose each other's updates, which
+# `python deals.py --rebuild` repairs.
+
+# t-digest compression: at most ~this many centroids, accuracy ~1/compression
+TDIGEST_COMPRESSION = 100
+# Categories with fewer observed prices than this get no score
+DEAL_MIN_OBSERVATIONS = 10
+# Recompute a category's stored scores once it has this much more data
+RESCORE_GROWTH = 0.25
+# Products rescored per UPDATE batch
+RESCORE_CHUNK_SIZE = 1000
+
+# Merging t-digest (Dunning & Ertl) with the k1 scale function: centroids
+# are small near the tails and larger in the middle, so extreme quantiles
+# stay accurate.
+class TDigest:
+    def __init__(self, compression=TDIGEST_COMPRESSION, centroids=(), min=None, max=None):
+        self.compression = compression
+        self.centroids = [[m, w] for m, w in centroids]
+        self.count = sum(w for _, w in self.centroids)
+        self.min = min
+        self.max = max
+        self._buffer = []
+        self._cdf_points = None
+
+    def add(self, x, weight=1.0):
+        self._buffer.append([x, weight])
+        self.count += weight
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        merged = [list(points[0])]
+        so_far = 0.0
+        k_low = self._k(0.0)
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            if self._k((so_far + current[1] + weight) / self.count) - k_low <= 1:
+                current[1] += weight
+                current[0] += (mean - current[0]) * weight / current[1]
+            else:
+                so_far += current[1]
+                k_low = self._k(so_far / self.count)
+                merged.append([mean, weight])
+        self.centroids = merged
+        self._cdf_points = None
+
+    # Fraction of observations <= x, interpolated between centroid centers
+    def cdf(self, x):
+        self._compress()
+        if not self.centroids:
+            return None
+        if x < self.min:
+            return 0.0
+        if x >= self.max:
+            return 1.0
+        if self._cdf_points is None:
+            # Cumulative weight at each centroid's center, bracketed by min and max
+            centers, cumulative = [self.min], [0.0]
+            total = 0.0
+            for mean, weight in self.centroids:
+                centers.append(mean)
+                cumulative.append(total + weight / 2)
+                total += weight
+            centers.append(self.max)
+            cumulative.append(total)
+            self._cdf_points = (centers, cumulative)
+        centers, cumulative = self._cdf_points
+        i = bisect.bisect_right(centers, x, 1, len(centers) - 1)
+        lo, hi = centers[i - 1], centers[i]
+        frac = (x - lo) / (hi - lo) if hi > lo else 1.0
+        return (cumulative[i - 1] + frac * (cumulative[i] - cumulative[i - 1])) / cumulative[-1]
+
+    def quantile(self, q):
+        self._compress()
+        if not self.centroids:
+            return None
+        target = q * self.count
+        total = 0.0
+        previous = (self.min, 0.0)
+        for mean, weight in self.centroids:
+            center = total + weight / 2
+            if target <= center:
+                lo_x, lo_c = previous
+                return lo_x + (mean - lo_x) * ((target - lo_c) / (center - lo_c) if center > lo_c else 1.0)
+            previous = (mean, center)
+            total += weight
+        lo_x, lo_c = previous
+        return lo_x + (self.max - lo_x) * ((target - lo_c) / (total - lo_c) if total > lo_c else 1.0)
+
+    def to_dict(self):
+        self._compress()
+        return {"compression": self.compression, "min": self.min, "max": self.max,
+                "centroids": [[round(m, 4), w] for m, w in self.centroids]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("compression", TDIGEST_COMPRESSION), data.get("centroids", ()),
+                   data.get("min"), data.get("max"))
+
+# Share of the category priced above `price`: 1.0 is the cheapest listing
+# seen, 0.0 the most expensive
+def deal_score(digest, price):
+    if digest is None or digest.count < DEAL_MIN_OBSERVATIONS or price is None:
+        return None
+    return round(1.0 - digest.cdf(price), 4)
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+# Record scraped prices for (product, price) pairs. New products and
+# changed prices get a PriceObservation and go into their category's sketch;
+# an unchanged price writes nothing. Products may be pending; their price
+# is set here. Scores each touched product, or its whole category when the
+# category is due a refresh. Returns the number of observations written.
+def record_prices(session, items, now=None):
+    changed = []
+    for product, price in items:
+        if inspect(product).persistent and product.price == price:
+            continue
+        product.price = price
+        session.add(product)
+        changed.append(product)
+    if any(p.id is None for p in changed):
+        session.flush()
+    return _observe(session, changed, now or _utcnow())
+
+# Record prices that were written without record_prices (sync upserts) for
+# the products at `product_urls`: a product whose price differs from its
+# latest observation, or that has none, is observed and scored like a
+# scraped price change. The new scores keep updated_at and changed_at, as
+# in rescore_category. Returns the number of observations written.
+def record_current_prices(session, product_urls, now=None):
+    products = session.scalars(select(Product).where(Product.product_url.in_(product_urls))).all()
+    latest = {}
+    for product_id, price in session.execute(
+        select(PriceObservation.product_id, PriceObservation.price)
+        .where(PriceObservation.product_id.in_([p.id for p in products]))
+        .order_by(PriceObservation.observed_at, PriceObservation.id)
+    ):
+        latest[product_id] = price
+    changed = [p for p in products if p.price is not None and latest.get(p.id) != p.price]
+    stamps = [{"product_id": p.id, "old_updated_at": p.updated_at, "old_changed_at": p.changed_at} for p in changed]
+    observed = _observe(session, changed, now or _utcnow())
+    if stamps:
+        session.execute(_RESTAMP.execution_options(synchronize_session=False), stamps)
+        session.expire_all()
+    return observed
+
+def _observe(session, changed, now):
+    by_category = defaultdict(list)
+    for product in changed:
+        session.add(PriceObservation(product_id=product.id, price=product.price, observed_at=now))
+        by_category[product.category].append(product)
+
+    for category, products in by_category.items():
+        if not category:
+            continue
+        sketch = session.get(CategoryPriceSketch, category)
+        if sketch is None:
+            sketch = CategoryPriceSketch(category=category, digest={}, observations=0, scored_observations=0)
+            session.add(sketch)
+        digest = TDigest.from_dict(sketch.digest or {})
+        for product in products:
+            digest.add(product.price)
+        sketch.digest = digest.to_dict()
+        sketch.observations += len(products)
+        for product in products:
+            product.deal_score = deal_score(digest, product.price)
+        if sketch.observations >= max(DEAL_MIN_OBSERVATIONS, sketch.scored_observations * (1 + RESCORE_GROWTH)):
+            session.flush()
+            rescore_category(session, category, digest)
+            sketch.scored_observations = sketch.observations
+    # Later calls in the same session must find the sketches just added
+    session.flush()
+    return len(changed)
+
+_products = Product.__table__
+_RESCORE = (
+    update(_products)
+    .where(_products.c.id == bindparam("product_id"))
+    .values(deal_score=bindparam("score"), updated_at=_products.c.updated_at,
+            changed_at=_products.c.changed_at)
+)
+
+_RESTAMP = (
+    update(_products)
+    .where(_products.c.id == bindparam("product_id"))
+    .values(updated_at=bindparam("old_updated_at"), changed_at=bindparam("old_changed_at"))
+)
+
+# Recompute stored deal scores for every product in `category`. A score is
+# derived data, not a listing change: updated_at and changed_at are kept as
+# they are so sync doesn't treat a refresh as an edit.
+def rescore_category(session, category, digest=None):
+    if digest is None:
+        sketch = session.get(CategoryPriceSketch, category)
+        digest = TDigest.from_dict(sketch.digest) if sketch else None
+    last_id = ""
+    while True:
+        rows = session.execute(
+            select(Product.id, Product.price)
+            .where(Product.category == category, Product.id > last_id)
+            .order_by(Product.id)
+            .limit(RESCORE_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        session.execute(
+            _RESCORE.execution_options(synchronize_session=False),
+            [{"product_id": r.id, "score": deal_score(digest, r.price)} for r in rows],
+        )
+
+# Rebuild every sketch from current product prices plus the price history,
+# record a first observation for products that have none, and rescore all
+# categories. For databases filled before price tracking, and after bulk
+# imports (snapshots, migrations) that bypass record_prices.
+def rebuild(session, now=None):
+    now = now or _utcnow()
+    observed = set(session.scalars(select(PriceObservation.product_id).distinct()))
+    digests = defaultdict(TDigest)
+    counts = defaultdict(int)
+    for product_id, category, price in session.execute(select(Product.id, Product.category, Product.price)):
+        if product_id not in observed:
+            session.add(PriceObservation(product_id=product_id, price=price, observed_at=now))
+            if category:
+                digests[category].add(price)
+                counts[category] += 1
+    history = session.execute(
+        select(Product.category, PriceObservation.price)
+        .join(Product, Product.id == PriceObservation.product_id)
+    )
+    for category, price in history:
+        if category:
+            digests[category].add(price)
+            counts[category] += 1
+
+    session.query(CategoryPriceSketch).delete()
+    for category, digest in digests.items():
+        session.add(CategoryPriceSketch(category=category, digest=digest.to_dict(),
+                                        observations=counts[category], scored_observations=counts[category]))
+    session.flush()
+    for category, digest in digests.items():
+        rescore_category(session, category, digest)
+    return len(digests)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-category price sketches and deal scores")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild all sketches and scores from the database")
+    args = parser.parse_args()
+
+    ensure_schema(engine)
+    with SessionLocal() as session:
+        if args.rebuild:
+            categories = rebuild(session)
+            session.commit()
+            print(f"✅ Rebuilt price sketches and deal scores for {categories} categories.")
+        for sketch in session.scalars(select(CategoryPriceSketch).order_by(CategoryPriceSketch.category)):
+            digest = TDigest.from_dict(sketch.digest)
+            p25, p50, p75 = (digest.quantile(q) for q in (0.25, 0.5, 0.75))
+            print(f"{sketch.category:<30} n={sketch.observations:<6} p25 ¥{p25:,.0f}  p50 ¥{p50:,.0f}  p75 ¥{p75:,.0f}")
@@ -1,7 +1,14 @@
 import os
-from openai import OpenAI
+import json
+import time
+import asyncio
+import functools
+import weakref
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import streamlit as st
+import llm_metrics
+import tracing
 
 # Load environment variables from .env if it exists
 load_dotenv()
@@ -19,21 +26,40 @@ def get_secret(key, default=None):
 GROQ_API_KEY = get_secret("GROQ_API_KEY")
 OPENROUTER_API_KEY = get_secret("OPENROUTER_API_KEY")
 OPENROUTER_BASE_URL = get_secret("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+GROQ_BASE_URL = get_secret("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+
+# Sync clients are reused across reruns so their HTTP connection pools stay
+# warm; keyed on credentials so a changed key gets a fresh client
+@functools.lru_cache(maxsize=8)
+def _cached_client(api_key, base_url):
+    return OpenAI(api_key=api_key, base_url=base_url)
 
 # Helper to get client for either Groq or OpenRouter
 def get_client(provider):
     if provider == "groq":
-        return OpenAI(
-            api_key=GROQ_API_KEY,
-            base_url="https://api.groq.com/openai/v1"
-        )
+        return _cached_client(GROQ_API_KEY, GROQ_BASE_URL)
     elif provider == "openrouter":
-        return OpenAI(
-            api_key=OPENROUTER_API_KEY,
-            base_url=OPENROUTER_BASE_URL
-        )
+        return _cached_client(OPENROUTER_API_KEY, OPENROUTER_BASE_URL)
     return None
 
+# Async clients keep their connection pool on the event loop they first ran
+# on, so one client is cached per (credentials, loop). run_ai_search runs
+# every search on one long-lived loop, so the pool stays warm across
+# searches; entries go away with their loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client(provider):
+    if provider == "groq":
+        key = (GROQ_API_KEY, GROQ_BASE_URL)
+    elif provider == "openrouter":
+        key = (OPENROUTER_API_KEY, OPENROUTER_BASE_URL)
+    else:
+        return None
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if key not in clients:
+        clients[key] = AsyncOpenAI(api_key=key[0], base_url=key[1])
+    return clients[key]
+
 # Helper to get model name for each provider
 def get_model_name(provider):
     if provider == "groq":
@@ -42,101 +68,309 @@ def get_model_name(provider):
         return "deepseek/deepseek-chat"
     return None
 
+# True when a provider is configured and the token budget has room.
+# Callers use this to pick a non-LLM path instead of waiting for budget.
+def llm_available():
+    return bool(GROQ_API_KEY or OPENROUTER_API_KEY) and llm_metrics.budget_available()
+
+def _usage_tokens(response, messages):
+    # Prefer provider-reported usage; estimate when it is missing
+    usage = getattr(response, "usage", None)
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if not isinstance(prompt, int) or not isinstance(completion, int):
+        prompt = sum(estimate_tokens(m["content"]) for m in messages)
+        content = response.choices[0].message.content
+        completion = estimate_tokens(content) if isinstance(content, str) else 0
+    return prompt, completion
+
+# Single chat completion with accounting; every LLM request goes through here
+def _complete(provider, messages, **kwargs):
+    model = get_model_name(provider)
+    start = time.perf_counter()
+    with tracing.span("llm.request", provider=provider, model=model) as span:
+        try:
+            response = get_client(provider).chat.completions.create(model=model, messages=messages, **kwargs)
+        except Exception:
+            llm_metrics.record_call(provider, model, latency_ms=(time.perf_counter() - start) * 1000, success=False)
+            raise
+        prompt, completion = _usage_tokens(response, messages)
+        span.set(prompt_tokens=prompt, completion_tokens=completion)
+    llm_metrics.record_call(provider, model, prompt, completion, (time.perf_counter() - start) * 1000)
+    return response
+
+async def _complete_async(provider, messages, **kwargs):
+    model = get_model_name(provider)
+    start = time.perf_counter()
+    with tracing.span("llm.request", provider=provider, model=model) as span:
+        try:
+            client = get_async_client(provider)
+            response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+        except Exception:
+            llm_metrics.record_call(provider, model, latency_ms=(time.perf_counter() - start) * 1000, success=False)
+            raise
+        prompt, completion = _usage_tokens(response, messages)
+        span.set(prompt_tokens=prompt, completion_tokens=completion)
+    llm_metrics.record_call(provider, model, prompt, completion, (time.perf_counter() - start) * 1000)
+    return response
+
 # Fallback logic: try Groq, then OpenRouter
+# Raises LLMBudgetExceeded right away when the token budget is spent.
 def call_with_fallback(fn, *args, provider=None, **kwargs):
-    providers = ["groq", "openrouter"]
-    
-    last_exc = None
-    for prov in providers:
-        if prov == "groq" and not GROQ_API_KEY:
-            continue
-        if prov == "openrouter" and not OPENROUTER_API_KEY:
-            continue
-            
-        try:
-            return fn(*args, provider=prov, **kwargs)
-        except Exception as e:
-            last_exc = e
-            print(f"LLM Provider {prov} failed: {e}")
-            continue
-    
-    if last_exc:
-        raise last_exc
-    raise Exception("No LLM provider available. Please check your .env or st.secrets for GROQ_API_KEY or OPENROUTER_API_KEY.")
+    llm_metrics.check_budget()
+    operation = fn.__name__.lstrip("_")
+    token = llm_metrics.current_operation.set(operation)
+    try:
+        providers = ["groq", "openrouter"]
+
+        last_exc = None
+        for prov in providers:
+            if prov == "groq" and not GROQ_API_KEY:
+                continue
+            if prov == "openrouter" and not OPENROUTER_API_KEY:
+                continue
+
+            try:
+                with tracing.span(f"llm.{operation}", provider=prov):
+                    return fn(*args, provider=prov, **kwargs)
+            except Exception as e:
+                last_exc = e
+                print(f"LLM Provider {prov} failed: {e}")
+                continue
+
+        if last_exc:
+            raise last_exc
+        raise Exception("No LLM provider available. Please check your .env or st.secrets for GROQ_API_KEY or OPENROUTER_API_KEY.")
+    finally:
+        llm_metrics.current_operation.reset(token)
+
+# Async counterpart of call_with_fallback for coroutine functions
+async def call_with_fallback_async(fn, *args, provider=None, **kwargs):
+    llm_metrics.check_budget()
+    operation = fn.__name__.lstrip("_")
+    token = llm_metrics.current_operation.set(operation)
+    try:
+        providers = ["groq", "openrouter"]
+
+        last_exc = None
+        for prov in providers:
+            if prov == "groq" and not GROQ_API_KEY:
+                continue
+            if prov == "openrouter" and not OPENROUTER_API_KEY:
+                continue
+
+            try:
+                with tracing.span(f"llm.{operation}", provider=prov):
+                    return await fn(*args, provider=prov, **kwargs)
+            except Exception as e:
+                last_exc = e
+                print(f"LLM Provider {prov} failed: {e}")
+                continue
+
+        if last_exc:
+            raise last_exc
+        raise Exception("No LLM provider available. Please check your .env or st.secrets for GROQ_API_KEY or OPENROUTER_API_KEY.")
+    finally:
+        llm_metrics.current_operation.reset(token)
+
+# Rough token estimate: ~4 ASCII chars per token, ~1 token per CJK char
+def estimate_tokens(text):
+    text = str(text)
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def _truncate(text, max_chars):
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1] + "…"
 
 # Translate text using LLM
 def translate_text(text, dest_lang, provider=None):
-    def _translate(text, dest_lang, provider):
-        client = get_client(provider)
-        model = get_model_name(provider)
+    def _translate_text(text, dest_lang, provider):
         prompt = f"Translate the following text to {'Japanese' if dest_lang == 'ja' else 'English'}:\n{text}"
-        response = client.chat.completions.create(
-            model=model,
+        response = _complete(
+            provider,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
             max_tokens=256,
         )
         return response.choices[0].message.content.strip()
-    return call_with_fallback(_translate, text, dest_lang, provider=provider)
+    return call_with_fallback(_translate_text, text, dest_lang, provider=provider)
+
+# Translate several texts in one request. `items` maps stable ids to texts;
+# returns {id: translation} for every id the model answered.
+def translate_batch(items, dest_lang, provider=None):
+    def _translate_batch(items, dest_lang, provider):
+        language = 'Japanese' if dest_lang == 'ja' else 'English'
+        system_prompt = (
+            f"Translate each item's text to {language}. "
+            "Input is JSON: {\"items\": [{\"id\": 0, \"text\": \"...\"}]}. "
+            "Output JSON: {\"translations\": [{\"id\": 0, \"text\": \"...\"}]} "
+            "with exactly one entry per input id. Return only the JSON object."
+        )
+        payload = json.dumps(
+            {"items": [{"id": i, "text": t} for i, t in items.items()]},
+            ensure_ascii=False, separators=(",", ":")
+        )
+        response = _complete(
+            provider,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": payload}
+            ],
+            temperature=0.2,
+            max_tokens=min(4096, 64 + 2 * estimate_tokens(payload)),
+            response_format={"type": "json_object"}
+        )
+        res = json.loads(response.choices[0].message.content)
+        translated = {}
+        for entry in res.get("translations", []):
+            key = entry.get("id")
+            if isinstance(key, str) and key.isdigit():
+                key = int(key)
+            if key in items and entry.get("text"):
+                translated[key] = entry["text"].strip()
+        return translated
+    return call_with_fallback(_translate_batch, items, dest_lang, provider=provider)
+
+def _intent_messages(user_query):
+    system_prompt = (
+        "You are a shopping assistant for Mercari Japan. "
+        "Given a user's request, extract search filters as JSON. "
+        "IMPORTANT: Mercari Japan titles are mostly in Japanese. "
+        "If the user query is in English, you MUST include both English and translated Japanese keywords in the 'keywords' list to ensure high recall. "
+        "For example, if the user asks for 'backpack', include ['backpack', 'リュック', 'バックパック'].\n\n"
+        "Return JSON with:\n"
+        "- keywords (list of strings)\n"
+        "- category (string, optional)\n"
+        "- min_price (float, optional)\n"
+        "- max_price (float, optional)\n"
+        "- tags (list of strings, optional)\n"
+        "IMPORTANT: Return ONLY valid JSON."
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_query}
+    ]
 
 # Use LLM to extract search intent and filters
 def extract_search_intent(user_query, language="en", provider=None):
-    def _extract(user_query, language, provider):
-        client = get_client(provider)
-        model = get_model_name(provider)
-        system_prompt = (
-            "You are a shopping assistant for Mercari Japan. "
-            "Given a user's request, extract search filters as JSON. "
-            "IMPORTANT: Mercari Japan titles are mostly in Japanese. "
-            "If the user query is in English, you MUST include both English and translated Japanese keywords in the 'keywords' list to ensure high recall. "
-            "For example, if the user asks for 'backpack', include ['backpack', 'リュック', 'バックパック'].\n\n"
-            "Return JSON with:\n"
-            "- keywords (list of strings)\n"
-            "- category (string, optional)\n"
-            "- min_price (float, optional)\n"
-            "- max_price (float, optional)\n"
-            "- tags (list of strings, optional)\n"
-            "IMPORTANT: Return ONLY valid JSON."
+    def _extract_search_intent(user_query, language, provider):
+        response = _complete(
+            provider,
+            messages=_intent_messages(user_query),
+            temperature=0.1,
+            max_tokens=512,
+            response_format={"type": "json_object"}
         )
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query}
-        ]
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
+        return response.choices[0].message.content
+    return call_with_fallback(_extract_search_intent, user_query, language, provider=provider)
+
+async def extract_search_intent_async(user_query, language="en", provider=None):
+    async def _extract_search_intent(user_query, language, provider):
+        response = await _complete_async(
+            provider,
+            messages=_intent_messages(user_query),
             temperature=0.1,
             max_tokens=512,
             response_format={"type": "json_object"}
         )
         return response.choices[0].message.content
-    return call_with_fallback(_extract, user_query, language, provider=provider)
+    return await call_with_fallback_async(_extract_search_intent, user_query, language, provider=provider)
+
+# Token budget for the product list sent to recommend_products
+RECOMMEND_TOKEN_BUDGET = int(get_secret("RECOMMEND_TOKEN_BUDGET", 1200))
+RECOMMEND_TITLE_CHARS = int(get_secret("RECOMMEND_TITLE_CHARS", 60))
+
+# Build a compact, token-budgeted product table for the LLM.
+# Each row is [handle, title, price, condition, seller_rating]; URLs never leave
+# the process; the model answers with handles that resolve_recommendations maps
+# back to the full product records.
+def build_product_payload(products, token_budget=None, title_chars=None):
+    token_budget = RECOMMEND_TOKEN_BUDGET if token_budget is None else token_budget
+    title_chars = RECOMMEND_TITLE_CHARS if title_chars is None else title_chars
+
+    header = ["id", "title", "price", "condition", "rating"]
+    rows = []
+    used = estimate_tokens(json.dumps(header, ensure_ascii=False))
+    for handle, p in enumerate(products):
+        price = p.get("price")
+        rating = p.get("seller_rating")
+        row = [
+            handle,
+            _truncate(p.get("title"), title_chars),
+            int(price) if price is not None else None,
+            p.get("condition"),
+            int(rating) if rating is not None else None,
+        ]
+        cost = estimate_tokens(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        if rows and used + cost > token_budget:
+            break
+        rows.append(row)
+        used += cost
+    return json.dumps({"cols": header, "rows": rows}, ensure_ascii=False, separators=(",", ":"))
+
+# Re-join the handles returned by the model with the full product records.
+# Recommendations without a valid handle are passed through unchanged.
+def resolve_recommendations(rec_json, products):
+    res = json.loads(rec_json)
+    resolved = []
+    for rec in res.get("recommendations", []):
+        handle = rec.get("id")
+        if isinstance(handle, str) and handle.isdigit():
+            handle = int(handle)
+        if isinstance(handle, int) and 0 <= handle < len(products):
+            p = products[handle]
+            resolved.append({
+                "title": p.get("title"),
+                "price": p.get("price"),
+                "reason": rec.get("reason"),
+                "url": p.get("product_url"),
+                "image_url": p.get("image_url"),
+            })
+        else:
+            resolved.append(rec)
+    res["recommendations"] = resolved
+    return json.dumps(res, ensure_ascii=False)
+
+def _recommend_messages(products, user_query, token_budget=None):
+    system_prompt = (
+        "You are a highly skilled shopping assistant for Mercari Japan. "
+        "Given a user's request and a product table (JSON with 'cols' and 'rows'), "
+        "select the top 3 products that best match the user's needs. "
+        "For each recommendation, provide a concise reason in the user's query language. "
+        "Refer to products ONLY by their 'id'. "
+        "Output as a JSON object: {\"recommendations\": [{\"id\": 0, \"reason\": \"...\"}]} "
+        "Return only the JSON object, no extra text."
+    )
+    payload = build_product_payload(products, token_budget=token_budget)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"User request: {user_query}\nProducts: {payload}"}
+    ]
 
 # Use LLM to generate reasoned recommendations
-def recommend_products(products, user_query, language="en", provider=None):
-    def _recommend(products, user_query, language, provider):
-        client = get_client(provider)
-        model = get_model_name(provider)
-        system_prompt = (
-            "You are a highly skilled shopping assistant for Mercari Japan. "
-            "Given a user's request and a list of products (as JSON), "
-            "select the top 3 products that best match the user's needs. "
-            "For each recommendation, provide a concise reason in the user's query language. "
-            "Output as a JSON object with a 'recommendations' key containing a list of objects: "
-            "{\"recommendations\": [{\"title\": \"...\", \"price\": 123, \"reason\": \"...\", \"url\": \"...\", \"reason\": \"...\", \"url\": \"...\", \"image_url\": \"...\"}]} "
-            "Return only the JSON object, no extra text."
+def recommend_products(products, user_query, language="en", provider=None, token_budget=None):
+    def _recommend_products(products, user_query, language, provider):
+        response = _complete(
+            provider,
+            messages=_recommend_messages(products, user_query, token_budget),
+            temperature=0.2,
+            max_tokens=256,
+            response_format={"type": "json_object"}
         )
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"User request: {user_query}\nProducts: {products}"}
-        ]
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
+        return resolve_recommendations(response.choices[0].message.content, products)
+    return call_with_fallback(_recommend_products, products, user_query, language, provider=provider)
+
+async def recommend_products_async(products, user_query, language="en", provider=None, token_budget=None):
+    async def _recommend_products(products, user_query, language, provider):
+        response = await _complete_async(
+            provider,
+            messages=_recommend_messages(products, user_query, token_budget),
             temperature=0.2,
-            max_tokens=1024,
+            max_tokens=256,
             response_format={"type": "json_object"}
         )
-        return response.choices[0].message.content
-    return call_with_fallback(_recommend, products, user_query, language, provider=provider)
+        return resolve_recommendations(response.choices[0].message.content, products)
+    return await call_with_fallback_async(_recommend_products, products, user_query, language, provider=provider)
@@ -0,0 +1,240 @@
+import argparse
+import contextvars
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, create_engine, select
+from sqlalchemy.orm import declarative_base, sessionmaker
+from config import get_secret
+
+# Per-call LLM accounting (provider, model, tokens, wall time, cache hits)
+# kept in an in-process aggregate and, once enable_persistence() is called,
+# in a local SQLite metrics table. Also enforces token budgets so callers
+# can fall back to non-LLM paths instead of queueing.
+
+# Token budgets; 0 disables the limit
+LLM_SESSION_TOKEN_BUDGET = int(get_secret("LLM_SESSION_TOKEN_BUDGET", 50000))
+LLM_MINUTE_TOKEN_BUDGET = int(get_secret("LLM_MINUTE_TOKEN_BUDGET", 100000))
+# Kept local on purpose: writing metrics to a remote DB would add latency
+LLM_METRICS_DB_URL = get_secret("LLM_METRICS_DB_URL", "sqlite:///./llm_metrics.db")
+# Latency samples kept per operation for the in-process percentiles
+LATENCY_WINDOW = 1000
+# Per-session token counters kept in memory; the least recently used are
+# dropped beyond this many, and any idle for longer than the TTL
+MAX_TRACKED_SESSIONS = 10000
+SESSION_IDLE_TTL = 24 * 3600
+
+MetricsBase = declarative_base()
+
+class LLMCall(MetricsBase):
+    __tablename__ = 'llm_calls'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    session_id = Column(String)
+    operation = Column(String, nullable=False)
+    provider = Column(String)
+    model = Column(String)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    latency_ms = Column(Float)
+    cache_hit = Column(Boolean, default=False)
+    success = Column(Boolean, default=True)
+
+class LLMBudgetExceeded(Exception):
+    pass
+
+# Operation name and session of the LLM call in progress. Calls outside a
+# session (API requests, scraper and crawler jobs) are only held to the
+# per-minute budget.
+current_operation = contextvars.ContextVar("llm_operation", default="unknown")
+current_session = contextvars.ContextVar("llm_session", default=None)
+
+def set_session(session_id):
+    current_session.set(session_id)
+
+_lock = threading.Lock()
+_aggregate = defaultdict(lambda: {
+    "calls": 0, "errors": 0, "cache_hits": 0,
+    "prompt_tokens": 0, "completion_tokens": 0,
+    "latencies_ms": deque(maxlen=LATENCY_WINDOW),
+})
+_session_tokens = OrderedDict()  # session_id -> [tokens, last used (monotonic)]
+_minute_window = deque()  # (timestamp, tokens)
+
+_write_queue = None
+
+def _prune_window(now):
+    while _minute_window and now - _minute_window[0][0] > 60:
+        _minute_window.popleft()
+
+def tokens_last_minute():
+    with _lock:
+        _prune_window(time.monotonic())
+        return sum(t for _, t in _minute_window)
+
+def _evict_sessions(now):
+    while _session_tokens:
+        oldest = next(iter(_session_tokens.values()))
+        if len(_session_tokens) <= MAX_TRACKED_SESSIONS and now - oldest[1] <= SESSION_IDLE_TTL:
+            break
+        _session_tokens.popitem(last=False)
+
+def session_tokens(session_id=None):
+    session_id = session_id or current_session.get()
+    with _lock:
+        entry = _session_tokens.get(session_id)
+        return entry[0] if entry else 0
+
+# True when both the session and per-minute budgets still have room
+def budget_available(session_id=None):
+    session_id = session_id or current_session.get()
+    with _lock:
+        _prune_window(time.monotonic())
+        entry = _session_tokens.get(session_id)
+        if LLM_SESSION_TOKEN_BUDGET and entry and entry[0] >= LLM_SESSION_TOKEN_BUDGET:
+            return False
+        if LLM_MINUTE_TOKEN_BUDGET and sum(t for _, t in _minute_window) >= LLM_MINUTE_TOKEN_BUDGET:
+            return False
+    return True
+
+def check_budget():
+    if not budget_available():
+        raise LLMBudgetExceeded(f"LLM token budget exhausted for session '{current_session.get() or '-'}'.")
+
+def record_call(provider=None, model=None, prompt_tokens=0, completion_tokens=0, latency_ms=0.0,
+                cache_hit=False, success=True, operation=None):
+    operation = operation or current_operation.get()
+    session_id = current_session.get()
+    tokens = prompt_tokens + completion_tokens
+    with _lock:
+        agg = _aggregate[operation]
+        agg["calls"] += 1
+        agg["errors"] += 0 if success else 1
+        agg["cache_hits"] += 1 if cache_hit else 0
+        agg["prompt_tokens"] += prompt_tokens
+        agg["completion_tokens"] += completion_tokens
+        if not cache_hit:
+            agg["latencies_ms"].append(latency_ms)
+        if tokens:
+            now = time.monotonic()
+            if session_id is not None:
+                entry = _session_tokens.pop(session_id, [0, now])
+                entry[0] += tokens
+                entry[1] = now
+                _session_tokens[session_id] = entry
+                _evict_sessions(now)
+            _minute_window.append((now, tokens))
+    if _write_queue is not None:
+        _write_queue.put(dict(
+            created_at=datetime.now(timezone.utc), session_id=session_id, operation=operation,
+            provider=provider, model=model, prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens, latency_ms=latency_ms,
+            cache_hit=cache_hit, success=success,
+        ))
+
+def record_cache_hit(operation, hits=1):
+    for _ in range(hits):
+        record_call(provider="cache", cache_hit=True, operation=operation)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _summarize(calls, errors, cache_hits, prompt_tokens, completion_tokens, latencies):
+    llm_calls = calls - cache_hits
+    return {
+        "calls": calls,
+        "errors": errors,
+        "cache_hits": cache_hits,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "avg_prompt_tokens": prompt_tokens / llm_calls if llm_calls else 0.0,
+        "avg_completion_tokens": completion_tokens / llm_calls if llm_calls else 0.0,
+    }
+
+# In-process summary per operation
+def summary():
+    with _lock:
+        return {
+            op: _summarize(a["calls"], a["errors"], a["cache_hits"], a["prompt_tokens"],
+                           a["completion_tokens"], list(a["latencies_ms"]))
+            for op, a in _aggregate.items()
+        }
+
+def reset():
+    global _write_queue
+    with _lock:
+        _aggregate.clear()
+        _session_tokens.clear()
+        _minute_window.clear()
+    _write_queue = None
+
+def _writer(q, Session):
+    while True:
+        rows = [q.get()]
+        while not q.empty() and len(rows) < 100:
+            rows.append(q.get_nowait())
+        try:
+            with Session() as session:
+                session.add_all([LLMCall(**r) for r in rows])
+                session.commit()
+        except Exception as e:
+            print(f"⚠️ Could not persist LLM metrics: {e}")
+
+# Start persisting calls to the metrics table from a background writer thread
+def enable_persistence(url=None):
+    global _write_queue
+    if _write_queue is not None:
+        return
+    engine = create_engine(url or LLM_METRICS_DB_URL)
+    MetricsBase.metadata.create_all(bind=engine)
+    _write_queue = queue.Queue()
+    threading.Thread(target=_writer, args=(_write_queue, sessionmaker(bind=engine)), daemon=True).start()
+
+# Summary per operation from the metrics table
+def report(url=None, hours=24):
+    engine = create_engine(url or LLM_METRICS_DB_URL)
+    MetricsBase.metadata.create_all(bind=engine)
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    rows = defaultdict(list)
+    with sessionmaker(bind=engine)() as session:
+        for call in session.scalars(select(LLMCall).where(LLMCall.created_at >= since)):
+            rows[call.operation].append(call)
+
+    result = {}
+    for op, calls in rows.items():
+        hits = [c for c in calls if c.cache_hit]
+        real = [c for c in calls if not c.cache_hit]
+        result[op] = _summarize(
+            len(calls), sum(1 for c in calls if not c.success), len(hits),
+            sum(c.prompt_tokens or 0 for c in real), sum(c.completion_tokens or 0 for c in real),
+            [c.latency_ms for c in real if c.success],
+        )
+        result[op]["providers"] = dict(Counter(c.provider for c in real))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize LLM call metrics")
+    parser.add_argument("--hours", type=float, default=24, help="look-back window")
+    parser.add_argument("--db", default=None, help="metrics DB URL")
+    args = parser.parse_args()
+
+    result = report(args.db, args.hours)
+    if not result:
+        print("No LLM calls recorded.")
+        return
+    print(f"{'operation':<24} {'calls':>6} {'errors':>6} {'cached':>6} {'p50 ms':>8} {'p95 ms':>8} {'prompt':>7} {'compl':>6}  providers")
+    for op, s in sorted(result.items()):
+        providers = ", ".join(f"{p}={n}" for p, n in s["providers"].items())
+        print(f"{op:<24} {s['calls']:>6} {s['errors']:>6} {s['cache_hits']:>6} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+              f"{s['avg_prompt_tokens']:>7.0f} {s['avg_completion_tokens']:>6.0f}  {providers}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Local OpenAI-compatible chat completions stub for tests and benchmarks.
+
+Serves POST /v1/chat/completions (plain and streaming) with canned JSON for
+the intent, recommendation and translation prompts in llm_agent, plus
+configurable latency, generation speed and error injection. Point the app at
+it with:
+
+    python llm_stub.py --port 8800 --latency 0.3 --tps 150
+    OPENROUTER_BASE_URL=http://127.0.0.1:8800/v1 OPENROUTER_API_KEY=stub streamlit run streamlit_app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SETTINGS = {
+    # Seconds before the first byte of every response
+    "latency": 0.0,
+    # Simulated generation speed; 0 disables the delay
+    "tokens_per_sec": 0.0,
+    # Fraction of requests answered with `error_status`
+    "error_rate": 0.0,
+    "error_status": 500,
+    "seed": None,
+}
+
+# Same heuristic as llm_agent.estimate_tokens; the stub deliberately avoids
+# importing llm_agent, which reads provider settings at import time
+def estimate_tokens(text):
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def _last_user_message(messages):
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return m.get("content") or ""
+    return ""
+
+def _system_message(messages):
+    for m in messages:
+        if m.get("role") == "system":
+            return m.get("content") or ""
+    return ""
+
+def canned_intent(query):
+    words = [w for w in re.split(r"\s+", query) if w]
+    intent = {"keywords": [w for w in words if not w.isdigit()] or [query]}
+    prices = [float(w) for w in words if w.isdigit()]
+    if prices:
+        intent["max_price"] = max(prices)
+    return intent
+
+def canned_recommendations(user_message):
+    ids = []
+    match = re.search(r"Products: (\{.*\})", user_message, re.S)
+    if match:
+        try:
+            ids = [row[0] for row in json.loads(match.group(1)).get("rows", [])]
+        except ValueError:
+            pass
+    return {"recommendations": [{"id": i, "reason": "Good match for the request (stub)."} for i in ids[:3]]}
+
+def canned_translations(user_message):
+    try:
+        items = json.loads(user_message).get("items", [])
+    except ValueError:
+        items = []
+    return {"translations": [{"id": it["id"], "text": f"[en] {it['text']}"} for it in items]}
+
+# Pick a canned response from the shape of the llm_agent prompt
+def canned_response(messages):
+    system = _system_message(messages)
+    user = _last_user_message(messages)
+    if "extract search filters" in system:
+        return json.dumps(canned_intent(user), ensure_ascii=False)
+    if "recommendations" in system:
+        return json.dumps(canned_recommendations(user), ensure_ascii=False)
+    if "Translate each item" in system:
+        return json.dumps(canned_translations(user), ensure_ascii=False)
+    if user.startswith("Translate the following text"):
+        return f"[translated] {user.split(chr(10), 1)[-1]}"
+    return json.dumps({"echo": user}, ensure_ascii=False)
+
+class StubHandler(BaseHTTPRequestHandler):
+    settings = DEFAULT_SETTINGS
+    rng = random.Random()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        settings = self.settings
+        if settings["latency"]:
+            time.sleep(settings["latency"])
+        if settings["error_rate"] and self.rng.random() < settings["error_rate"]:
+            self._send_json(settings["error_status"], {"error": {"message": "injected failure", "type": "stub_error"}})
+            return
+
+        messages = request.get("messages", [])
+        content = canned_response(messages)
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(content)
+        model = request.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if request.get("stream"):
+            self._stream(completion_id, model, content)
+            return
+
+        if settings["tokens_per_sec"]:
+            time.sleep(completion_tokens / settings["tokens_per_sec"])
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream(self, completion_id, model, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        # ~4 characters per chunk, paced at the configured tokens/sec
+        delay = 1.0 / self.settings["tokens_per_sec"] if self.settings["tokens_per_sec"] else 0
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for i, piece in enumerate(pieces + [None]):
+            delta = {"content": piece} if piece is not None else {}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if piece is not None else "stop"}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if delay and piece is not None:
+                time.sleep(delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+# Start the stub in a daemon thread; returns (server, base_url).
+# Call server.shutdown() to stop it.
+def start_stub(host="127.0.0.1", port=0, **settings):
+    merged = dict(DEFAULT_SETTINGS, **settings)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "settings": merged,
+        "rng": random.Random(merged["seed"]),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--tps", type=float, default=0.0, help="simulated completion tokens/sec")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server, base_url = start_stub(
+        args.host, args.port,
+        latency=args.latency, tokens_per_sec=args.tps,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed,
+    )
+    print(f"🧪 LLM stub listening on {base_url}")
+    print(f"   export OPENROUTER_BASE_URL={base_url} OPENROUTER_API_KEY=stub")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
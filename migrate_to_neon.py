@@ -1,14 +1,155 @@
+import argparse
+import hashlib
+import io
+import json
 import os
-from sqlalchemy import create_engine
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, insert, select, text
 from sqlalchemy.orm import sessionmaker
-from models import Product, Base
+from models import Product, db_now, ensure_schema
 from config import DB_URL
+from deals import rebuild
 
 # Path to local SQLite
 LOCAL_DB_PATH = "mercari_local.db"
 LOCAL_DB_URL = f"sqlite:///./{LOCAL_DB_PATH}"
 
-def migrate():
+# Rows per COPY/INSERT batch and parallel target connections
+MIGRATE_CHUNK_SIZE = 5000
+MIGRATE_WORKERS = 4
+CHECKPOINT_PATH = ".migrate_checkpoint.json"
+
+# The checkpoint holds the last source id below which every chunk has been
+# committed to the target. Chunks are idempotent (ON CONFLICT DO NOTHING), so
+# resuming may resend at most the chunks that were in flight.
+
+def _target_key(target_url):
+    # Identify the target without storing credentials in the checkpoint
+    return hashlib.sha256(str(target_url).encode("utf-8")).hexdigest()[:16]
+
+def load_checkpoint(path, target_url):
+    if not os.path.exists(path):
+        return ""
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("last_id", "") if data.get("target") == _target_key(target_url) else ""
+
+def save_checkpoint(path, target_url, last_id):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"target": _target_key(target_url), "last_id": last_id}, f)
+    os.replace(tmp, path)
+
+# changed_at is the sync watermark of the database that wrote the row, so
+# it is never copied; the target stamps its own
+def _shared_columns(source_engine):
+    source_cols = {c["name"] for c in inspect(source_engine).get_columns("products")}
+    return [c for c in Product.__table__.columns if c.name in source_cols and c.name != "changed_at"]
+
+# Source rows in id order, one keyset query per chunk
+def read_chunks(source_engine, columns, chunk_size, after_id=""):
+    id_col = Product.__table__.c.id
+    last_id = after_id
+    while True:
+        with source_engine.connect() as conn:
+            rows = conn.execute(
+                select(*columns).where(id_col > last_id).order_by(id_col).limit(chunk_size)
+            ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+def _csv_field(value):
+    # Unquoted empty field is NULL in COPY's csv format; strings are always quoted
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_chunk(conn, columns, rows):
+    # COPY into a per-transaction staging table, then a single set-based insert
+    names = ", ".join(c.name for c in columns)
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(",".join(_csv_field(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+
+    conn.execute(text(
+        "CREATE TEMP TABLE products_staging (LIKE products INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+    cursor = conn.connection.driver_connection.cursor()
+    cursor.copy_expert(f"COPY products_staging ({names}) FROM STDIN WITH (FORMAT csv)", buf)
+    # COPY skips client-side defaults, so stamp changed_at here
+    stamp = db_now().compile(dialect=conn.dialect)
+    result = conn.execute(text(
+        f"INSERT INTO products ({names}, changed_at) SELECT {names}, {stamp} FROM products_staging "
+        "ON CONFLICT DO NOTHING"
+    ))
+    return result.rowcount
+
+def _insert_chunk(conn, columns, rows):
+    # Non-Postgres targets (e.g. a SQLite replica): executemany INSERT OR IGNORE
+    stmt = insert(Product.__table__).prefix_with("OR IGNORE")
+    result = conn.execute(stmt, [dict(zip((c.name for c in columns), row)) for row in rows])
+    return result.rowcount
+
+def write_chunk(target_engine, columns, rows):
+    with target_engine.begin() as conn:
+        if target_engine.dialect.name == "postgresql":
+            return _copy_chunk(conn, columns, rows)
+        return _insert_chunk(conn, columns, rows)
+
+# Stream every source product into the target in keyset-ordered chunks,
+# written on parallel connections and checkpointed so an interrupted run
+# resumes where it stopped. Returns (rows read, rows inserted).
+def stream_migrate(source_engine, target_engine, chunk_size=MIGRATE_CHUNK_SIZE, workers=MIGRATE_WORKERS,
+                   checkpoint_path=CHECKPOINT_PATH):
+    target_url = target_engine.url.render_as_string(hide_password=True)
+    after_id = load_checkpoint(checkpoint_path, target_url)
+    if after_id:
+        print(f"⏩ Resuming after id {after_id}")
+
+    columns = _shared_columns(source_engine)
+    start = time.perf_counter()
+    read = inserted = 0
+
+    def finish(future, last_id, size):
+        nonlocal read, inserted
+        inserted += future.result()
+        read += size
+        save_checkpoint(checkpoint_path, target_url, last_id)
+        rate = read / max(time.perf_counter() - start, 1e-9)
+        print(f"  … {read} rows read, {inserted} inserted ({rate:.0f} rows/s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Results are collected in submission order so the checkpoint only
+        # ever moves past chunks that are fully committed
+        pending = deque()
+        for rows in read_chunks(source_engine, columns, chunk_size, after_id):
+            pending.append((pool.submit(write_chunk, target_engine, columns, rows), rows[-1].id, len(rows)))
+            if len(pending) >= workers * 2:
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.perf_counter() - start
+    print(f"📦 {read} rows in {elapsed:.1f}s ({read / max(elapsed, 1e-9):.0f} rows/s)")
+    return read, inserted
+
+def migrate(chunk_size=MIGRATE_CHUNK_SIZE, workers=MIGRATE_WORKERS):
     if not os.path.exists(LOCAL_DB_PATH):
         print(f"❌ Local database '{LOCAL_DB_PATH}' not found. Nothing to migrate.")
         return
@@ -21,56 +162,31 @@ def migrate():
 
     print(f"🔄 Migrating data from {LOCAL_DB_URL} to {DB_URL}...")
 
-    # Engines for both
     local_engine = create_engine(LOCAL_DB_URL)
-    neon_engine = create_engine(DB_URL)
+    # One pooled connection per worker
+    neon_engine = create_engine(DB_URL, pool_pre_ping=True, pool_size=workers, max_overflow=0)
 
     # Ensure tables exist in Neon
     print("🛠️ Creating tables in NeonDB if they don't exist...")
-    Base.metadata.create_all(bind=neon_engine)
-
-    # Sessions
-    LocalSession = sessionmaker(bind=local_engine)
-    NeonSession = sessionmaker(bind=neon_engine)
-
-    with LocalSession() as local_session:
-        # Fetch all products from SQLite
-        products = local_session.query(Product).all()
-        print(f"📦 Found {len(products)} products in local database.")
-
-        if not products:
-            print("No data to migrate.")
-            return
+    ensure_schema(neon_engine)
 
-        with NeonSession() as neon_session:
-            # Check for existing URLs in Neon to avoid duplicates
-            existing_urls = {p.product_url for p in neon_session.query(Product.product_url).all()}
-            
-            new_products = []
-            for p in products:
-                if p.product_url not in existing_urls:
-                    # Clear session state for the object to add it to a new session
-                    # We create a new Product instance to be safe
-                    new_p = Product(
-                        id=p.id,
-                        title=p.title,
-                        price=p.price,
-                        condition=p.condition,
-                        seller_rating=p.seller_rating,
-                        image_url=p.image_url,
-                        product_url=p.product_url,
-                        category=p.category,
-                        seo_tags=p.seo_tags,
-                        scraped_at=p.scraped_at
-                    )
-                    new_products.append(new_p)
-            
-            if new_products:
-                neon_session.add_all(new_products)
-                neon_session.commit()
-                print(f"✅ Successfully migrated {len(new_products)} NEW products to NeonDB.")
-            else:
-                print("✨ No new products to migrate (they already exist in Neon).")
+    read, inserted = stream_migrate(local_engine, neon_engine, chunk_size, workers)
+    if inserted:
+        print(f"✅ Successfully migrated {inserted} NEW products to NeonDB.")
+        # COPY bypasses deals.record_prices; give the new rows a price
+        # history and rescore against the merged catalog
+        with sessionmaker(bind=neon_engine)() as session:
+            categories = rebuild(session)
+            session.commit()
+        print(f"💰 Rebuilt price sketches and deal scores for {categories} categories.")
+    elif read:
+        print("✨ No new products to migrate (they already exist in Neon).")
+    else:
+        print("No data to migrate.")
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Migrate local SQLite products to NeonDB")
+    parser.add_argument("--chunk-size", type=int, default=MIGRATE_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=MIGRATE_WORKERS)
+    args = parser.parse_args()
+    migrate(args.chunk_size, args.workers)
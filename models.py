@@ -1,17 +1,41 @@
-from sqlalchemy import Column, String, Float, DateTime, create_engine, Index, JSON
+from sqlalchemy import Column, String, Float, Integer, DateTime, Text, create_engine, Index, JSON, inspect, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql.expression import FunctionElement
 import uuid
 from datetime import datetime, timezone
 from config import DB_URL
 
 Base = declarative_base()
 
-# Helper for cross-DB compatibility
+# Current UTC time from the database's own clock. On SQLite it is rendered in
+# the format SQLAlchemy stores DateTime values in, so stored and bound values
+# compare as equal strings; CURRENT_TIMESTAMP has whole seconds and no
+# fraction there.
+class db_now(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(db_now)
+def _db_now(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+@compiles(db_now, "sqlite")
+def _db_now_sqlite(element, compiler, **kw):
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+@compiles(db_now, "postgresql")
+def _db_now_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', STATEMENT_TIMESTAMP())"
+
+# Helper for cross-DB compatibility. None is stored as SQL NULL, not the
+# JSON 'null': "untagged" means seo_tags IS NULL, also for rows written by
+# Core inserts (sync, migrations, snapshot imports).
 def get_json_type():
     if DB_URL.startswith("postgresql"):
-        return JSONB
-    return JSON
+        return JSONB(none_as_null=True)
+    return JSON(none_as_null=True)
 
 class Product(Base):
     __tablename__ = 'products'
@@ -26,13 +50,117 @@ class Product(Base):
     product_url = Column(String, nullable=False, unique=True)
     category = Column(String)
     seo_tags = Column(get_json_type())
+    # English title, precomputed at ingest so the UI never waits on translation
+    title_en = Column(String)
+    # Hash of the tag rule set seo_tags was computed with
+    tag_rules_version = Column(String(16))
     scraped_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Share of the category's observed prices above this one (0-1, higher is
+    # a better deal); maintained by deals.record_prices
+    deal_score = Column(Float)
+    # Bumped on every write; last-writer-wins between synced databases
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+    # When this database last wrote the row, by its own clock; the delta
+    # sync watermark. Unlike updated_at it is never copied from a peer.
+    changed_at = Column(DateTime, default=db_now(), onupdate=db_now())
+
+class Translation(Base):
+    __tablename__ = 'translations'
+
+    # sha256 of the source text; (text_hash, lang) identifies a translation
+    text_hash = Column(String(64), primary_key=True)
+    lang = Column(String(8), primary_key=True)
+    source_text = Column(Text, nullable=False)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class SyncWatermark(Base):
+    __tablename__ = 'sync_watermarks'
+
+    # Highest changed_at (source clock) already shipped from one database
+    # to another
+    peer = Column(String(16), primary_key=True)
+    direction = Column(String(8), primary_key=True)
+    watermark = Column(DateTime)
+
+class TagRuleSet(Base):
+    __tablename__ = 'tag_rule_sets'
+
+    # Every rule set the catalog has been re-tagged against, newest last
+    version = Column(String(16), primary_key=True)
+    rules = Column(JSON, nullable=False)
+    applied_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class CrawlKeyword(Base):
+    __tablename__ = 'crawl_keywords'
+
+    # Normalized search keyword (NFKC, casefolded, single-spaced)
+    keyword = Column(String(64), primary_key=True)
+    # Exponentially decayed search count, as of popularity_at
+    popularity = Column(Float, nullable=False, default=0.0)
+    popularity_at = Column(DateTime)
+    searches = Column(Integer, nullable=False, default=0)
+    last_crawled_at = Column(DateTime)
+
+class PriceObservation(Base):
+    __tablename__ = 'price_observations'
+
+    # Append-only: one row per product when first seen and whenever its
+    # price changes
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    observed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class CategoryPriceSketch(Base):
+    __tablename__ = 'category_price_sketches'
+
+    category = Column(String, primary_key=True)
+    # Serialized deals.TDigest of every price observed in the category
+    digest = Column(JSON, nullable=False)
+    observations = Column(Integer, nullable=False, default=0)
+    # observations when the category's deal scores were last recomputed
+    scored_observations = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+Index('ix_price_observations_product', PriceObservation.product_id, PriceObservation.observed_at)
+
+Index('ix_products_title', Product.title)
+Index('ix_products_category', Product.category)
+Index('ix_products_updated_at', Product.updated_at, Product.id)
+Index('ix_products_changed_at', Product.changed_at, Product.id)
+# Postgres-only indexes are guarded per dialect rather than by DB_URL: sync
+# runs ensure_schema on the local SQLite file while DB_URL points at Postgres
+Index('ix_products_seo_tags', Product.seo_tags, postgresql_using='gin',
+      postgresql_ops={'seo_tags': 'jsonb_path_ops'}).ddl_if(dialect='postgresql')
+# Trigram index so substring (ILIKE '%kw%') title lookups can use an index
+Index('ix_products_title_trgm', Product.title, postgresql_using='gin',
+      postgresql_ops={'title': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+Index('ix_products_deal_score', Product.deal_score.desc().nulls_last()).ddl_if(dialect='postgresql')
+# SQLite sorts NULLs first, so a backwards scan puts unscored rows last
+Index('ix_products_deal_score', Product.deal_score).ddl_if(dialect='sqlite')
 
-if DB_URL.startswith("postgresql"):
-    Index('ix_products_title', Product.title)
-    Index('ix_products_category', Product.category)
-    Index('ix_products_seo_tags', Product.seo_tags, postgresql_using='gin', postgresql_ops={'seo_tags': 'jsonb_path_ops'})
-else:
-    # Simpler indices for SQLite
-    Index('ix_products_title', Product.title)
-    Index('ix_products_category', Product.category)
+# Create missing tables and add missing nullable columns (and their
+# indexes) to existing ones.
+# create_all never alters a table, so databases created before a column was
+# added to a model would otherwise fail on every query touching it.
+def ensure_schema(bind):
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        # Inspect through the same connection; the SQLite writer pool has one
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            # Indexes on newly added columns
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
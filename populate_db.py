@@ -1,7 +1,8 @@
 import uuid
 from datetime import datetime, timezone
-from models import Product, Base
+from models import Product, ensure_schema
 from config import engine, SessionLocal
+from deals import record_prices
 import random
 
 # Initial keywords map for SEO tags
@@ -17,7 +18,7 @@ KEYWORD_TAG_MAP = {
 
 def populate():
     # Create tables
-    Base.metadata.create_all(bind=engine)
+    ensure_schema(engine)
     
     with SessionLocal() as session:
         # Check if we already have data
@@ -48,7 +49,8 @@ def populate():
             )
             products.append(p)
             
-        session.add_all(products)
+        # Adds the products with their first price observations and scores
+        record_prices(session, [(p, p.price) for p in products])
         session.commit()
         print(f"✅ Added {len(products)} sample products to the database.")
 
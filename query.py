@@ -1,49 +1,143 @@
-from config import SessionLocal, DB_URL
-from models import Product
-from sqlalchemy import func, or_
+from collections import Counter
+# Catalog reads only, so they use the reader pool (or Postgres replica)
+from config import ReadSessionLocal as SessionLocal, DB_URL
+from models import CategoryPriceSketch, Product
+from sqlalchemy import case, func, or_, true
+import tracing
 
-def get_products(tags=None, category=None, keyword=None, min_price=None, max_price=None, min_rating=None, limit=30):
+# Apply get_products-style filters to a Product query
+def filter_products(q, tags=None, category=None, keyword=None, min_price=None, max_price=None, min_rating=None):
+    if tags:
+        # Handle cross-DB JSON tag searching
+        if DB_URL.startswith("postgresql"):
+            q = q.filter(Product.seo_tags.contains(tags))
+        else:
+            # SQLite-compatible tag matching
+            for tag in tags:
+                q = q.filter(Product.seo_tags.like(f'%"{tag}"%'))
+
+    if category:
+        q = q.filter(func.lower(Product.category) == category.lower())
+
+    if keyword:
+        # Multi-word/Multilingual keyword matching
+        # Split by spaces if it's a single string, or handle list
+        keywords = keyword if isinstance(keyword, list) else keyword.split()
+
+        # Use OR logic for multiple keywords to increase recall (multilingual support)
+        keyword_filters = []
+        for kw in keywords:
+            if len(kw) < 2: continue # Skip very short tokens
+            keyword_filters.append(Product.title.ilike(f"%{kw}%"))
+
+        if keyword_filters:
+            q = q.filter(or_(*keyword_filters))
+
+    if min_price is not None:
+        q = q.filter(Product.price >= min_price)
+
+    if max_price is not None:
+        q = q.filter(Product.price <= max_price)
+
+    if min_rating is not None:
+        q = q.filter(Product.seller_rating >= min_rating)
+    return q
+
+# Orderings for get_products(sort=...). deal_score is stored per product
+# (deals.record_prices), so sorting by it is an indexed column read.
+SORTS = {
+    # Unscored products last; plain DESC already does that on SQLite
+    "deal": (Product.deal_score.desc().nulls_last() if DB_URL.startswith("postgresql") else Product.deal_score.desc(),),
+    "price": (Product.price.asc(),),
+    "newest": (Product.scraped_at.desc(),),
+}
+
+@tracing.traced("query.get_products")
+def get_products(tags=None, category=None, keyword=None, min_price=None, max_price=None, min_rating=None, limit=30,
+                 sort=None):
     with SessionLocal() as session:
-        q = session.query(Product)
-        
-        if tags:
-            # Handle cross-DB JSON tag searching
-            if DB_URL.startswith("postgresql"):
-                q = q.filter(Product.seo_tags.contains(tags))
-            else:
-                # SQLite-compatible tag matching
-                for tag in tags:
-                    q = q.filter(Product.seo_tags.like(f'%"{tag}"%'))
-        
-        if category:
-            q = q.filter(func.lower(Product.category) == category.lower())
-            
-        if keyword:
-            # Multi-word/Multilingual keyword matching
-            # Split by spaces if it's a single string, or handle list
-            keywords = keyword if isinstance(keyword, list) else keyword.split()
-            
-            # Use OR logic for multiple keywords to increase recall (multilingual support)
-            keyword_filters = []
-            for kw in keywords:
-                if len(kw) < 2: continue # Skip very short tokens
-                keyword_filters.append(Product.title.ilike(f"%{kw}%"))
-            
-            if keyword_filters:
-                q = q.filter(or_(*keyword_filters))
-            
-        if min_price is not None:
-            q = q.filter(Product.price >= min_price)
-            
-        if max_price is not None:
-            q = q.filter(Product.price <= max_price)
-            
-        if min_rating is not None:
-            q = q.filter(Product.seller_rating >= min_rating)
-            
-        # Order by price/scraped_at or relevance could be added here
+        q = filter_products(session.query(Product), tags, category, keyword, min_price, max_price, min_rating)
+        if sort:
+            q = q.order_by(*SORTS[sort])
+
         return [p.__dict__ for p in q.limit(limit).all()]
 
+# Upper edges of the price facet buckets in yen; the last bucket is open
+PRICE_BUCKETS = [5000, 10000, 20000, 50000, 100000]
+
+# Counts per category, tag and price bucket over everything matching the
+# filters. Aggregated in the database; tags are expanded with the JSON
+# array table function of each backend.
+@tracing.traced("query.get_facets")
+def get_facets(tags=None, category=None, keyword=None, min_price=None, max_price=None, min_rating=None):
+    filters = (tags, category, keyword, min_price, max_price, min_rating)
+    bucket = case(*[(Product.price <= edge, i) for i, edge in enumerate(PRICE_BUCKETS)], else_=len(PRICE_BUCKETS))
+    if DB_URL.startswith("postgresql"):
+        tag = func.jsonb_array_elements_text(Product.seo_tags).table_valued("value").alias("tag")
+    else:
+        tag = func.json_each(Product.seo_tags).table_valued("value").alias("tag")
+
+    with SessionLocal() as session:
+        # One scan for total, categories and price buckets together
+        groups = (
+            filter_products(session.query(Product.category, bucket, func.count(Product.id)), *filters)
+            .group_by(Product.category, bucket).all()
+        )
+        tag_counts = (
+            filter_products(session.query(tag.c.value, func.count()).select_from(Product).join(tag, true()), *filters)
+            .group_by(tag.c.value).all()
+        )
+
+    categories, buckets = Counter(), Counter()
+    for cat, b, n in groups:
+        if cat:
+            categories[cat] += n
+        buckets[b] += n
+    edges = [0] + PRICE_BUCKETS + [None]
+    by_count = lambda rows: dict(sorted(rows, key=lambda r: (-r[1], r[0])))
+    return {
+        "total": sum(buckets.values()),
+        "categories": by_count(categories.items()),
+        "tags": by_count(tag_counts),
+        "price": [{"min": edges[i], "max": edges[i + 1], "count": buckets.get(i, 0)} for i in range(len(edges) - 1)],
+    }
+
+# Changes whenever a product is added, removed or updated. Every write sets
+# changed_at from the database clock, so its maximum moves even when a sync
+# copies an older updated_at; deal score refreshes leave products alone but
+# bump their category's sketch. MAX(changed_at) is an index lookup but
+# COUNT(*) is a scan, so callers should cache it.
+def catalog_version():
+    with SessionLocal() as session:
+        count, latest = session.query(func.count(Product.id), func.max(Product.changed_at)).one()
+        scored = session.query(func.max(CategoryPriceSketch.updated_at)).scalar()
+    return ":".join([str(count)] + [t.isoformat() if t else "" for t in (latest, scored)])
+
+# Upper bound of the price slider in the UI
+PRICE_CEILING = 100000
+
+# Combine UI filters with an extracted intent into get_products arguments
+def build_filters(search_term, intent=None, tag_filter=(), min_price=0, max_price=PRICE_CEILING, min_rating=0, limit=30):
+    intent = intent or {}
+    final_tags = sorted(set((intent.get("tags") or []) + list(tag_filter)))
+    final_keyword = " ".join(intent.get("keywords", [])) if intent.get("keywords") else search_term
+
+    # Safely handle potential None values from intent
+    intent_min = intent.get("min_price")
+    if intent_min is None: intent_min = 0
+    intent_max = intent.get("max_price")
+    if intent_max is None: intent_max = 1e9
+
+    return {
+        "tags": final_tags if final_tags else None,
+        "category": intent.get("category"),
+        "keyword": final_keyword if final_keyword else None,
+        "min_price": max(intent_min, min_price),
+        "max_price": min(intent_max, max_price),
+        "min_rating": min_rating if min_rating > 0 else None,
+        "limit": limit,
+    }
+
 # Backward compatibility functions
 def get_products_by_tags(tags: list, limit=10):
     return get_products(tags=tags, limit=limit)
@@ -0,0 +1,136 @@
+import math
+import re
+
+# Local pre-ranking between get_products and recommend_products.
+# Scores every candidate on keyword coverage, price fit, seller rating and
+# condition so only a short list goes to the LLM, or none at all when the
+# winner is obvious.
+
+WEIGHTS = {
+    "keywords": 0.4,
+    "price": 0.25,
+    "rating": 0.2,
+    "condition": 0.15,
+}
+
+# Number of candidates sent to the LLM
+SHORTLIST_SIZE = 6
+# Skip the LLM when the best candidate leads the runner-up by this much
+DECISIVE_MARGIN = 0.15
+# Ratings at or above this count as a perfect seller score
+RATING_CAP = 1000
+
+CONDITION_SCORES = {
+    # Mercari Japan condition labels
+    "新品、未使用": 1.0,
+    "未使用に近い": 0.9,
+    "目立った傷や汚れなし": 0.75,
+    "やや傷や汚れあり": 0.5,
+    "傷や汚れあり": 0.3,
+    "全体的に状態が悪い": 0.1,
+    # Labels used by the seed data
+    "new": 1.0,
+    "used - like new": 0.9,
+    "used - good": 0.7,
+    "used": 0.6,
+}
+
+_JAPANESE_RE = re.compile(r"[\u3040-\u30ff\u4e00-\u9fff]")
+
+def is_japanese(text):
+    return bool(_JAPANESE_RE.search(text or ""))
+
+def _query_keywords(intent, search_term):
+    keywords = intent.get("keywords") or (search_term or "").split()
+    return [kw.lower() for kw in keywords if len(kw) >= 2]
+
+def condition_score(condition):
+    if not condition:
+        return 0.5
+    return CONDITION_SCORES.get(condition.strip().lower(), 0.5)
+
+def rating_score(rating):
+    if not rating or rating <= 0:
+        return 0.0
+    return min(1.0, math.log1p(rating) / math.log1p(RATING_CAP))
+
+def price_score(price, low, high):
+    # Cheaper is better inside the range; anything outside the range scores 0
+    if price is None or high <= low:
+        return 0.5
+    if price < low or price > high:
+        return 0.0
+    return 1.0 - 0.5 * (price - low) / (high - low)
+
+# Score candidates and return them best first as
+# {"score": float, "components": {signal: 0..1}, "product": dict}
+def rank_products(products, intent=None, search_term=""):
+    intent = intent or {}
+    keywords = _query_keywords(intent, search_term)
+
+    prices = [p["price"] for p in products if p.get("price") is not None]
+    low = intent.get("min_price")
+    high = intent.get("max_price")
+    if low is None:
+        low = min(prices, default=0)
+    if high is None:
+        high = max(prices, default=0)
+
+    matches = []
+    for p in products:
+        title = (p.get("title") or "").lower()
+        matches.append(sum(1 for kw in keywords if kw in title))
+    best_match = max(matches, default=0)
+
+    ranked = []
+    for p, matched in zip(products, matches):
+        components = {
+            "keywords": matched / best_match if best_match else 0.0,
+            "price": price_score(p.get("price"), low, high),
+            "rating": rating_score(p.get("seller_rating")),
+            "condition": condition_score(p.get("condition")),
+        }
+        score = sum(WEIGHTS[name] * value for name, value in components.items())
+        ranked.append({"score": score, "components": components, "product": p})
+
+    ranked.sort(key=lambda r: r["score"], reverse=True)
+    return ranked
+
+def shortlist(ranked, size=SHORTLIST_SIZE):
+    return [r["product"] for r in ranked[:size]]
+
+def is_decisive(ranked, margin=DECISIVE_MARGIN):
+    if len(ranked) < 2:
+        return bool(ranked)
+    return ranked[0]["score"] - ranked[1]["score"] >= margin
+
+def _template_reason(entry, japanese):
+    c = entry["components"]
+    p = entry["product"]
+    parts = []
+    if c["keywords"] >= 1.0:
+        parts.append("検索条件に最も一致" if japanese else "Closest match to your search")
+    if c["price"] >= 0.75:
+        parts.append("予算内でお手頃な価格" if japanese else "Well priced for your budget")
+    if c["rating"] >= 0.6 and p.get("seller_rating"):
+        rating = int(p["seller_rating"])
+        parts.append(f"高評価の出品者 ({rating}件)" if japanese else f"Highly rated seller ({rating} reviews)")
+    if c["condition"] >= 0.9 and p.get("condition"):
+        parts.append(f"状態: {p['condition']}" if japanese else f"Condition: {p['condition']}")
+    if not parts:
+        parts.append("総合評価が高い商品" if japanese else "Best overall balance of price, rating and condition")
+    return ("、" if japanese else "; ").join(parts)
+
+# Build recommendations locally, in the same shape recommend_products returns
+def template_recommendations(ranked, search_term="", n=3):
+    japanese = is_japanese(search_term)
+    return [
+        {
+            "title": r["product"].get("title"),
+            "price": r["product"].get("price"),
+            "reason": _template_reason(r, japanese),
+            "url": r["product"].get("product_url"),
+            "image_url": r["product"].get("image_url"),
+        }
+        for r in ranked[:n]
+    ]
@@ -1,12 +1,16 @@
 import asyncio
 from mercapi import Mercapi
-from models import Product, Base
+from models import Product, ensure_schema
 from config import engine, SessionLocal
+from deals import record_prices
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timezone
 import uuid
+from llm_agent import llm_available
+from translations import translate_pending_titles
+import tracing
 
-Base.metadata.create_all(bind=engine)
+ensure_schema(engine)
 
 KEYWORDS = [
     # Japanese
@@ -15,6 +19,7 @@ KEYWORDS = [
     "smartphone", "bag", "earphones", "game", "camera", "watch", "clothes", "laptop", "toy", "book", "furniture", "appliance", "bicycle", "shoes", "accessory", "cosmetics", "sports", "outdoor", "instrument", "car", "motorcycle", "tablet", "tv", "refrigerator", "washing machine", "air conditioner", "figure", "dress", "sneakers", "wallet", "backpack", "necklace", "earrings", "ring", "perfume", "makeup", "golf", "fishing", "mountain", "guitar", "piano", "violin", "car parts", "motorcycle parts"
 ]
 
+@tracing.traced("scraper.scrape_mercari")
 async def scrape_mercari(keywords=KEYWORDS, items_per_keyword=5):
     scraped_count = 0
     m = Mercapi()
@@ -23,14 +28,16 @@ async def scrape_mercari(keywords=KEYWORDS, items_per_keyword=5):
         for keyword in keywords:
             print(f"Searching Mercari for: {keyword}")
             try:
-                results = await m.search(keyword)
+                with tracing.span("scraper.search", keyword=keyword):
+                    results = await m.search(keyword)
                 print(f"Found {results.meta.num_found} results. Fetching top {items_per_keyword}...")
                 
                 # Take only the first N items for this keyword
                 for idx, item in enumerate(results.items[:items_per_keyword]):
                     try:
                         # Fetch full details for each item
-                        full_item = await item.full_item()
+                        with tracing.span("scraper.full_item", keyword=keyword):
+                            full_item = await item.full_item()
                         title = full_item.name
                         price_val = float(full_item.price)
                         product_url = f"https://jp.mercari.com/item/{full_item.id_}"
@@ -49,6 +56,17 @@ async def scrape_mercari(keywords=KEYWORDS, items_per_keyword=5):
                             print(f"Skipping item {idx+1}: missing required fields.")
                             continue
 
+                        product = session.query(Product).filter(Product.product_url == product_url).one_or_none()
+                        if product is not None:
+                            # Re-scraped listing: only a price change is recorded
+                            changed = record_prices(session, [(product, price_val)])
+                            session.commit()
+                            if changed:
+                                print(f"Price of product {idx+1} for keyword '{keyword}' changed to ¥{price_val:,.0f}.")
+                            else:
+                                print(f"Product {idx+1} for keyword '{keyword}' already exists in DB. Skipping.")
+                            continue
+
                         product = Product(
                             id=str(uuid.uuid4()),
                             title=title.strip(),
@@ -60,11 +78,11 @@ async def scrape_mercari(keywords=KEYWORDS, items_per_keyword=5):
                             category=category,
                             scraped_at=datetime.now(timezone.utc)
                         )
-                        session.add(product)
-                        
-                        # Commit every 10 items or at the end of a keyword
-                        if scraped_count % 10 == 0:
-                            session.commit()
+                        # Adds the product with its first price observation.
+                        # record_prices flushes, so commit right away rather
+                        # than hold the SQLite write lock across the next fetch.
+                        record_prices(session, [(product, price_val)])
+                        session.commit()
                             
                         scraped_count += 1
                         print(f"Saved product {idx+1} for keyword '{keyword}': {title}")
@@ -84,5 +102,10 @@ async def scrape_mercari(keywords=KEYWORDS, items_per_keyword=5):
                 
     print(f"✅ Scraped and saved {scraped_count} items from Mercari using mercapi.")
 
+    # Precompute English titles so the UI never waits on translation
+    if scraped_count and llm_available():
+        translate_pending_titles()
+    return scraped_count
+
 if __name__ == "__main__":
     asyncio.run(scrape_mercari())
@@ -0,0 +1,89 @@
+"""End-to-end AI search latency benchmark against the local LLM stub.
+
+Seeds a throwaway SQLite database, starts llm_stub, points llm_agent at it
+and drives search_flow.ai_search (intent -> get_products -> recommend) over
+a fixed query set, reporting per-stage latency percentiles.
+
+    python scripts/bench_ai_search.py --latency 0.3 --tps 150 --rounds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+QUERIES = [
+    "iPhone under 60000",
+    "Switch",
+    "MacBook Pro",
+    "Nike sneakers 30000",
+    "Sony headphones",
+    "Bag",
+]
+
+STAGES = ["intent", "search", "refine", "recommend", "total"]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds per response")
+    parser.add_argument("--tps", type=float, default=150.0, help="stub completion tokens/sec")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the query set")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="bench_ai_search_")
+    os.environ["DB_URL"] = f"sqlite:///{db_dir}/bench.db"
+
+    # llm_agent reads its settings at import time, so start the stub and
+    # configure the environment before importing anything from the app.
+    # Both providers point at the stub: load_dotenv() doesn't override
+    # variables that are already set, so a real key in .env is never used.
+    from llm_stub import start_stub
+    server, base_url = start_stub(latency=args.latency, tokens_per_sec=args.tps, error_rate=args.error_rate, seed=0)
+    for provider in ("GROQ", "OPENROUTER"):
+        os.environ[f"{provider}_BASE_URL"] = base_url
+        os.environ[f"{provider}_API_KEY"] = "stub"
+
+    from populate_db import populate
+    from search_flow import run_ai_search
+    import llm_metrics
+
+    populate()
+
+    samples = {stage: [] for stage in STAGES}
+    llm_recommendations = 0
+    runs = 0
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            result = run_ai_search(query, max_price=100000)
+            runs += 1
+            llm_recommendations += result["used_llm_recommendations"]
+            for stage in STAGES:
+                if stage in result["timings"]:
+                    samples[stage].append(result["timings"][stage] * 1000)
+    server.shutdown()
+
+    print(f"Stub: latency={args.latency}s tps={args.tps} error_rate={args.error_rate}  runs={runs}")
+    print(f"{'stage':<10} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for stage in STAGES:
+        values = samples[stage]
+        if not values:
+            continue
+        print(f"{stage:<10} {len(values):>4} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f} {statistics.mean(values):>9.1f}")
+    print(f"LLM recommendation calls: {llm_recommendations}/{runs}")
+    print(f"\n{'operation':<24} {'calls':>6} {'prompt':>7} {'compl':>6}")
+    for op, s in sorted(llm_metrics.summary().items()):
+        print(f"{op:<24} {s['calls']:>6} {s['avg_prompt_tokens']:>7.0f} {s['avg_completion_tokens']:>6.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Load test for the JSON search API against a throwaway SQLite catalog.
+
+Seeds --products synthetic products, starts `api.py` under uvicorn with
+--workers processes and drives /products and /facets with --concurrency
+clients for --duration seconds, reporting requests/sec and latency
+percentiles. With --conditional, clients revalidate with If-None-Match as a
+caching client would, so most responses are 304s.
+
+    python scripts/bench_api.py --workers 4 --concurrency 32 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BRANDS = ["iPhone", "Samsung", "Switch", "MacBook", "Sony", "Nike", "Bag", "カメラ", "時計", "ゲーム"]
+TAGS = ["apple", "android", "smartphone", "gaming", "bag", "audio", "camera", "shoes"]
+CATEGORIES = ["Phones", "Games", "Computers", "Audio", "Fashion"]
+
+QUERIES = [
+    ("/products", {"keyword": "iPhone"}),
+    ("/products", {"keyword": "Switch", "max_price": "50000"}),
+    ("/products", {"tags": "gaming"}),
+    ("/products", {"category": "Audio", "min_rating": "100"}),
+    ("/products", {"keyword": "カメラ", "limit": "60"}),
+    ("/facets", {"keyword": "Sony"}),
+    ("/facets", {}),
+]
+
+def seed(db_url, n):
+    from sqlalchemy import create_engine, insert
+    from models import Base, Product
+
+    engine = create_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    rows = [
+        dict(id=str(uuid.uuid4()), title=f"{rng.choice(BRANDS)} {rng.choice(['Pro', 'Max', 'Mini'])} {i}",
+             price=float(rng.randint(1000, 150000)), seller_rating=float(rng.randint(10, 500)),
+             image_url=None, product_url=f"https://jp.mercari.com/item/m{i}",
+             category=rng.choice(CATEGORIES), seo_tags=rng.sample(TAGS, 2))
+        for i in range(n)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Product.__table__), rows)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))]
+
+async def client_loop(client, deadline, conditional, latencies, statuses, etags):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        path, params = rng.choice(QUERIES)
+        key = (path, tuple(sorted(params.items())))
+        headers = {"Accept-Encoding": "gzip"}
+        if conditional and key in etags:
+            headers["If-None-Match"] = etags[key]
+        start = time.perf_counter()
+        resp = await client.get(path, params=params, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        if "etag" in resp.headers:
+            etags[key] = resp.headers["etag"]
+
+async def load(base_url, concurrency, duration, conditional):
+    latencies, statuses, etags = [], {}, {}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        # Warm up every worker's pool and version cache
+        await asyncio.gather(*(client.get("/health") for _ in range(concurrency)))
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(client_loop(client, deadline, conditional, latencies, statuses, etags)
+                               for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--conditional", action="store_true", help="revalidate with If-None-Match")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="bench_api_")
+    db_url = f"sqlite:///{db_dir}/bench.db"
+    os.environ["DB_URL"] = db_url
+    seed(db_url, args.products)
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "api.py", "--port", str(port), "--workers", str(args.workers)],
+        cwd=ROOT, env=os.environ,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        latencies, statuses, elapsed = asyncio.run(load(base_url, args.concurrency, args.duration, args.conditional))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"products={args.products} workers={args.workers} concurrency={args.concurrency} "
+          f"conditional={args.conditional}")
+    print(f"requests: {len(latencies)} in {elapsed:.1f}s -> {len(latencies) / elapsed:.0f} req/s  statuses={statuses}")
+    print(f"latency ms: p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+          f"p99 {percentile(latencies, 99):.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare the legacy repr() product payload with the compact handle table.
+
+Offline mode estimates prompt tokens for a fixed set of queries.
+With --live, both prompts are sent to the configured provider and the
+reported prompt/completion tokens and wall time are printed.
+
+    python scripts/bench_recommend.py [--live] [--provider groq]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import llm_agent
+from llm_agent import build_product_payload, estimate_tokens, _recommend_messages
+
+QUERIES = [
+    "cheap iphone in good condition",
+    "リュック 1万円以下",
+    "nintendo switch with games",
+    "leather bag for work under 20000 yen",
+    "ワイヤレスイヤホン 新品",
+]
+
+def sample_products(n=15):
+    titles = [
+        "iPhone 13 Pro 128GB シエラブルー SIMフリー 美品 バッテリー89%",
+        "Nintendo Switch 有機ELモデル ホワイト 本体 ソフト付き",
+        "PORTER 吉田カバン リュック ブラック 通勤 ビジネス A4対応",
+        "SONY WF-1000XM4 ワイヤレスイヤホン ノイズキャンセリング 新品未開封",
+        "COACH レザー トートバッグ ブラウン 正規品",
+    ]
+    return [
+        {
+            "title": titles[i % len(titles)] + f" #{i}",
+            "price": 5000.0 + 1750 * i,
+            "condition": ["新品、未使用", "目立った傷や汚れなし", "やや傷や汚れあり"][i % 3],
+            "seller_rating": float(50 + 13 * i),
+            "product_url": f"https://jp.mercari.com/item/m{100000000 + i * 7919}",
+            "image_url": f"https://static.mercdn.net/item/detail/orig/photos/m{100000000 + i * 7919}_1.jpg",
+        }
+        for i in range(n)
+    ]
+
+def legacy_messages(products, user_query):
+    # Reproduces the pre-compaction prompt (Python repr with URLs)
+    system_prompt = (
+        "You are a highly skilled shopping assistant for Mercari Japan. "
+        "Given a user's request and a list of products (as JSON), "
+        "select the top 3 products that best match the user's needs. "
+        "For each recommendation, provide a concise reason in the user's query language. "
+        "Output as a JSON object with a 'recommendations' key containing a list of objects: "
+        "{\"recommendations\": [{\"title\": \"...\", \"price\": 123, \"reason\": \"...\", \"url\": \"...\", \"image_url\": \"...\"}]} "
+        "Return only the JSON object, no extra text."
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"User request: {user_query}\nProducts: {products}"}
+    ]
+
+def prompt_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+def run_live(messages, provider, max_tokens):
+    client = llm_agent.get_client(provider)
+    start = time.perf_counter()
+    response = client.chat.completions.create(
+        model=llm_agent.get_model_name(provider),
+        messages=messages,
+        temperature=0.2,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"}
+    )
+    elapsed = time.perf_counter() - start
+    usage = response.usage
+    return usage.prompt_tokens, usage.completion_tokens, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="call the LLM provider")
+    parser.add_argument("--provider", default="groq")
+    args = parser.parse_args()
+
+    products = sample_products()
+    print(f"{'query':<40} {'legacy':>8} {'compact':>8}")
+    totals = [0, 0]
+    for query in QUERIES:
+        old = prompt_tokens(legacy_messages(products, query))
+        new = prompt_tokens(_recommend_messages(products, query))
+        totals[0] += old
+        totals[1] += new
+        print(f"{query:<40} {old:>8} {new:>8}")
+    print(f"{'TOTAL (estimated prompt tokens)':<40} {totals[0]:>8} {totals[1]:>8}")
+    rows = len(json.loads(build_product_payload(products))["rows"])
+    print(f"Compact payload kept {rows}/{len(products)} products within {llm_agent.RECOMMEND_TOKEN_BUDGET} tokens")
+
+    if args.live:
+        print(f"\nLive run against {args.provider}:")
+        print(f"{'query':<40} {'variant':<8} {'prompt':>7} {'compl':>6} {'secs':>6}")
+        for query in QUERIES:
+            for name, messages, max_tokens in (
+                ("legacy", legacy_messages(products, query), 1024),
+                ("compact", _recommend_messages(products, query), 256),
+            ):
+                p, c, secs = run_live(messages, args.provider, max_tokens)
+                print(f"{query:<40} {name:<8} {p:>7} {c:>6} {secs:>6.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Reader latency on SQLite with and without concurrent ingest.
+
+Seeds --products synthetic products into a throwaway SQLite file, then runs
+--readers threads issuing catalog queries (filter_products, as get_products
+does) for --duration seconds, first alone and then while a separate process
+ingests batches of new products and price updates as the scraper would
+(throttled to --ingest-rate, so on small machines the comparison measures
+locking rather than CPU contention).
+Each scenario runs twice: with a plain engine on the default rollback journal
+("legacy") and with config.create_engines' WAL profile and read/write split
+("wal").
+
+    python scripts/bench_sqlite_concurrency.py --readers 4 --duration 10
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import sessionmaker
+
+from config import SQLITE_PRAGMAS, create_engines
+from models import Base, Product
+from query import filter_products
+
+BRANDS = ["iPhone", "Samsung", "Switch", "MacBook", "Sony", "Nike", "Bag", "カメラ", "時計", "ゲーム"]
+TAGS = ["apple", "android", "smartphone", "gaming", "bag", "audio", "camera", "shoes"]
+CATEGORIES = ["Phones", "Games", "Computers", "Audio", "Fashion"]
+
+QUERIES = [
+    {"keyword": "iPhone"},
+    {"keyword": "Switch", "max_price": 50000},
+    {"tags": ["gaming"]},
+    {"category": "Audio", "min_rating": 100},
+    {"keyword": "カメラ"},
+]
+
+def _rows(rng, n, start=0):
+    return [
+        dict(id=str(uuid.uuid4()), title=f"{rng.choice(BRANDS)} {rng.choice(['Pro', 'Max', 'Mini'])} {start + i}",
+             price=float(rng.randint(1000, 150000)), seller_rating=float(rng.randint(10, 500)),
+             product_url=f"https://jp.mercari.com/item/m{start + i}", category=rng.choice(CATEGORIES),
+             seo_tags=rng.sample(TAGS, 2), scraped_at=datetime.now(timezone.utc))
+        for i in range(n)
+    ]
+
+def _pragmas(mode):
+    return SQLITE_PRAGMAS if mode == "wal" else None
+
+# journal_mode=WAL is stored in the file, so each mode seeds its own database
+def seed(db_url, mode, n):
+    writer, _ = create_engines(db_url, pragmas=_pragmas(mode))
+    Base.metadata.create_all(bind=writer)
+    with writer.begin() as conn:
+        conn.execute(insert(Product.__table__), _rows(random.Random(0), n))
+    writer.dispose()
+
+# Runs in its own process: insert `batch` products and reprice as many
+# existing ones per transaction, at up to `rate` products/s (0 = flat out),
+# until `stop` is set
+def ingest(db_url, mode, batch, rate, stop, done):
+    writer, _ = create_engines(db_url, pragmas=_pragmas(mode))
+    rng = random.Random(1)
+    written = 0
+    start = time.perf_counter()
+    while not stop.is_set():
+        if rate:
+            time.sleep(max(0.0, start + written / rate - time.perf_counter()))
+        with writer.begin() as conn:
+            conn.execute(insert(Product.__table__), _rows(rng, batch, 10**7 + written))
+            for _ in range(batch):
+                conn.execute(update(Product).where(Product.product_url == f"https://jp.mercari.com/item/m{rng.randrange(1000)}")
+                             .values(price=float(rng.randint(1000, 150000))))
+        written += batch
+    done.value = written
+    writer.dispose()
+
+def read_load(Session, readers, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    def loop(seed_):
+        rng = random.Random(seed_)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with Session() as session:
+                    filter_products(session.query(Product), **rng.choice(QUERIES)).limit(30).all()
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))] if ordered else float("nan")
+
+def run(db_url, mode, readers, duration, batch, rate, with_ingest):
+    _, reader = create_engines(db_url, pragmas=_pragmas(mode))
+    Session = sessionmaker(bind=reader)
+    ctx = multiprocessing.get_context("spawn")
+    stop, done = ctx.Event(), ctx.Value("i", 0)
+    proc = None
+    if with_ingest:
+        proc = ctx.Process(target=ingest, args=(db_url, mode, batch, rate, stop, done))
+        proc.start()
+        time.sleep(1.0)  # let the writer get going
+    latencies, errors = read_load(Session, readers, duration)
+    if proc:
+        stop.set()
+        proc.join()
+    reader.dispose()
+    label = f"{mode:<6} {'+ ingest' if with_ingest else 'alone':<8}"
+    print(f"{label}  reads {len(latencies) / duration:>7.0f}/s  p50 {percentile(latencies, 50):7.2f} ms  "
+          f"p95 {percentile(latencies, 95):7.2f} ms  p99 {percentile(latencies, 99):8.2f} ms  "
+          f"max {max(latencies, default=float('nan')):8.1f} ms  errors {len(errors)}"
+          + (f"  ingested {done.value / duration:.0f} rows/s" if with_ingest else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch", type=int, default=50, help="products per ingest transaction")
+    parser.add_argument("--ingest-rate", type=float, default=500, help="products/s to ingest, 0 for unthrottled")
+    args = parser.parse_args()
+
+    for mode in ("legacy", "wal"):
+        db_url = f"sqlite:///{tempfile.mkdtemp(prefix='bench_sqlite_')}/bench.db"
+        seed(db_url, mode, args.products)
+        for with_ingest in (False, True):
+            run(db_url, mode, args.readers, args.duration, args.batch, args.ingest_rate, with_ingest)
+
+if __name__ == "__main__":
+    main()
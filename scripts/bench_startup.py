@@ -0,0 +1,84 @@
+"""Streamlit cold-start and rerun latency benchmark.
+
+Runs streamlit_app.py headless with streamlit's AppTest against a throwaway
+SQLite database and a local image stand-in. Cold start is measured in a
+fresh interpreter (imports, schema setup, seeding, first render); reruns
+re-execute the script after a widget change, as a browser interaction would.
+
+    python scripts/bench_startup.py --reruns 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SEARCH_TERMS = ["iPhone", "Switch", "Bag", "Sony", ""]
+
+def _app_test():
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(str(ROOT / "streamlit_app.py"), default_timeout=60)
+
+# One fresh interpreter: time to the first rendered page
+def cold_start():
+    start = time.perf_counter()
+    at = _app_test()
+    at.run()
+    return {"seconds": time.perf_counter() - start, "exception": bool(at.exception)}
+
+def cold_start_subprocess():
+    out = subprocess.run(
+        [sys.executable, __file__, "--cold-only"],
+        capture_output=True, text=True, cwd=ROOT, env=os.environ, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def rerun_latencies(reruns):
+    at = _app_test()
+    at.run()
+    samples = []
+    for i in range(reruns):
+        at.text_input[0].set_value(SEARCH_TERMS[i % len(SEARCH_TERMS)])
+        start = time.perf_counter()
+        at.run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--cold-starts", type=int, default=3)
+    parser.add_argument("--cold-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_only:
+        print(json.dumps(cold_start()))
+        return
+
+    db_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    os.environ["DB_URL"] = f"sqlite:///{db_dir}/bench.db"
+    os.environ["LLM_METRICS_DB_URL"] = f"sqlite:///{db_dir}/metrics.db"
+    # Serve every seeded picsum URL (.../400/400) from one local image
+    from PIL import Image
+    Image.new("RGB", (400, 400), "gray").save(f"{db_dir}/400", format="JPEG")
+    os.environ["THUMBNAIL_SOURCE_DIR"] = db_dir
+    os.environ["THUMBNAIL_DIR"] = f"{db_dir}/thumbnails"
+
+    colds = [cold_start_subprocess()["seconds"] * 1000 for _ in range(args.cold_starts)]
+    samples = rerun_latencies(args.reruns)
+
+    print(f"{'':<12} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for name, values in (("cold start", colds), ("rerun", samples)):
+        ordered = sorted(values)
+        p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+        print(f"{name:<12} {len(values):>4} {statistics.median(values):>9.1f} {p95:>9.1f} {statistics.mean(values):>9.1f}")
+
+if __name__ == "__main__":
+    main()
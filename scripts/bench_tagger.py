@@ -0,0 +1,84 @@
+"""Benchmark rule_based_tags: naive substring scan vs the compiled matcher.
+
+Builds synthetic bilingual keyword maps (10 / 1k / 10k entries by default)
+and tags a fixed corpus of generated titles with both strategies.
+
+    python scripts/bench_tagger.py --titles 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from seo_tagger import KEYWORD_TAG_MAP
+from tag_matcher import TagMatcher
+
+KATAKANA = [chr(c) for c in range(0x30A1, 0x30F6)]
+ASCII = "abcdefghijklmnopqrstuvwxyz"
+
+def make_keyword_map(size, rng):
+    keywords = dict(KEYWORD_TAG_MAP)
+    while len(keywords) < size:
+        alphabet = KATAKANA if rng.random() < 0.5 else ASCII
+        word = "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 8)))
+        keywords[word] = [f"tag{rng.randint(0, 499)}"]
+    return dict(list(keywords.items())[:size])
+
+def make_titles(n, keyword_map, rng):
+    keys = list(keyword_map)
+    fillers = ["美品", "新品", "送料無料", "正規品", "Pro", "Max", "2024", "ブラック", "ホワイト", "限定"]
+    titles = []
+    for _ in range(n):
+        words = rng.sample(fillers, 4) + [rng.choice(keys) for _ in range(rng.randint(0, 2))]
+        rng.shuffle(words)
+        titles.append(" ".join(words))
+    return titles
+
+# The pre-automaton implementation of rule_based_tags
+def naive_tags(title, keyword_map):
+    title_lower = title.lower()
+    tags = []
+    for keyword, mapped_tags in keyword_map.items():
+        if keyword in title_lower:
+            tags.extend(mapped_tags)
+    return set(tags)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--sizes", default="10,1000,10000", help="comma-separated keyword counts")
+    parser.add_argument("--naive-limit", type=int, default=20000,
+                        help="titles timed with the naive scan (extrapolated to --titles)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'keywords':>9} {'build s':>8} {'matcher s':>10} {'naive s':>10} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        keyword_map = make_keyword_map(size, rng)
+        titles = make_titles(args.titles, keyword_map, rng)
+
+        start = time.perf_counter()
+        matcher = TagMatcher(keyword_map)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for t in titles:
+            matcher.tags(t)
+        fast = time.perf_counter() - start
+
+        sample = titles[:args.naive_limit]
+        start = time.perf_counter()
+        for t in sample:
+            naive_tags(t, keyword_map)
+        naive = (time.perf_counter() - start) * len(titles) / len(sample)
+
+        mismatches = sum(1 for t in sample[:1000] if matcher.tags(t) != naive_tags(t, keyword_map))
+        note = "" if len(sample) == len(titles) else " (extrapolated)"
+        print(f"{size:>9} {build:>8.3f} {fast:>10.2f} {naive:>10.2f} {naive / fast:>7.1f}x{note}"
+              + (f"  MISMATCHES={mismatches}" if mismatches else ""))
+
+if __name__ == "__main__":
+    main()
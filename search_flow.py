@@ -0,0 +1,192 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import json
+import threading
+import time
+from datetime import datetime
+
+from query import get_products, build_filters, PRICE_CEILING
+from llm_agent import extract_search_intent_async, recommend_products_async, llm_available
+from ranker import rank_products, shortlist, is_decisive, template_recommendations
+import tracing
+
+# Whether a product already fetched also satisfies the non-keyword filters
+def matches_filters(product, filters):
+    price = product.get("price")
+    if price is None or price < filters["min_price"] or price > filters["max_price"]:
+        return False
+    if filters["min_rating"] is not None and (product.get("seller_rating") or 0) < filters["min_rating"]:
+        return False
+    if filters["category"] and (product.get("category") or "").lower() != filters["category"].lower():
+        return False
+    if filters["tags"] and not set(filters["tags"]).issubset(product.get("seo_tags") or []):
+        return False
+    return True
+
+# Refined results first, then speculative results that still fit the filters
+def merge_results(refined, speculative, filters, limit):
+    seen = {p["product_url"] for p in refined}
+    merged = list(refined)
+    for p in speculative:
+        if len(merged) >= limit:
+            break
+        if p["product_url"] not in seen and matches_filters(p, filters):
+            merged.append(p)
+            seen.add(p["product_url"])
+    return merged
+
+# In-memory counterparts of query.SORTS: (key, reverse) for sorted(), used
+# to keep merged result sets in the order the caller asked for
+SORT_KEYS = {
+    "deal": (lambda p: p.get("deal_score") if p.get("deal_score") is not None else float("-inf"), True),
+    "price": (lambda p: p.get("price") or 0, False),
+    "newest": (lambda p: p.get("scraped_at") or datetime.min, True),
+}
+
+def _keyword_tokens(filters):
+    # Tokens filter_products matches with ILIKE; shorter ones are skipped there
+    return [t.lower() for t in (filters["keyword"] or "").split() if len(t) >= 2]
+
+# Whether every row `narrow` selects is also selected by `wide`: the same or
+# tighter price, rating, tag and category filters, and each keyword
+# containing one of the wide keywords (titles are matched by substring)
+def narrows(narrow, wide):
+    wide_tokens, narrow_tokens = _keyword_tokens(wide), _keyword_tokens(narrow)
+    if wide_tokens and not (narrow_tokens and all(any(w in n for w in wide_tokens) for n in narrow_tokens)):
+        return False
+    return (
+        narrow["min_price"] >= wide["min_price"]
+        and narrow["max_price"] <= wide["max_price"]
+        and (wide["min_rating"] or 0) <= (narrow["min_rating"] or 0)
+        and set(wide["tags"] or ()) <= set(narrow["tags"] or ())
+        and wide["category"] in (None, narrow["category"])
+    )
+
+def _matches_keyword(product, filters):
+    title = (product.get("title") or "").lower()
+    tokens = _keyword_tokens(filters)
+    return not tokens or any(t in title for t in tokens)
+
+def _parse_intent(intent_json):
+    with tracing.span("search.parse_intent"):
+        intent = json.loads(intent_json)
+    return intent if isinstance(intent, dict) else {}
+
+# AI search with intent extraction overlapped with a speculative DB search on
+# the raw search term. If the intent leaves the filters unchanged the
+# speculative rows are used as-is, and if it only narrows them and the
+# speculative search wasn't cut off at `limit`, they are filtered locally.
+# Otherwise a refined query starts as soon as the intent is in and the two
+# result sets are merged. With `sort` (a query.SORTS key) the grid keeps
+# that order; otherwise it follows the local ranking. Returns intent,
+# products, recommendations, errors (messages for the UI) and per-stage
+# timings in seconds.
+@tracing.traced("search.ai_search")
+async def ai_search(search_term, tag_filter=(), min_price=0, max_price=PRICE_CEILING, min_rating=0, provider=None, limit=30, sort=None):
+    start = time.perf_counter()
+    timings = {}
+    errors = []
+
+    async def timed(stage, coro):
+        t0 = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[stage] = time.perf_counter() - t0
+
+    filter_args = dict(tag_filter=tag_filter, min_price=min_price, max_price=max_price, min_rating=min_rating, limit=limit)
+    spec_filters = build_filters(search_term, None, **filter_args)
+    spec_task = asyncio.create_task(timed("search", asyncio.to_thread(get_products, sort=sort, **spec_filters)))
+
+    intent = {}
+    if llm_available():
+        try:
+            intent = _parse_intent(await timed("intent", extract_search_intent_async(search_term, provider=provider)))
+        except Exception as e:
+            errors.append(f"AI Assistant error: {e}")
+
+    final_filters = build_filters(search_term, intent, **filter_args)
+
+    def refine():
+        return asyncio.create_task(timed("refine", asyncio.to_thread(get_products, sort=sort, **final_filters)))
+
+    # A narrower intent may be answerable from the speculative rows; anything
+    # else needs the refined query, which needn't wait for the speculative one
+    refine_task = None
+    if final_filters != spec_filters and not narrows(final_filters, spec_filters):
+        refine_task = refine()
+    speculative = await spec_task
+    if final_filters == spec_filters:
+        products = speculative
+    elif refine_task is None and len(speculative) < limit:
+        products = [p for p in speculative if matches_filters(p, final_filters) and _matches_keyword(p, final_filters)]
+    else:
+        refined = await (refine_task or refine())
+        products = merge_results(refined, speculative, final_filters, limit)
+        if sort:
+            key, reverse = SORT_KEYS[sort]
+            products.sort(key=key, reverse=reverse)
+
+    recommendations = []
+    used_llm = False
+    if products:
+        # Pre-rank locally; unless sorted, the grid follows the local order too
+        ranked = rank_products(products, intent, search_term)
+        if not sort:
+            products = [r["product"] for r in ranked]
+
+        if is_decisive(ranked) or not llm_available():
+            recommendations = template_recommendations(ranked, search_term)
+        else:
+            try:
+                rec_json = await timed("recommend", recommend_products_async(shortlist(ranked), search_term, provider=provider))
+                recommendations = json.loads(rec_json).get("recommendations", [])
+                used_llm = True
+            except Exception as e:
+                errors.append(f"Failed to parse recommendations: {e}")
+                recommendations = template_recommendations(ranked, search_term)
+
+    timings["total"] = time.perf_counter() - start
+    return {
+        "intent": intent,
+        "products": products,
+        "recommendations": recommendations,
+        "used_llm_recommendations": used_llm,
+        "errors": errors,
+        "timings": timings,
+    }
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# One event loop per process, run by a daemon thread, so the cached async
+# LLM clients (and their connections) are reused from search to search
+def _search_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="ai-search-loop").start()
+    return _loop
+
+# Blocking entry point for callers without an event loop (Streamlit, scripts).
+# The search task starts in the caller's context, so contextvars such as the
+# LLM budget session and the current trace span carry over.
+def run_ai_search(search_term, **kwargs):
+    loop = _search_loop()
+    done = concurrent.futures.Future()
+
+    def finish(task):
+        if task.cancelled():
+            done.cancel()
+        elif task.exception() is not None:
+            done.set_exception(task.exception())
+        else:
+            done.set_result(task.result())
+
+    def start():
+        loop.create_task(ai_search(search_term, **kwargs)).add_done_callback(finish)
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    return done.result()
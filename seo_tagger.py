@@ -1,5 +1,19 @@
-from models import Product
+import argparse
+import hashlib
+import json
+import os
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import String, bindparam, cast, column, or_, select, update, values
+from sqlalchemy.dialects.postgresql import JSONB
+from models import Product, TagRuleSet
 from config import SessionLocal
+from tag_matcher import TagMatcher, normalize
+import tracing
 
 KEYWORD_TAG_MAP = {
     "iphone": ["apple", "smartphone", "ios"],
@@ -14,23 +28,245 @@ KEYWORD_TAG_MAP = {
     "時計": ["watch", "accessory"]
 }
 
-def rule_based_tags(title: str):
-    title_lower = title.lower()
-    tags = []
-    for keyword, mapped_tags in KEYWORD_TAG_MAP.items():
-        if keyword in title_lower:
-            tags.extend(mapped_tags)
-    return list(set(tags))
+_matcher = None
+_matcher_source = None
+
+# Compiled matcher for KEYWORD_TAG_MAP. Rebuilt when the map object is
+# replaced; pass rebuild=True after editing it in place.
+def get_matcher(rebuild=False):
+    global _matcher, _matcher_source
+    if rebuild or _matcher is None or _matcher_source is not KEYWORD_TAG_MAP:
+        _matcher = TagMatcher(KEYWORD_TAG_MAP)
+        _matcher_source = KEYWORD_TAG_MAP
+    return _matcher
+
+# Stable short hash identifying a rule set
+def rules_version(keyword_map):
+    canonical = json.dumps(
+        {normalize(k): sorted(v) for k, v in keyword_map.items()},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def rule_based_tags(title: str, matcher=None):
+    matcher = matcher or get_matcher()
+    return sorted(matcher.tags(title))
+
+# Rows read, tagged and committed per chunk
+TAG_CHUNK_SIZE = 1000
+
+_worker_matcher = None
+
+def _init_worker(keyword_map):
+    global _worker_matcher
+    _worker_matcher = TagMatcher(keyword_map)
+
+def _tag_chunk(rows):
+    return [(product_id, sorted(_worker_matcher.tags(title))) for product_id, title in rows]
+
+# Untagged (id, title) pairs in id order, one chunk per query
+def _untagged_chunks(chunk_size):
+    last_id = ""
+    while True:
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(Product.id, Product.title)
+                .where(Product.seo_tags.is_(None), Product.id > last_id)
+                .order_by(Product.id)
+                .limit(chunk_size)
+            ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [(r.id, r.title) for r in rows]
+
+# One bulk UPDATE per chunk: UPDATE ... FROM (VALUES ...) on Postgres,
+# executemany elsewhere
+@tracing.traced("seo_tagger.write_tags")
+def write_tags(session, results, version):
+    if not results:
+        return
+    table = Product.__table__
+    if session.bind.dialect.name == "postgresql":
+        v = values(column("id", String), column("tags", String), name="v").data(
+            [(product_id, json.dumps(tags, ensure_ascii=False)) for product_id, tags in results]
+        )
+        session.execute(
+            update(table).where(table.c.id == v.c.id)
+            .values(seo_tags=cast(v.c.tags, JSONB), tag_rules_version=version)
+        )
+    else:
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(
+            seo_tags=bindparam("b_tags", type_=table.c.seo_tags.type),
+            tag_rules_version=version,
+        )
+        session.execute(stmt, [{"b_id": product_id, "b_tags": tags} for product_id, tags in results])
+
+# Stream untagged products in keyset-ordered chunks, tag them on a process
+# pool and commit each chunk as it completes. Memory stays bounded by the
+# chunks in flight, and a failure only loses the chunk being written.
+# Products without any matching keyword get [] so they are not rescanned.
+@tracing.traced("seo_tagger.tag_unprocessed_products")
+def tag_unprocessed_products(chunk_size=TAG_CHUNK_SIZE, workers=None):
+    workers = workers or os.cpu_count() or 1
+    version = rules_version(KEYWORD_TAG_MAP)
+    start = time.perf_counter()
+    processed = 0
+    tagged = 0
+
+    def commit(results):
+        nonlocal processed, tagged
+        with SessionLocal() as session:
+            write_tags(session, results, version)
+            session.commit()
+        processed += len(results)
+        tagged += sum(1 for _, tags in results if tags)
+        rate = processed / max(time.perf_counter() - start, 1e-9)
+        print(f"  … {processed} products processed ({rate:.0f}/s)")
+
+    chunks = _untagged_chunks(chunk_size)
+    if workers == 1:
+        _init_worker(KEYWORD_TAG_MAP)
+        for chunk in chunks:
+            commit(_tag_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(KEYWORD_TAG_MAP,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_tag_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    commit(pending.popleft().result())
+            while pending:
+                commit(pending.popleft().result())
+
+    print(f"✅ Tagged {tagged} of {processed} products.")
+    return processed
 
-def tag_unprocessed_products():
+# Keywords whose presence in a title can change its tags between two rule sets
+def diff_rules(old_map, new_map):
+    old = {normalize(k): set(v) for k, v in old_map.items()}
+    new = {normalize(k): set(v) for k, v in new_map.items()}
+    return sorted(k for k in old.keys() | new.keys() if k and old.get(k) != new.get(k))
+
+def _fullwidth(text):
+    return "".join(chr(ord(c) + 0xFEE0) if "!" <= c <= "~" else c for c in text)
+
+# Half-width katakana for each full-width kana (and voicing mark) NFKC folds
+# it into; voiced kana are decomposed first, so ガ becomes ｶﾞ
+_HALFWIDTH = {unicodedata.normalize("NFKC", chr(cp)): chr(cp) for cp in range(0xFF61, 0xFFA0)}
+
+def _halfwidth(text):
+    return "".join(_HALFWIDTH.get(c, c) for c in unicodedata.normalize("NFD", text))
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Spellings of a normalized keyword looked up through the title index: as is,
+# full-width and half-width katakana. ILIKE folds the case of each.
+def _title_patterns(kw):
+    return {kw, _fullwidth(kw), _halfwidth(kw)}
+
+# Whether _title_patterns finds every title the matcher would: non-ASCII
+# letters with case variants (é/É, Greek, Cyrillic) are left to a scan
+def _index_covers(kw):
+    return all(c.isascii() or c.lower() == c.upper() for c in kw)
+
+# Keywords per OR'd ILIKE query when collecting affected products
+RETAG_KEYWORD_BATCH = 50
+
+# Ids of already-tagged products whose title contains any of `keywords`.
+# On Postgres the trigram index on title serves the substring lookups for
+# keywords _title_patterns covers. SQLite's LIKE only folds ASCII case and
+# scans the table for substrings anyway, so there, and for the remaining
+# keywords, titles are streamed through a matcher as the tagger sees them.
+def _affected_product_ids(session, keywords):
+    if session.bind.dialect.name == "postgresql":
+        indexed = [kw for kw in keywords if _index_covers(kw)]
+    else:
+        indexed = []
+    scanned = [kw for kw in keywords if kw not in indexed]
+
+    ids = set()
+    for i in range(0, len(indexed), RETAG_KEYWORD_BATCH):
+        patterns = set()
+        for kw in indexed[i:i + RETAG_KEYWORD_BATCH]:
+            patterns |= _title_patterns(kw)
+        filters = [Product.title.ilike(f"%{_escape_like(p)}%", escape="\\") for p in patterns]
+        ids.update(session.scalars(
+            select(Product.id).where(Product.seo_tags.is_not(None), or_(*filters))
+        ))
+    if scanned:
+        ids.update(_scan_titles(session, scanned))
+    return sorted(ids)
+
+# Ids of tagged products whose normalized title contains any of `keywords`,
+# read in id-ordered chunks
+def _scan_titles(session, keywords, chunk_size=TAG_CHUNK_SIZE):
+    matcher = TagMatcher({kw: [kw] for kw in keywords})
+    last_id = ""
+    while True:
+        rows = session.execute(
+            select(Product.id, Product.title)
+            .where(Product.seo_tags.is_not(None), Product.id > last_id)
+            .order_by(Product.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield from (r.id for r in rows if matcher.tags(r.title))
+
+# Re-tag only the products a rule change can affect. The last applied rule
+# set is kept in tag_rule_sets; the keyword diff against it selects the
+# candidates, so on Postgres cost follows the affected rows rather than the
+# catalog size. With no rule set recorded yet, products tagged under any
+# other version are re-tagged and the current rules become the baseline.
+@tracing.traced("seo_tagger.retag_changed_rules")
+def retag_changed_rules(chunk_size=TAG_CHUNK_SIZE):
+    version = rules_version(KEYWORD_TAG_MAP)
+    matcher = get_matcher()
     with SessionLocal() as session:
-        products = session.query(Product).filter(Product.seo_tags == None).all()
-        for p in products:
-            tags = rule_based_tags(p.title)
-            if tags:
-                p.seo_tags = tags
+        last = session.scalars(
+            select(TagRuleSet).order_by(TagRuleSet.applied_at.desc()).limit(1)
+        ).first()
+        if last is not None and last.version == version:
+            print("✨ Tag rules unchanged; nothing to re-tag.")
+            return 0
+
+        if last is None:
+            ids = session.scalars(
+                select(Product.id)
+                .where(Product.seo_tags.is_not(None),
+                       or_(Product.tag_rules_version.is_(None), Product.tag_rules_version != version))
+                .order_by(Product.id)
+            ).all()
+            print(f"📌 Recording tag rules {version} as the baseline; {len(ids)} products tagged under other rules.")
+        else:
+            changed = diff_rules(last.rules, KEYWORD_TAG_MAP)
+            ids = _affected_product_ids(session, changed)
+            print(f"🔁 Rules {last.version} → {version}: {len(changed)} keywords changed, {len(ids)} products affected.")
+
+        retagged = 0
+        for i in range(0, len(ids), chunk_size):
+            chunk_ids = ids[i:i + chunk_size]
+            rows = session.execute(
+                select(Product.id, Product.title).where(Product.id.in_(chunk_ids))
+            ).all()
+            write_tags(session, [(r.id, sorted(matcher.tags(r.title))) for r in rows], version)
+            session.commit()
+            retagged += len(rows)
+
+        session.merge(TagRuleSet(
+            version=version, rules=dict(KEYWORD_TAG_MAP), applied_at=datetime.now(timezone.utc)
+        ))
         session.commit()
-        print(f"✅ Tagged {len(products)} products.")
+    print(f"✅ Re-tagged {retagged} products.")
+    return retagged
 
 if __name__ == "__main__":
-    tag_unprocessed_products()
+    parser = argparse.ArgumentParser(description="Tag new products and re-tag those affected by rule changes")
+    parser.add_argument("--chunk-size", type=int, default=TAG_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="tagging processes (default: CPU count)")
+    args = parser.parse_args()
+    retag_changed_rules(args.chunk_size)
+    tag_unprocessed_products(args.chunk_size, args.workers)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import Text, cast, inspect, select
+from sqlalchemy.orm import sessionmaker
+from models import Product, ensure_schema
+from config import engine
+from deals import rebuild
+from migrate_to_neon import write_chunk
+
+# Columnar catalog snapshots: products as a zstd-compressed Parquet file,
+# one row group per exported chunk. Imports go through the fastest native
+# path (COPY on Postgres), and in-process analytics or search can load the
+# file as an Arrow table without a database.
+
+SNAPSHOT_CHUNK_SIZE = 50000
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("title", pa.string()),
+    ("price", pa.float64()),
+    ("condition", pa.string()),
+    ("seller_rating", pa.float64()),
+    ("image_url", pa.string()),
+    ("product_url", pa.string()),
+    ("category", pa.string()),
+    ("seo_tags", pa.list_(pa.string())),
+    ("title_en", pa.string()),
+    ("tag_rules_version", pa.string()),
+    ("scraped_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+])
+
+def _naive_utc(value):
+    # Parquet timestamps are stored without zone, as UTC
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# seo_tags as a list of strings. Read as raw text, since legacy rows hold a
+# JSON list, a {tag: ...} object or a plain comma-separated string.
+def _tag_list(value):
+    if value is None:
+        return None
+    try:
+        value = json.loads(value)
+    except ValueError:
+        return [t.strip() for t in value.split(",") if t.strip()]
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [t.strip() for t in value.split(",") if t.strip()]
+    if isinstance(value, (list, dict)):
+        return [t if isinstance(t, str) else json.dumps(t, ensure_ascii=False) for t in value]
+    return [str(value)]
+
+def export_snapshot(path, source_engine=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    source_engine = source_engine or engine
+    available = {c["name"] for c in inspect(source_engine).get_columns("products")}
+    columns = [Product.__table__.c[name] for name in SNAPSHOT_SCHEMA.names if name in available]
+    selected = [cast(c, Text).label(c.name) if c.name == "seo_tags" else c for c in columns]
+    id_col = Product.__table__.c.id
+
+    start = time.perf_counter()
+    total = 0
+    last_id = ""
+    with pq.ParquetWriter(path, SNAPSHOT_SCHEMA, compression="zstd") as writer:
+        while True:
+            with source_engine.connect() as conn:
+                rows = conn.execute(
+                    select(*selected).where(id_col > last_id).order_by(id_col).limit(chunk_size)
+                ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            data = {name: [None] * len(rows) for name in SNAPSHOT_SCHEMA.names}
+            for i, col in enumerate(columns):
+                convert = _tag_list if col.name == "seo_tags" else _naive_utc
+                data[col.name] = [convert(r[i]) for r in rows]
+            writer.write_table(pa.Table.from_pydict(data, schema=SNAPSHOT_SCHEMA))
+            total += len(rows)
+    print(f"📦 Exported {total} products to {path} in {time.perf_counter() - start:.1f}s")
+    return total
+
+# Bulk-load a snapshot; existing product_urls are skipped. Imported rows
+# then get a price history and deal scores via deals.rebuild.
+def import_snapshot(path, target_engine=None, batch_size=SNAPSHOT_CHUNK_SIZE):
+    target_engine = target_engine or engine
+    ensure_schema(target_engine)
+    columns = [Product.__table__.c[name] for name in SNAPSHOT_SCHEMA.names]
+
+    start = time.perf_counter()
+    read = inserted = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        rows = list(zip(*(batch.column(name).to_pylist() for name in SNAPSHOT_SCHEMA.names)))
+        inserted += write_chunk(target_engine, columns, rows)
+        read += len(rows)
+    if inserted:
+        with sessionmaker(bind=target_engine)() as session:
+            rebuild(session)
+            session.commit()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Imported {inserted} of {read} products in {elapsed:.1f}s ({read / max(elapsed, 1e-9):.0f} rows/s)")
+    return inserted
+
+# Arrow table for in-process use. Columns are decompressed into memory, so
+# pass `columns` to load only the ones needed.
+def load_snapshot(path, columns=None):
+    return pq.read_table(path, columns=columns)
+
+# get_products-style filtering over a loaded snapshot, vectorized with
+# Arrow compute. Returns product dicts.
+def search_snapshot(table, keyword=None, min_price=None, max_price=None, min_rating=None, limit=30):
+    mask = pc.is_valid(table["id"])
+    if keyword:
+        keywords = keyword if isinstance(keyword, list) else keyword.split()
+        keyword_masks = [
+            pc.match_substring(table["title"], kw, ignore_case=True)
+            for kw in keywords if len(kw) >= 2
+        ]
+        if keyword_masks:
+            any_kw = keyword_masks[0]
+            for m in keyword_masks[1:]:
+                any_kw = pc.or_(any_kw, m)
+            mask = pc.and_(mask, pc.fill_null(any_kw, False))
+    if min_price is not None:
+        mask = pc.and_(mask, pc.greater_equal(table["price"], min_price))
+    if max_price is not None:
+        mask = pc.and_(mask, pc.less_equal(table["price"], max_price))
+    if min_rating is not None:
+        mask = pc.and_(mask, pc.fill_null(pc.greater_equal(table["seller_rating"], min_rating), False))
+    return table.filter(mask).slice(0, limit).to_pylist()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import a Parquet snapshot of the products table")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="snapshot file, e.g. products.parquet")
+    parser.add_argument("--chunk-size", type=int, default=SNAPSHOT_CHUNK_SIZE)
+    args = parser.parse_args()
+    if args.action == "export":
+        export_snapshot(args.path, chunk_size=args.chunk_size)
+    else:
+        import_snapshot(args.path, batch_size=args.chunk_size)
@@ -1,28 +1,19 @@
+import math
 import streamlit as st
-import json
-import os
+import uuid
 
 # Set page config early
 st.set_page_config(layout="wide", page_title="🛒 Mercari Product Explorer")
 
-# Robust imports to catch configuration/dependency issues
+# Robust imports to catch configuration/dependency issues. Only the plain
+# search path is imported here; the LLM stack loads when AI is enabled.
 try:
-    from sqlalchemy import text
-    from config import engine
-    from models import Base
-    from populate_db import populate
-    from query import get_products
-    from llm_agent import extract_search_intent, recommend_products, translate_text
-
-    # Initialize Database on Startup (Create tables & Seed if needed)
-    try:
-        # This creates tables if they don't exist
-        Base.metadata.create_all(bind=engine)
-        # This seeds 50 products if the DB is empty
-        populate()
-    except Exception as e:
-        st.error(f"⚠️ Warning: Database initialization failed. Some features might not work.\nError: {e}")
-
+    from config import engine, read_engine
+    from app_init import HealthMonitor, init_database
+    from query import get_products, build_filters
+    from thumbnails import ThumbnailCache
+    from crawl_scheduler import log_search
+    import tracing
 except ImportError as e:
     st.error(f"❌ Critical Error: Dependency or module missing.\n{e}")
     st.info("💡 Hint: Make sure you've installed all requirements with 'pip install -r requirements.txt'.")
@@ -31,143 +22,184 @@ except Exception as e:
     st.error(f"❌ Unexpected error during startup: {e}")
     st.stop()
 
-# Check database connectivity
-db_ready = False
-try:
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-        db_ready = True
-except Exception as e:
-    st.error(f"❌ Database connection failed. Please check your DB_URL environment variable.\nError: {e}")
-    st.info("💡 Hint: If you're running locally, make sure PostgreSQL is running. If on Streamlit Cloud, add DB_URL to your secrets. If not set, it defaults to a local SQLite database.")
-
-
-st.sidebar.title("🔍 Filter Products")
-
-tag_filter = st.sidebar.multiselect("SEO Tags", ["apple", "android", "smartphone", "gaming", "bag", "audio"])
-min_price, max_price = st.sidebar.slider("Price Range", 0, 100000, (0, 50000))
-min_rating = st.sidebar.slider("Min Seller Rating", 0.0, 1000.0, 0.0, 1.0)
-
-search_term = st.text_input("🔎 Search for products", "")
-use_ai = st.checkbox("🤖 AI Assistant (LLM-powered search & recommendations)")
-
-if use_ai:
-    provider = st.sidebar.radio(
-        "LLM Provider",
-        ["groq", "openrouter"],
-        format_func=lambda x: "Groq" if x == "groq" else "OpenRouter",
-        index=0
-    )
-else:
-    provider = None
-
-st.title("🛍️ Mercari Product Explorer")
-
-products = []
-recommendations = []
-
-if db_ready and (search_term or tag_filter or (min_price > 0 or max_price < 100000)):
-    with st.spinner("Searching..."):
-        intent = {}
-        if use_ai and search_term:
-            try:
-                intent_json = extract_search_intent(search_term, provider=provider)
-                intent = json.loads(intent_json)
-            except Exception as e:
-                st.error(f"AI Assistant error: {e}")
-        
-        final_tags = list(set((intent.get("tags") or []) + tag_filter))
-        final_keyword = " ".join(intent.get("keywords", [])) if intent.get("keywords") else search_term
-        
-        # Safely handle potential None values from intent
-        intent_min = intent.get("min_price")
-        if intent_min is None: intent_min = 0
-        intent_max = intent.get("max_price")
-        if intent_max is None: intent_max = 1e9
-        
-        final_min_price = max(intent_min, min_price)
-        final_max_price = min(intent_max, max_price)
-        final_category = intent.get("category")
-        
-        products = get_products(
-            tags=final_tags if final_tags else None,
-            category=final_category,
-            keyword=final_keyword if final_keyword else None,
-            min_price=final_min_price,
-            max_price=final_max_price,
-            min_rating=min_rating if min_rating > 0 else None,
-            limit=30
-        )
+# Schema setup and seeding run once per process, not on every rerun; a
+# failure raises, isn't cached and is retried on the next rerun
+@st.cache_resource
+def init_app():
+    init_database()
+    return True
+
+@st.cache_resource
+def health_monitor():
+    return HealthMonitor(engine, read_engine).start()
+
+@st.cache_resource
+def load_ai():
+    import llm_metrics
+    from search_flow import run_ai_search
+    # Record every LLM call to the local metrics table
+    llm_metrics.enable_persistence()
+    return llm_metrics, run_ai_search
+
+# Shared by all sessions so each image is fetched and resized once
+@st.cache_resource
+def thumbnail_cache():
+    return ThumbnailCache()
+
+# Cards per results page; only the visible page's thumbnails are fetched
+GRID_PAGE_SIZE = 9
+# Cards at or above this deal score get a "cheaper than" badge
+DEAL_BADGE_SCORE = 0.75
+
+def show_image(url):
+    path = thumbnail_cache().get(url)
+    if path:
+        st.image(str(path), width="stretch")
+    else:
+        st.write("No image available")
+
+# One trace per rerun (TRACE_ENABLED); a sampled share is profiled. The
+# with-blocks end the spans (and stop the profiler) when st.stop() or an
+# exception cuts the run short.
+with tracing.span("streamlit.rerun", root=True, profile=True):
+    try:
+        init_app()
+    except Exception as init_error:
+        st.error(f"⚠️ Warning: Database initialization failed. Some features might not work.\nError: {init_error}")
+    health = health_monitor()
+
+    # Connectivity as of the last background check
+    db_ready = health.ok
+    if not db_ready:
+        st.error(f"❌ Database connection failed. Please check your DB_URL environment variable.\nError: {health.error}")
+        st.info("💡 Hint: If you're running locally, make sure PostgreSQL is running. If on Streamlit Cloud, add DB_URL to your secrets. If not set, it defaults to a local SQLite database.")
+
+    st.sidebar.title("🔍 Filter Products")
+
+    tag_filter = st.sidebar.multiselect("SEO Tags", ["apple", "android", "smartphone", "gaming", "bag", "audio"])
+    min_price, max_price = st.sidebar.slider("Price Range", 0, 100000, (0, 50000))
+    min_rating = st.sidebar.slider("Min Seller Rating", 0.0, 1000.0, 0.0, 1.0)
+    deals_first = st.sidebar.checkbox("💰 Best deals first")
 
-        if use_ai and products and search_term:
-            with st.spinner("AI is recommending the best matches..."):
-                try:
-                    # Filter out SQLAlchemy internal state and keep essential fields for LLM
-                    clean_products = []
-                    for p in products[:15]:
-                        clean_products.append({
-                            "title": p.get("title"),
-                            "price": p.get("price"),
-                            "condition": p.get("condition"),
-                            "seller_rating": p.get("seller_rating"),
-                            "product_url": p.get("product_url"),
-                            "image_url": p.get("image_url")
-                        })
-                    
-                    rec_json = recommend_products(clean_products, search_term, provider=provider)
-                    res = json.loads(rec_json)
-                    recommendations = res.get("recommendations", [])
-                except Exception as e:
-                    st.warning(f"Failed to parse recommendations: {e}")
-                    recommendations = []
-
-if recommendations:
-    st.subheader("🤖 Top 3 AI Recommendations")
-    rec_cols = st.columns(3)
-    for idx, rec in enumerate(recommendations[:3]):
-        with rec_cols[idx]:
-            if rec.get("image_url"):
-                st.image(rec["image_url"], width="stretch")
-            st.markdown(f"### {rec.get('title', 'Unknown Product')}")
-            st.markdown(f"💴 **¥{rec.get('price', '???')}**")
-            st.info(f"💡 {rec.get('reason', 'No reason provided.')}")
-            url = rec.get('url') or rec.get('product_url')
-            if url:
-                st.link_button("View on Mercari", url)
-    st.markdown("---")
-    st.subheader("Other Matching Products")
-
-if products:
-    cols = st.columns(3)
-    for idx, product in enumerate(products):
-        with cols[idx % 3]:
-            if product.get("image_url"):
-                st.image(product["image_url"], width="stretch")
+    search_term = st.text_input("🔎 Search for products", "")
+    use_ai = st.checkbox("🤖 AI Assistant (LLM-powered search & recommendations)")
+
+    if use_ai:
+        provider = st.sidebar.radio(
+            "LLM Provider",
+            ["groq", "openrouter"],
+            format_func=lambda x: "Groq" if x == "groq" else "OpenRouter",
+            index=0
+        )
+    else:
+        provider = None
+
+    st.title("🛍️ Mercari Product Explorer")
+
+    products = []
+    recommendations = []
+    intent = None
+
+    if db_ready and (search_term or tag_filter or (min_price > 0 or max_price < 100000)):
+        with st.spinner("Searching..."), tracing.span("streamlit.search", ai=bool(use_ai and search_term)):
+            if use_ai and search_term:
+                llm_metrics, run_ai_search = load_ai()
+                # Token budgets are tracked per browser session
+                llm_metrics.set_session(st.session_state.setdefault("llm_session", str(uuid.uuid4())))
+                # Intent extraction, speculative search and recommendation run
+                # as one async pipeline
+                result = run_ai_search(
+                    search_term,
+                    tag_filter=tag_filter,
+                    min_price=min_price,
+                    max_price=max_price,
+                    min_rating=min_rating,
+                    provider=provider,
+                    sort="deal" if deals_first else None,
+                )
+                intent = result["intent"]
+                products = result["products"]
+                recommendations = result["recommendations"]
+                for message in result["errors"]:
+                    st.warning(message)
             else:
-                st.write("No image available")
+                products = get_products(**build_filters(
+                    search_term,
+                    tag_filter=tag_filter,
+                    min_price=min_price,
+                    max_price=max_price,
+                    min_rating=min_rating,
+                ), sort="deal" if deals_first else None)
+
+        # Feed the crawl scheduler once per distinct search, not per rerun
+        if search_term and st.session_state.get("logged_search") != (search_term, use_ai):
+            st.session_state["logged_search"] = (search_term, use_ai)
+            log_search(search_term, intent)
+
+    with tracing.span("streamlit.render", products=len(products), recommendations=len(recommendations)):
+        if recommendations:
+            st.subheader("🤖 Top 3 AI Recommendations")
+            rec_cols = st.columns(3)
+            for idx, rec in enumerate(recommendations[:3]):
+                with rec_cols[idx]:
+                    if rec.get("image_url"):
+                        show_image(rec["image_url"])
+                    st.markdown(f"### {rec.get('title', 'Unknown Product')}")
+                    st.markdown(f"💴 **¥{rec.get('price', '???')}**")
+                    st.info(f"💡 {rec.get('reason', 'No reason provided.')}")
+                    url = rec.get('url') or rec.get('product_url')
+                    if url:
+                        st.link_button("View on Mercari", url)
+            st.markdown("---")
+            st.subheader("Other Matching Products")
+
+        if products:
+            pages = math.ceil(len(products) / GRID_PAGE_SIZE)
+            page = 1
+            if pages > 1:
+                # Keyed on the search so a new query starts at page 1
+                page = st.number_input(
+                    f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                    key=f"page:{search_term}:{tag_filter}:{min_price}:{max_price}:{min_rating}:{use_ai}:{deals_first}",
+                )
+            start = (page - 1) * GRID_PAGE_SIZE
+            page_products = products[start:start + GRID_PAGE_SIZE]
+            # Fetch this page's thumbnails in parallel and warm the next page
+            thumbnail_cache().prefetch(p.get("image_url") for p in products[start:start + 2 * GRID_PAGE_SIZE])
+
+            # Keyed so the UI benchmark can tell results apart from other alerts
+            cols = st.container(key="results").columns(3)
+            for idx, product in enumerate(page_products):
+                with cols[idx % 3]:
+                    show_image(product.get("image_url"))
                 
-            st.markdown(f"**{product['title']}**")
-            st.markdown(f"💴 ¥{product['price']}")
+                    st.markdown(f"**{product['title']}**")
+                    if product.get("title_en") and product["title_en"] != product["title"]:
+                        st.caption(product["title_en"])
+                    st.markdown(f"💴 ¥{product['price']}")
+                    deal = product.get("deal_score")
+                    if deal is not None and deal >= DEAL_BADGE_SCORE:
+                        st.markdown(f"🔥 Cheaper than {deal:.0%} of {product.get('category') or 'similar'} listings")
             
-            if product.get("condition"):
-                st.markdown(f"📦 Condition: {product['condition']}")
+                    if product.get("condition"):
+                        st.markdown(f"📦 Condition: {product['condition']}")
             
-            rating = product.get("seller_rating")
-            if rating is not None:
-                st.markdown(f"⭐ Seller Rating: {int(rating)}")
+                    rating = product.get("seller_rating")
+                    if rating is not None:
+                        st.markdown(f"⭐ Seller Rating: {int(rating)}")
                 
-            if product.get("seo_tags"):
-                tags = product["seo_tags"]
-                if isinstance(tags, list):
-                    st.markdown("🏷️ " + ", ".join(tags))
-                elif isinstance(tags, str):
-                    st.markdown(f"🏷️ {tags}")
+                    if product.get("seo_tags"):
+                        tags = product["seo_tags"]
+                        if isinstance(tags, list):
+                            st.markdown("🏷️ " + ", ".join(tags))
+                        elif isinstance(tags, str):
+                            st.markdown(f"🏷️ {tags}")
             
-            st.link_button("View on Mercari", product["product_url"])
-else:
-    if not db_ready:
-        st.warning("⚠️ Database is not connected. Connect your database to browse products.")
-    elif search_term or tag_filter:
-        st.info("No products found matching your criteria. Try adjusting the filters or search term.")
-    else:
-        st.info("Enter a search term or select tags to explore products.")
+                    st.link_button("View on Mercari", product["product_url"])
+        else:
+            if not db_ready:
+                st.warning("⚠️ Database is not connected. Connect your database to browse products.")
+            elif search_term or tag_filter:
+                st.container(key="results").info("No products found matching your criteria. Try adjusting the filters or search term.")
+            else:
+                st.info("Enter a search term or select tags to explore products.")
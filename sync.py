@@ -0,0 +1,136 @@
+import argparse
+import hashlib
+import time
+from datetime import timedelta
+
+from sqlalchemy import Text, and_, cast, create_engine, func, null, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+from models import Product, SyncWatermark, db_now, ensure_schema
+from deals import record_current_prices
+from config import DB_URL
+from migrate_to_neon import LOCAL_DB_URL
+
+# Rows shipped per upsert batch
+SYNC_BATCH_SIZE = 1000
+# Re-read this far behind the watermark so rows committed slightly out of
+# changed_at order (long transactions) are not missed; upserts are idempotent
+SYNC_OVERLAP = timedelta(seconds=30)
+
+PRODUCTS = Product.__table__
+# Columns copied on conflict; id and product_url identify the row, and
+# changed_at is stamped by the receiving database
+UPDATABLE = [c.name for c in PRODUCTS.columns if c.name not in ("id", "product_url", "changed_at")]
+
+def peer_key(url):
+    return hashlib.sha256(str(url).encode("utf-8")).hexdigest()[:16]
+
+# Rows written before updated_at existed get their scrape time, once; rows
+# written before changed_at existed count as changed now, so they ship once
+def backfill_updated_at(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            update(PRODUCTS).where(PRODUCTS.c.updated_at.is_(None))
+            .values(updated_at=func.coalesce(PRODUCTS.c.scraped_at, func.current_timestamp()))
+        )
+        conn.execute(
+            update(PRODUCTS).where(PRODUCTS.c.changed_at.is_(None))
+            .values(changed_at=db_now(), updated_at=PRODUCTS.c.updated_at)
+        )
+        # Earlier syncs stored untagged rows as JSON 'null'; make them SQL
+        # NULL again so the tagger picks them up
+        conn.execute(
+            update(PRODUCTS).where(cast(PRODUCTS.c.seo_tags, Text) == "null")
+            .values(seo_tags=null(), updated_at=PRODUCTS.c.updated_at, changed_at=PRODUCTS.c.changed_at)
+        )
+
+def get_watermark(state_engine, peer, direction):
+    with sessionmaker(bind=state_engine)() as session:
+        row = session.get(SyncWatermark, (peer, direction))
+        return row.watermark if row else None
+
+def set_watermark(state_engine, peer, direction, watermark):
+    with sessionmaker(bind=state_engine)() as session:
+        session.merge(SyncWatermark(peer=peer, direction=direction, watermark=watermark))
+        session.commit()
+
+# Rows `engine` has written since `since` by its own clock, in (changed_at,
+# id) order, one keyset page per batch
+def changed_batches(engine, since, batch_size=SYNC_BATCH_SIZE):
+    last = None
+    while True:
+        q = select(PRODUCTS).order_by(PRODUCTS.c.changed_at, PRODUCTS.c.id).limit(batch_size)
+        if since is not None:
+            q = q.where(PRODUCTS.c.changed_at >= since)
+        if last is not None:
+            q = q.where(or_(
+                PRODUCTS.c.changed_at > last[0],
+                and_(PRODUCTS.c.changed_at == last[0], PRODUCTS.c.id > last[1]),
+            ))
+        with engine.connect() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(q)]
+        if not rows:
+            return
+        last = (rows[-1]["changed_at"], rows[-1]["id"])
+        yield rows
+
+# Upsert on product_url with last-writer-wins: an existing row is only
+# overwritten by a strictly newer updated_at. Applied rows get the target's
+# own changed_at. Returns rows applied.
+def upsert_batch(engine, rows):
+    dialect_insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(PRODUCTS)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PRODUCTS.c.product_url],
+        set_={**{name: stmt.excluded[name] for name in UPDATABLE}, "changed_at": db_now()},
+        where=or_(PRODUCTS.c.updated_at.is_(None), stmt.excluded.updated_at > PRODUCTS.c.updated_at),
+    )
+    rows = [{k: v for k, v in row.items() if k != "changed_at"} for row in rows]
+    with engine.begin() as conn:
+        return conn.execute(stmt, rows).rowcount
+
+# Ship rows changed in `source` since the stored watermark to `target`.
+# Prices the upsert changed go into the target's price history and sketches.
+def sync_direction(source, target, state_engine, peer, direction, batch_size=SYNC_BATCH_SIZE):
+    watermark = get_watermark(state_engine, peer, direction)
+    since = watermark - SYNC_OVERLAP if watermark else None
+    shipped = applied = 0
+    for rows in changed_batches(source, since, batch_size):
+        applied += upsert_batch(target, rows)
+        with sessionmaker(bind=target)() as session:
+            record_current_prices(session, [row["product_url"] for row in rows])
+            session.commit()
+        shipped += len(rows)
+        # Advance after every batch so an interrupted sync resumes close by
+        set_watermark(state_engine, peer, direction, rows[-1]["changed_at"])
+    return shipped, applied
+
+# Bidirectional delta sync between the local SQLite DB and DB_URL.
+# Watermarks live in the local database, one per remote and direction.
+def sync(local_engine, remote_engine, direction="both", batch_size=SYNC_BATCH_SIZE):
+    for engine in (local_engine, remote_engine):
+        ensure_schema(engine)
+        backfill_updated_at(engine)
+
+    peer = peer_key(remote_engine.url.render_as_string(hide_password=True))
+    results = {}
+    if direction in ("push", "both"):
+        results["push"] = sync_direction(local_engine, remote_engine, local_engine, peer, "push", batch_size)
+    if direction in ("pull", "both"):
+        results["pull"] = sync_direction(remote_engine, local_engine, local_engine, peer, "pull", batch_size)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delta sync products between local SQLite and DB_URL")
+    parser.add_argument("--direction", choices=["push", "pull", "both"], default="both")
+    parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if "sqlite" in DB_URL:
+        print("❌ Error: DB_URL in config is currently set to SQLite. Please set DB_URL in your .env to your NeonDB URL before running this script.")
+    else:
+        start = time.perf_counter()
+        results = sync(create_engine(LOCAL_DB_URL), create_engine(DB_URL, pool_pre_ping=True), args.direction, args.batch_size)
+        for name, (shipped, applied) in results.items():
+            print(f"🔄 {name}: {shipped} changed rows shipped, {applied} applied")
+        print(f"✅ Sync finished in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,66 @@
+import unicodedata
+from collections import deque
+
+# Multi-pattern keyword matcher for SEO tagging. An Aho-Corasick automaton is
+# compiled once from a {keyword: [tags]} map and finds every keyword in a
+# title in a single pass, independent of how many keywords the map holds.
+
+# NFKC folds full-width ASCII and half-width katakana ("ｉＰｈｏｎｅ", "ﾊﾞｯｸﾞ")
+# into their canonical forms before case folding
+def normalize(text):
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+class TagMatcher:
+    def __init__(self, keyword_map):
+        self.keyword_map = dict(keyword_map)
+        # Trie: per-state transitions, failure links and the tags emitted there
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+
+        for keyword, tags in self.keyword_map.items():
+            key = normalize(keyword)
+            if not key:
+                continue
+            state = 0
+            for ch in key:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                state = nxt
+            self._out[state] = self._out[state] | frozenset(tags)
+
+        # Breadth-first failure links; outputs of the failure target are merged
+        # in so matching never has to walk the failure chain to collect tags
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] | self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self.keyword_map)
+
+    # Deduplicated tags for every keyword occurring in `text`
+    def tags(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in normalize(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
@@ -0,0 +1,120 @@
+import uuid
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+from models import Base, Product
+import api
+from deals import rebuild, record_prices
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all([
+            Product(id=str(uuid.uuid4()), title=f"iPhone {i}", price=8000.0 * (i + 1), category="Phones",
+                    seller_rating=4.0, product_url=f"http://test.com/iphone/{i}", seo_tags=["apple", "smartphone"])
+            for i in range(6)
+        ] + [
+            Product(id=str(uuid.uuid4()), title="Nintendo Switch", price=30000.0, category="Games",
+                    seller_rating=5.0, product_url="http://test.com/switch", seo_tags=["gaming"]),
+        ])
+        session.commit()
+    monkeypatch.setattr("query.SessionLocal", Session)
+    # No version caching between requests so catalog changes show up at once
+    monkeypatch.setattr(api, "_version", api._VersionCache(0))
+    return TestClient(api.app), Session
+
+def test_products_filters_and_serializes(client):
+    client, _ = client
+    resp = client.get("/products", params={"keyword": "iphone", "max_price": 20000})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["count"] == 2
+    assert {p["title"] for p in body["products"]} == {"iPhone 0", "iPhone 1"}
+    assert "_sa_instance_state" not in body["products"][0]
+    assert client.get("/products", params={"min_price": "cheap"}).status_code == 400
+
+def test_facets(client):
+    client, _ = client
+    facets = client.get("/facets").json()
+    assert facets["total"] == 7
+    assert facets["categories"] == {"Phones": 6, "Games": 1}
+    assert facets["tags"]["apple"] == 6
+    assert sum(b["count"] for b in facets["price"]) == 7
+    assert client.get("/facets", params={"category": "games"}).json()["total"] == 1
+
+def test_conditional_get_tracks_catalog_version(client):
+    client, Session = client
+    first = client.get("/products", params={"keyword": "switch"})
+    etag = first.headers["etag"]
+    assert client.get("/products", params={"keyword": "switch"}, headers={"If-None-Match": etag}).status_code == 304
+    # A different query has a different tag
+    assert client.get("/products", params={"keyword": "iphone"}).headers["etag"] != etag
+
+    with Session() as session:
+        session.query(Product).filter_by(title="Nintendo Switch").one().price = 25000.0
+        session.commit()
+    resp = client.get("/products", params={"keyword": "switch"}, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["products"][0]["price"] == 25000.0
+
+def test_if_none_match_compares_whole_tags():
+    etag = '"abc123"'
+    assert api._etag_matches('"x", W/"abc123"', etag)
+    assert api._etag_matches("*", etag)
+    assert not api._etag_matches('"abc123-gzip"', etag)
+    assert not api._etag_matches('abc', etag)
+    assert not api._etag_matches("", etag)
+
+def test_catalog_version_sees_every_write(client):
+    client, Session = client
+    versions = [api.catalog_version()]
+    with Session() as session:
+        # A synced row keeps its peer's older updated_at
+        switch = session.query(Product).filter_by(title="Nintendo Switch").one()
+        switch.price, switch.updated_at = 26000.0, datetime(2020, 1, 1)
+        session.commit()
+        versions.append(api.catalog_version())
+        # Delete one and insert another: the count is unchanged
+        session.delete(switch)
+        session.add(Product(title="Switch Lite", price=15000.0, product_url="http://test.com/lite"))
+        session.commit()
+        versions.append(api.catalog_version())
+        record_prices(session, [(Product(title=f"Pixel {i}", price=1.0, category="Phones",
+                                         product_url=f"http://test.com/pixel/{i}"), 1000.0 * i) for i in range(12)])
+        session.commit()
+        versions.append(api.catalog_version())
+        # Deal score refreshes leave products' changed_at alone
+        rebuild(session)
+        session.commit()
+        versions.append(api.catalog_version())
+    assert len(set(versions)) == len(versions)
+
+def test_limit_is_clamped(client):
+    client, _ = client
+    assert client.get("/products", params={"limit": -1}).json()["count"] == 1
+    assert client.get("/products", params={"limit": 0}).json()["count"] == 1
+    assert client.get("/products", params={"limit": 10**6}).json()["count"] == 7
+
+def test_large_responses_are_gzipped(client):
+    client, _ = client
+    resp = client.get("/products", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers.get("content-encoding") == "gzip"
+
+def test_search_runs_ai_flow(client, monkeypatch):
+    client, _ = client
+    import search_flow
+
+    async def fake_ai_search(q, **kwargs):
+        return {"intent": {"keywords": [q]}, "products": search_flow.get_products(keyword=q), "recommendations": [],
+                "used_llm_recommendations": False, "errors": [], "timings": {}}
+
+    monkeypatch.setattr(search_flow, "ai_search", fake_ai_search)
+    body = client.get("/search", params={"q": "Switch"}).json()
+    assert body["intent"] == {"keywords": ["Switch"]}
+    assert body["products"][0]["title"] == "Nintendo Switch"
+    assert client.get("/search").status_code == 400
@@ -0,0 +1,41 @@
+import sys
+import time
+from sqlalchemy import create_engine
+import pytest
+from app_init import HealthMonitor, init_database
+
+def test_health_monitor_reports_and_refreshes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    monitor = HealthMonitor(engine, interval=0.05).start()
+    assert monitor.ok and monitor.error is None
+    first = monitor.checked_at
+    time.sleep(0.2)
+    monitor.stop()
+    assert monitor.checked_at > first
+
+def test_health_monitor_captures_failure():
+    engine = create_engine("sqlite:////nonexistent/dir/test.db")
+    monitor = HealthMonitor(engine)
+    assert monitor.check() is False
+    assert monitor.error is not None
+
+def test_health_monitor_checks_every_engine(tmp_path):
+    writer = create_engine(f"sqlite:///{tmp_path}/test.db")
+    broken_reader = create_engine("sqlite:////nonexistent/dir/test.db")
+    assert HealthMonitor(writer, writer).check() is True
+    monitor = HealthMonitor(writer, broken_reader)
+    assert len(HealthMonitor(writer, writer).engines) == 1
+    assert monitor.check() is False and monitor.error is not None
+
+def test_plain_search_path_does_not_import_llm_stack():
+    import subprocess
+    code = "import query, app_init, sys; print('openai' in sys.modules or 'llm_agent' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "False"
+
+def test_init_database_raises_so_the_failure_is_not_cached(monkeypatch):
+    def populate():
+        raise RuntimeError("db down")
+    monkeypatch.setattr("populate_db.populate", populate)
+    with pytest.raises(RuntimeError):
+        init_database()
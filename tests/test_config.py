@@ -0,0 +1,73 @@
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from config import SQLITE_PRAGMAS, SQLITE_READ_CACHE_SIZE, SQLITE_READ_POOL_SIZE, create_engines
+
+@pytest.fixture
+def engines(tmp_path):
+    writer, reader = create_engines(f"sqlite:///{tmp_path}/test.db")
+    with writer.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    yield writer, reader
+    writer.dispose()
+    reader.dispose()
+
+def test_sqlite_profile_pragmas(engines):
+    writer, reader = engines
+    with writer.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == SQLITE_PRAGMAS["cache_size"]
+    with reader.connect() as conn:
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == SQLITE_READ_CACHE_SIZE
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+    assert reader.pool.size() == SQLITE_READ_POOL_SIZE and reader.pool._max_overflow == 0
+
+def test_readers_not_blocked_by_open_write(engines):
+    writer, reader = engines
+    with writer.begin() as conn:
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+    with writer.connect() as wconn:
+        wconn.begin()
+        wconn.execute(text("INSERT INTO t VALUES (2)"))
+        # The reader sees the last commit while the write is still open
+        with reader.connect() as rconn:
+            assert rconn.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        wconn.commit()
+    with reader.connect() as rconn:
+        assert rconn.execute(text("SELECT count(*) FROM t")).scalar() == 2
+
+def test_single_writer_connection(engines):
+    writer, _ = engines
+    assert writer.pool.size() == 1
+    order = []
+    with writer.connect() as conn:
+        t = threading.Thread(target=lambda: order.append(writer.connect().close() or "second"))
+        t.start()
+        t.join(0.2)
+        order.append("first")
+    t.join()
+    assert order == ["first", "second"]
+
+def test_in_memory_sqlite_shares_one_engine():
+    writer, reader = create_engines("sqlite://")
+    assert writer is reader
+
+def test_postgres_read_replica_routing():
+    pytest.importorskip("psycopg2")
+    writer, reader = create_engines("postgresql+psycopg2://u:p@primary/db", "postgresql+psycopg2://u:p@replica/db")
+    assert writer.url.host == "primary" and reader.url.host == "replica"
+    writer, reader = create_engines("postgresql+psycopg2://u:p@primary/db")
+    assert writer is reader
+
+def test_ensure_schema_on_single_writer(tmp_path):
+    from models import ensure_schema
+    writer, _ = create_engines(f"sqlite:///{tmp_path}/schema.db")
+    writer.pool._timeout = 1
+    ensure_schema(writer)
+    # Second run inspects existing tables for missing columns
+    ensure_schema(writer)
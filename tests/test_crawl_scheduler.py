@@ -0,0 +1,99 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, CrawlKeyword
+import crawl_scheduler
+from crawl_scheduler import (log_search, flush, mark_crawled, next_keywords, record_searches,
+                             run_scheduler, search_keywords, seed_keywords)
+
+T0 = datetime(2026, 1, 1, 12, 0)
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def get(engine, keyword):
+    with sessionmaker(bind=engine)() as session:
+        return session.get(CrawlKeyword, keyword)
+
+def test_search_keywords_normalizes_term_and_intent():
+    assert search_keywords("ｉＰｈｏｎｅ  15 ") == ["iphone 15"]
+    # The intent's keywords stand in for a natural-language term
+    intent = {"keywords": ["iPhone", "アイフォン"], "max_price": 60000}
+    assert search_keywords("iPhone under 60000 yen please", intent) == ["iphone", "アイフォン"]
+    # Without an intent, free text is not turned into a crawl keyword
+    assert search_keywords("iPhone under 60000 yen please") == []
+    assert search_keywords("x" * 100) == []
+
+def test_popularity_decays_with_half_life(engine):
+    record_searches(["switch"], engine, now=T0)
+    record_searches(["switch"], engine, now=T0)
+    row = get(engine, "switch")
+    assert row.searches == 2 and row.popularity == 2.0
+
+    later = T0 + timedelta(hours=crawl_scheduler.POPULARITY_HALF_LIFE_HOURS)
+    record_searches(["switch"], engine, now=later)
+    assert get(engine, "switch").popularity == pytest.approx(2.0)
+
+def test_keywords_created_by_another_writer_are_not_an_error(engine):
+    record_searches(["switch"], engine, now=T0)
+    with sessionmaker(bind=engine)() as session:
+        # Another process inserted "switch" after this batch was read
+        crawl_scheduler._insert_missing(session, ["switch", "iphone"])
+        session.commit()
+    record_searches(["switch", "iphone", "switch"], engine, now=T0)
+    assert get(engine, "switch").searches == 3 and get(engine, "switch").popularity == 3.0
+    assert get(engine, "iphone").searches == 1
+
+def test_popular_and_stale_keywords_come_first(engine):
+    seed_keywords(["バイオリン", "Switch", "iPhone"], engine)
+    for _ in range(50):
+        record_searches(["iphone"], engine, now=T0)
+    record_searches(["switch"], engine, now=T0)
+    assert next_keywords(3, engine, now=T0) == ["iphone", "switch", "バイオリン"]
+
+    # Just crawled: not eligible until the minimum interval has passed
+    mark_crawled("iphone", engine, now=T0)
+    assert next_keywords(1, engine, now=T0 + timedelta(minutes=5)) == ["switch"]
+    assert "iphone" in next_keywords(3, engine, now=T0 + timedelta(hours=2))
+
+def test_log_search_writes_in_background(engine, monkeypatch):
+    monkeypatch.setattr(crawl_scheduler, "_log_queue", None)
+    log_search("Sony headphones", engine=engine)
+    log_search("sony   HEADPHONES", engine=engine)
+    flush()
+    assert get(engine, "sony headphones").searches == 2
+
+def test_scheduler_spends_fixed_budget_by_demand(engine):
+    niche = [f"niche {i}" for i in range(40)]
+    seed_keywords(["iphone", "switch"] + niche, engine)
+    for _ in range(30):
+        record_searches(["iphone"], engine, now=T0)
+    for _ in range(5):
+        record_searches(["switch"], engine, now=T0)
+
+    clock = [T0]
+    crawled = Counter()
+    slept = []
+
+    async def fake_scrape(keyword, items_per_keyword):
+        crawled[keyword] += 1
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        clock[0] += timedelta(seconds=seconds)
+
+    crawls = asyncio.run(run_scheduler(engine, requests_per_hour=60, items_per_keyword=5, scrape=fake_scrape,
+                                       max_crawls=40, sleep=fake_sleep, clock=lambda: clock[0]))
+    assert crawls == 40
+    # 6 requests per crawl at 60/hour: one crawl every 6 minutes
+    assert slept[0] == pytest.approx(360, abs=1)
+    # Popular keywords are refreshed repeatedly; the rest of the budget
+    # still works through never-crawled seed keywords
+    assert crawled["iphone"] > crawled["switch"] > max(crawled[k] for k in niche) == 1
+    assert sum(crawled[k] for k in niche) >= 20
@@ -0,0 +1,102 @@
+import random
+import uuid
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from models import Base, CategoryPriceSketch, PriceObservation, Product
+from deals import TDigest, record_prices, rebuild
+from query import get_products
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr("query.SessionLocal", Session)
+    return Session
+
+def product(price, category="Phones", url=None):
+    return Product(id=str(uuid.uuid4()), title=f"Item {price}", price=price, category=category,
+                   product_url=url or f"https://jp.mercari.com/item/{uuid.uuid4()}")
+
+def test_tdigest_quantiles_and_round_trip():
+    rng = random.Random(0)
+    values = [rng.lognormvariate(10, 0.8) for _ in range(20000)]
+    digest = TDigest()
+    for v in values:
+        digest.add(v)
+    values.sort()
+    digest = TDigest.from_dict(digest.to_dict())
+    assert len(digest.centroids) <= 100
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        exact = values[int(q * len(values))]
+        assert digest.cdf(exact) == pytest.approx(q, abs=0.005)
+        assert digest.quantile(q) == pytest.approx(exact, rel=0.02)
+    assert digest.cdf(values[0] - 1) == 0.0
+    assert digest.cdf(values[-1]) == 1.0
+
+def test_observations_only_on_new_products_and_price_changes(Session):
+    with Session() as session:
+        iphone = product(50000.0)
+        assert record_prices(session, [(iphone, 50000.0)]) == 1
+        session.commit()
+        # Re-scraped at the same price: nothing is written
+        assert record_prices(session, [(iphone, 50000.0)]) == 0
+        assert record_prices(session, [(iphone, 45000.0)]) == 1
+        session.commit()
+
+        history = session.scalars(select(PriceObservation.price).order_by(PriceObservation.id)).all()
+        assert history == [50000.0, 45000.0]
+        assert session.get(Product, iphone.id).price == 45000.0
+        assert session.get(CategoryPriceSketch, "Phones").observations == 2
+
+def test_deal_scores_follow_the_category_distribution(Session):
+    with Session() as session:
+        phones = [product(float(p)) for p in range(10000, 110000, 10000)]
+        record_prices(session, [(p, p.price) for p in phones])
+        # Same price, other category: scored against its own sketch
+        bags = [product(float(p), "Bags") for p in range(1000, 11000, 1000)]
+        record_prices(session, [(p, p.price) for p in bags])
+        session.commit()
+
+        scores = {p.price: p.deal_score for p in phones}
+        assert scores[10000.0] > scores[50000.0] > scores[100000.0] == 0.0
+        assert bags[-1].deal_score == 0.0 and scores[10000.0] > 0.8
+
+        # Ingesting a flood of cheaper phones refreshes the stored scores
+        cheap = [product(float(p)) for p in range(1000, 6000, 100)]
+        record_prices(session, [(p, p.price) for p in cheap])
+        session.commit()
+        assert session.get(Product, phones[0].id).deal_score < scores[10000.0]
+
+    results = get_products(sort="deal", category="Phones", limit=5)
+    assert [r["price"] for r in results] == [1000.0, 1100.0, 1200.0, 1300.0, 1400.0]
+    assert all(r["deal_score"] is not None for r in results)
+
+def test_rebuild_backfills_history_and_scores(Session):
+    with Session() as session:
+        session.add_all(product(float(p)) for p in range(10000, 210000, 10000))
+        session.commit()
+        assert rebuild(session) == 1
+        session.commit()
+        assert session.query(PriceObservation).count() == 20
+        sketch = session.get(CategoryPriceSketch, "Phones")
+        assert sketch.observations == 20
+        cheapest = session.scalars(select(Product).order_by(Product.price)).first()
+        assert cheapest.deal_score > 0.9
+
+def test_rescoring_leaves_updated_at_alone(Session):
+    with Session() as session:
+        old = [product(float(p)) for p in range(10000, 110000, 10000)]
+        record_prices(session, [(p, p.price) for p in old])
+        session.commit()
+        stamps = {p.id: p.updated_at for p in old}
+
+        # Enough new listings to trigger a category-wide refresh
+        cheap = [product(float(p)) for p in range(1000, 6000, 100)]
+        record_prices(session, [(p, p.price) for p in cheap])
+        session.commit()
+        session.expire_all()
+        refreshed = {p.id: (p.updated_at, p.deal_score) for p in session.scalars(select(Product).where(Product.id.in_(stamps)))}
+    assert {pid: stamp for pid, (stamp, _) in refreshed.items()} == stamps
+    assert refreshed[old[0].id][1] < 0.9
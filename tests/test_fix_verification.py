@@ -80,3 +80,19 @@ def test_config_fallback(monkeypatch):
         assert "sqlite" in str(test_engine.url)
     except Exception as e:
         pytest.fail(f"Fallback logic failed: {e}")
+
+def test_ensure_schema_adds_missing_columns():
+    from models import ensure_schema
+    engine = create_engine(TEST_DB_URL)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE products (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, "
+            "price FLOAT NOT NULL, product_url VARCHAR NOT NULL)"
+        ))
+
+    ensure_schema(engine)
+
+    with engine.connect() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(products)"))}
+    assert "title_en" in columns
+    assert "seo_tags" in columns
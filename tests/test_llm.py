@@ -1,7 +1,13 @@
 import pytest
 import json
 from unittest.mock import MagicMock
-from llm_agent import extract_search_intent, recommend_products
+import llm_agent
+from llm_agent import extract_search_intent, recommend_products, build_product_payload
+
+@pytest.fixture(autouse=True)
+def offline_provider(monkeypatch):
+    # call_with_fallback skips providers without a key; the client is mocked
+    monkeypatch.setattr(llm_agent, "GROQ_API_KEY", "x")
 
 def test_extract_search_intent_format(monkeypatch):
     # Mock OpenAI client
@@ -39,3 +45,35 @@ def test_recommend_products_format(monkeypatch):
     assert "recommendations" in result
     assert len(result["recommendations"]) == 1
     assert result["recommendations"][0]["title"] == "Test Item"
+
+def test_recommend_products_resolves_handles(monkeypatch):
+    mock_client = MagicMock()
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '{"recommendations": [{"id": 1, "reason": "Cheapest"}]}'
+    mock_client.chat.completions.create.return_value = mock_response
+    monkeypatch.setattr("llm_agent.get_client", lambda provider: mock_client)
+
+    products = [
+        {"title": "Item A", "price": 200, "product_url": "http://test.com/a", "image_url": "http://img/a"},
+        {"title": "Item B", "price": 100, "product_url": "http://test.com/b", "image_url": "http://img/b"},
+    ]
+    result = json.loads(recommend_products(products, "cheap item"))
+
+    rec = result["recommendations"][0]
+    assert rec["title"] == "Item B"
+    assert rec["url"] == "http://test.com/b"
+    assert rec["image_url"] == "http://img/b"
+    assert rec["reason"] == "Cheapest"
+
+    # URLs must not be sent to the model
+    prompt = mock_client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+    assert "http://test.com" not in prompt
+
+def test_build_product_payload_respects_budget():
+    products = [{"title": "ノートパソコン " * 20, "price": 1000 + i} for i in range(50)]
+    payload = json.loads(build_product_payload(products, token_budget=200, title_chars=20))
+
+    assert 0 < len(payload["rows"]) < 50
+    assert all(len(row[1]) <= 20 for row in payload["rows"])
+    assert [row[0] for row in payload["rows"]] == list(range(len(payload["rows"])))
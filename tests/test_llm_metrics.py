@@ -0,0 +1,95 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+import llm_agent
+import llm_metrics
+from llm_agent import extract_search_intent, llm_available
+
+@pytest.fixture(autouse=True)
+def clean_metrics(monkeypatch):
+    llm_metrics.reset()
+    llm_metrics.set_session("default")
+    monkeypatch.setattr(llm_agent, "GROQ_API_KEY", "x")
+    yield
+    llm_metrics.reset()
+
+@pytest.fixture
+def mock_client(monkeypatch):
+    client = MagicMock()
+    response = MagicMock()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = '{"keywords": ["iphone"]}'
+    response.usage.prompt_tokens = 120
+    response.usage.completion_tokens = 30
+    client.chat.completions.create.return_value = response
+    monkeypatch.setattr("llm_agent.get_client", lambda provider: client)
+    return client
+
+def test_calls_are_recorded_per_operation(mock_client):
+    extract_search_intent("iphone")
+    extract_search_intent("ipad")
+
+    stats = llm_metrics.summary()["extract_search_intent"]
+    assert stats["calls"] == 2
+    assert stats["avg_prompt_tokens"] == 120
+    assert stats["avg_completion_tokens"] == 30
+    assert llm_metrics.session_tokens() == 300
+    # The operation label doesn't leak to calls made after this one
+    assert llm_metrics.current_operation.get() == "unknown"
+
+def test_session_budget_degrades_instead_of_calling(mock_client, monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_SESSION_TOKEN_BUDGET", 200)
+    llm_metrics.set_session("s1")
+
+    extract_search_intent("iphone")
+    extract_search_intent("ipad")
+    assert not llm_available()
+    with pytest.raises(llm_metrics.LLMBudgetExceeded):
+        extract_search_intent("pixel")
+    assert mock_client.chat.completions.create.call_count == 2
+
+    # Other sessions keep their own budget
+    llm_metrics.set_session("s2")
+    assert llm_available()
+
+def test_calls_outside_a_session_only_count_against_the_minute_budget(mock_client, monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_SESSION_TOKEN_BUDGET", 200)
+    llm_metrics.set_session(None)
+    for term in ("iphone", "ipad", "pixel"):
+        extract_search_intent(term)
+    assert llm_available()
+    assert llm_metrics.tokens_last_minute() == 450
+
+def test_session_counters_are_bounded(mock_client, monkeypatch):
+    monkeypatch.setattr(llm_metrics, "MAX_TRACKED_SESSIONS", 2)
+    for session in ("s1", "s2", "s3"):
+        llm_metrics.set_session(session)
+        extract_search_intent("iphone")
+    assert list(llm_metrics._session_tokens) == ["s2", "s3"]
+    assert llm_metrics.session_tokens("s1") == 0
+
+def test_failed_calls_are_counted(monkeypatch):
+    client = MagicMock()
+    client.chat.completions.create.side_effect = RuntimeError("boom")
+    monkeypatch.setattr("llm_agent.get_client", lambda provider: client)
+
+    with pytest.raises(RuntimeError):
+        extract_search_intent("iphone")
+    assert llm_metrics.summary()["extract_search_intent"]["errors"] == 1
+
+def test_persisted_report(mock_client, tmp_path):
+    url = f"sqlite:///{tmp_path}/metrics.db"
+    llm_metrics.enable_persistence(url)
+    extract_search_intent("iphone")
+    llm_metrics.record_cache_hit("translate_batch", 2)
+
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        report = llm_metrics.report(url)
+        if report.get("translate_batch", {}).get("calls") == 2:
+            break
+        time.sleep(0.05)
+
+    assert report["extract_search_intent"]["calls"] == 1
+    assert report["extract_search_intent"]["providers"] == {"groq": 1}
+    assert report["translate_batch"]["cache_hits"] == 2
@@ -0,0 +1,41 @@
+import json
+import pytest
+from openai import OpenAI
+import llm_agent
+from llm_stub import start_stub
+
+@pytest.fixture
+def stub(monkeypatch):
+    server, base_url = start_stub()
+    monkeypatch.setattr(llm_agent, "GROQ_API_KEY", None)
+    monkeypatch.setattr(llm_agent, "OPENROUTER_API_KEY", "stub")
+    monkeypatch.setattr(llm_agent, "OPENROUTER_BASE_URL", base_url)
+    yield base_url
+    server.shutdown()
+
+def test_stub_serves_intent_and_recommendations(stub):
+    intent = json.loads(llm_agent.extract_search_intent("bag 20000"))
+    assert intent == {"keywords": ["bag"], "max_price": 20000.0}
+
+    products = [{"title": f"bag {i}", "price": 1000 * i, "product_url": f"http://test.com/{i}"} for i in range(5)]
+    recs = json.loads(llm_agent.recommend_products(products, "bag"))["recommendations"]
+    assert [r["url"] for r in recs] == ["http://test.com/0", "http://test.com/1", "http://test.com/2"]
+
+def test_stub_streaming(stub):
+    client = OpenAI(api_key="stub", base_url=stub)
+    stream = client.chat.completions.create(
+        model="stub",
+        messages=[{"role": "user", "content": "hello"}],
+        stream=True,
+    )
+    text = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+    assert json.loads(text) == {"echo": "hello"}
+
+def test_stub_error_injection():
+    server, base_url = start_stub(error_rate=1.0, error_status=503)
+    client = OpenAI(api_key="stub", base_url=base_url, max_retries=0)
+    try:
+        with pytest.raises(Exception):
+            client.chat.completions.create(model="stub", messages=[{"role": "user", "content": "hi"}])
+    finally:
+        server.shutdown()
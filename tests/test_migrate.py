@@ -0,0 +1,67 @@
+import json
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, Product
+import migrate_to_neon
+from migrate_to_neon import stream_migrate
+
+@pytest.fixture
+def engines(tmp_path):
+    source = create_engine(f"sqlite:///{tmp_path}/source.db")
+    target = create_engine(f"sqlite:///{tmp_path}/target.db")
+    Base.metadata.create_all(bind=source)
+    Base.metadata.create_all(bind=target)
+    with sessionmaker(bind=source)() as session:
+        session.add_all([
+            Product(id=f"{i:03d}", title=f"item {i}", price=100.0 + i,
+                    product_url=f"http://test.com/{i}", seo_tags=["tag"])
+            for i in range(25)
+        ])
+        session.commit()
+    return source, target, str(tmp_path / "checkpoint.json")
+
+def count(engine):
+    with sessionmaker(bind=engine)() as session:
+        return session.query(Product).count()
+
+def test_stream_migrate_is_idempotent(engines):
+    source, target, checkpoint = engines
+    assert stream_migrate(source, target, chunk_size=4, workers=2, checkpoint_path=checkpoint) == (25, 25)
+    assert count(target) == 25
+    assert stream_migrate(source, target, chunk_size=4, workers=2, checkpoint_path=checkpoint) == (25, 0)
+
+    with sessionmaker(bind=target)() as session:
+        assert session.get(Product, "007").seo_tags == ["tag"]
+
+def test_stream_migrate_resumes_from_checkpoint(engines, monkeypatch):
+    source, target, checkpoint = engines
+    real_write = migrate_to_neon.write_chunk
+    calls = []
+
+    def flaky_write(target_engine, columns, rows):
+        calls.append(rows[-1].id)
+        if len(calls) == 3:
+            raise ConnectionError("network blip")
+        return real_write(target_engine, columns, rows)
+
+    monkeypatch.setattr(migrate_to_neon, "write_chunk", flaky_write)
+    with pytest.raises(ConnectionError):
+        stream_migrate(source, target, chunk_size=5, workers=1, checkpoint_path=checkpoint)
+    with open(checkpoint) as f:
+        assert json.load(f)["last_id"] == "009"
+
+    monkeypatch.setattr(migrate_to_neon, "write_chunk", real_write)
+    read, inserted = stream_migrate(source, target, chunk_size=5, workers=1, checkpoint_path=checkpoint)
+    # Only chunks after the checkpoint are re-read; a chunk that was already
+    # in flight when the failure surfaced is skipped by the conflict clause
+    assert read == 15
+    assert count(target) == 25
+
+def test_migrated_rows_get_the_targets_changed_at(engines):
+    source, target, checkpoint = engines
+    with source.begin() as conn:
+        conn.execute(text("UPDATE products SET changed_at = '2000-01-01 00:00:00'"))
+    stream_migrate(source, target, chunk_size=10, workers=1, checkpoint_path=checkpoint)
+    with target.connect() as conn:
+        assert conn.execute(text("SELECT MIN(changed_at) FROM products")).scalar_one() > "2020"
@@ -0,0 +1,40 @@
+from ranker import rank_products, shortlist, is_decisive, template_recommendations
+
+def make_product(title, price, rating=100.0, condition="New"):
+    return {
+        "title": title,
+        "price": price,
+        "seller_rating": rating,
+        "condition": condition,
+        "product_url": f"http://test.com/{title}",
+        "image_url": None,
+    }
+
+def test_rank_products_prefers_keyword_and_price_fit():
+    products = [
+        make_product("Samsung Galaxy", 30000),
+        make_product("iPhone 13 Pro", 45000),
+        make_product("iPhone 13 case", 90000, condition="Used - Good"),
+    ]
+    ranked = rank_products(products, {"keywords": ["iphone"], "max_price": 50000}, "iphone")
+
+    assert ranked[0]["product"]["title"] == "iPhone 13 Pro"
+    # Over budget scores zero on price
+    over_budget = next(r for r in ranked if r["product"]["price"] == 90000)
+    assert over_budget["components"]["price"] == 0.0
+
+def test_shortlist_and_decisive_margin():
+    products = [make_product(f"bag {i}", 1000 + i) for i in range(10)]
+    ranked = rank_products(products, {}, "bag")
+
+    assert len(shortlist(ranked, size=4)) == 4
+    # Near-identical candidates leave the choice to the LLM
+    assert not is_decisive(ranked)
+    assert is_decisive(ranked[:1])
+
+def test_template_recommendations_follow_query_language():
+    ranked = rank_products([make_product("リュック 黒", 5000, rating=900)], {}, "リュック")
+    recs = template_recommendations(ranked, "リュック")
+
+    assert recs[0]["url"] == "http://test.com/リュック 黒"
+    assert "検索条件" in recs[0]["reason"]
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import threading
+import pytest
+import search_flow
+from search_flow import build_filters, merge_results, narrows, run_ai_search
+
+def make_product(title, price, url):
+    return {"title": title, "price": price, "product_url": url, "seller_rating": 100.0, "condition": "New", "seo_tags": None, "category": None}
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    calls = {"get_products": [], "recommend": 0}
+    intent_running, intent_done, search_seen = threading.Event(), threading.Event(), threading.Event()
+
+    def fake_get_products(**filters):
+        calls["get_products"].append(filters)
+        if "overlapped" not in calls:
+            # The first search overlaps the intent call if it sees it in flight
+            intent_running.wait(timeout=2)
+            calls["overlapped"] = intent_running.is_set() and not intent_done.is_set()
+            search_seen.set()
+        if filters["keyword"] == "iphone":
+            return [make_product("iPhone 13", 40000, "u1"), make_product("iPhone 15", 90000, "u2")]
+        return [make_product("iPhone 12", 30000, "u3")]
+
+    async def fake_intent(query, provider=None):
+        intent_running.set()
+        await asyncio.to_thread(search_seen.wait, 2)
+        intent_done.set()
+        return json.dumps(calls.get("intent", {}))
+
+    async def fake_recommend(products, query, provider=None):
+        calls["recommend"] += 1
+        return json.dumps({"recommendations": [{"title": products[0]["title"], "reason": "ok"}]})
+
+    monkeypatch.setattr(search_flow, "get_products", fake_get_products)
+    monkeypatch.setattr(search_flow, "extract_search_intent_async", fake_intent)
+    monkeypatch.setattr(search_flow, "recommend_products_async", fake_recommend)
+    monkeypatch.setattr(search_flow, "llm_available", lambda: True)
+    monkeypatch.setattr(search_flow, "is_decisive", lambda ranked: False)
+    return calls
+
+def test_intent_and_speculative_search_overlap(fake_backends):
+    result = run_ai_search("iphone")
+
+    # Empty intent keeps the raw-term filters, so no second DB query is needed
+    assert len(fake_backends["get_products"]) == 1
+    assert fake_backends["overlapped"]
+    assert {p["product_url"] for p in result["products"]} == {"u1", "u2"}
+    assert result["recommendations"][0]["reason"] == "ok"
+
+def test_run_ai_search_keeps_the_callers_context(fake_backends, monkeypatch):
+    import llm_metrics
+    seen = []
+
+    async def fake_recommend(products, query, provider=None):
+        seen.append(llm_metrics.current_session.get())
+        return json.dumps({"recommendations": []})
+
+    monkeypatch.setattr(search_flow, "recommend_products_async", fake_recommend)
+    token = llm_metrics.current_session.set("browser-1")
+    try:
+        run_ai_search("iphone")
+    finally:
+        llm_metrics.current_session.reset(token)
+    assert seen == ["browser-1"]
+
+def test_async_clients_are_reused_per_loop(monkeypatch):
+    import llm_agent
+    monkeypatch.setattr(llm_agent, "GROQ_API_KEY", "x")
+
+    async def two():
+        return llm_agent.get_async_client("groq"), llm_agent.get_async_client("groq")
+
+    a, b = asyncio.run(two())
+    c, _ = asyncio.run(two())
+    assert a is b and a is not c
+
+def test_changed_intent_refines_and_merges(fake_backends):
+    fake_backends["intent"] = {"keywords": ["iPhone", "アイフォン"], "max_price": 50000}
+    result = run_ai_search("iphone")
+
+    assert len(fake_backends["get_products"]) == 2
+    # Refined rows first; speculative rows over the intent budget are dropped
+    urls = {p["product_url"] for p in result["products"]}
+    assert urls == {"u3", "u1"}
+    assert "refine" in result["timings"]
+
+def test_build_filters_combines_ui_and_intent():
+    filters = build_filters("bag", {"keywords": ["bag", "バッグ"], "tags": ["fashion"], "max_price": 20000},
+                            tag_filter=["bag"], max_price=50000)
+    assert filters["keyword"] == "bag バッグ"
+    assert filters["tags"] == ["bag", "fashion"]
+    assert filters["max_price"] == 20000
+
+def test_merge_results_dedupes_and_limits():
+    filters = build_filters("x")
+    refined = [make_product("a", 1, "a")]
+    speculative = [make_product("a", 1, "a"), make_product("b", 2, "b"), make_product("c", 3, "c")]
+    assert [p["product_url"] for p in merge_results(refined, speculative, filters, 2)] == ["a", "b"]
+
+def test_sort_is_kept_over_the_local_ranking(fake_backends, monkeypatch):
+    monkeypatch.setattr(search_flow, "rank_products", lambda products, intent, query: [{"product": p} for p in reversed(products)])
+    fake_backends["intent"] = {"keywords": ["iPhone", "アイフォン"]}
+    scores = {"u1": 0.2, "u2": 0.9, "u3": 0.5}
+
+    def scored(**filters):
+        return [dict(p, deal_score=scores[p["product_url"]]) for p in fake_get_products(**filters)]
+
+    fake_get_products = search_flow.get_products
+    monkeypatch.setattr(search_flow, "get_products", scored)
+    result = run_ai_search("iphone", sort="deal")
+
+    assert all(f["sort"] == "deal" for f in fake_backends["get_products"])
+    assert [p["product_url"] for p in result["products"]] == ["u2", "u3", "u1"]
+
+def test_narrower_intent_filters_the_speculative_rows(fake_backends):
+    fake_backends["intent"] = {"keywords": ["iPhone"], "max_price": 50000}
+    result = run_ai_search("iphone")
+
+    # The speculative search wasn't cut off, so it already holds every match
+    assert len(fake_backends["get_products"]) == 1
+    assert [p["product_url"] for p in result["products"]] == ["u1"]
+    assert "refine" not in result["timings"]
+
+def test_refine_starts_without_waiting_for_the_speculative_search(fake_backends, monkeypatch):
+    refine_started = threading.Event()
+    overlapped = []
+
+    def fake_get_products(**filters):
+        if filters["keyword"] == "iphone":
+            overlapped.append(refine_started.wait(timeout=2))
+            return [make_product("iPhone 13", 40000, "u1")]
+        refine_started.set()
+        return [make_product("iPhone 12", 30000, "u3")]
+
+    async def fake_intent(query, provider=None):
+        return json.dumps({"keywords": ["アイフォン"]})
+
+    monkeypatch.setattr(search_flow, "get_products", fake_get_products)
+    monkeypatch.setattr(search_flow, "extract_search_intent_async", fake_intent)
+    result = run_ai_search("iphone")
+
+    assert overlapped == [True]
+    assert {p["product_url"] for p in result["products"]} == {"u1", "u3"}
+
+def test_narrows():
+    wide = build_filters("iphone", max_price=80000)
+    assert narrows(build_filters("iphone", {"keywords": ["iPhone13"], "category": "Phones"}, max_price=80000), wide)
+    assert not narrows(build_filters("iphone", {"keywords": ["iPhone", "アイフォン"]}, max_price=80000), wide)
+    assert not narrows(build_filters("iphone", {"min_price": 0}, max_price=90000), wide)
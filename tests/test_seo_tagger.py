@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Product
+import seo_tagger
+from seo_tagger import rule_based_tags
+from tag_matcher import TagMatcher, normalize
+
+def test_rule_based_tags_matches_japanese_and_english():
+    assert rule_based_tags("PORTER リュック 黒") == ["backpack", "bag", "fashion"]
+    assert rule_based_tags("Apple iPhone 13 128GB") == ["apple", "ios", "smartphone"]
+    assert rule_based_tags("本 セット") == []
+
+def test_rule_based_tags_normalizes_width():
+    # Full-width latin and half-width katakana
+    assert rule_based_tags("ｉＰｈｏｎｅ　ケース") == ["apple", "ios", "smartphone"]
+    assert rule_based_tags("ﾘｭｯｸ") == ["backpack", "bag", "fashion"]
+    assert normalize("ＭａｃＢｏｏｋ") == "macbook"
+
+def test_matcher_finds_overlapping_and_nested_keywords():
+    matcher = TagMatcher({"he": ["a"], "she": ["b"], "hers": ["c"], "his": ["d"]})
+    assert matcher.tags("ushers") == {"a", "b", "c"}
+    assert matcher.tags("this") == {"d"}
+    assert matcher.tags("") == set()
+
+def test_matcher_agrees_with_substring_scan():
+    keyword_map = {"ab": ["x"], "bc": ["y"], "abcd": ["z"], "d": ["w"], "カメラ": ["camera"]}
+    matcher = TagMatcher(keyword_map)
+    for title in ["abcd", "xbcx", "カメラbag", "aabbccdd", "ab カメ ラ"]:
+        expected = {t for k, tags in keyword_map.items() if k in title for t in tags}
+        assert matcher.tags(title) == expected, title
+
+@pytest.fixture
+def tagger_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/tagger.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr("seo_tagger.SessionLocal", Session)
+    with Session() as session:
+        titles = ["iPhone 13", "リュック 黒", "古本 セット", "Switch ソフト"] * 5
+        session.add_all([
+            Product(id=f"{i:03d}", title=t, price=1000.0, product_url=f"http://test.com/{i}")
+            for i, t in enumerate(titles)
+        ])
+        session.add(Product(id="999", title="iPhone case", price=500.0, product_url="http://test.com/999", seo_tags=["done"]))
+        session.commit()
+    return Session
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_tag_unprocessed_products_in_chunks(tagger_db, workers):
+    assert seo_tagger.tag_unprocessed_products(chunk_size=3, workers=workers) == 20
+
+    with tagger_db() as session:
+        tags = {p.id: p.seo_tags for p in session.query(Product)}
+    assert tags["000"] == ["apple", "ios", "smartphone"]
+    assert tags["001"] == ["backpack", "bag", "fashion"]
+    assert tags["002"] == []
+    # Already tagged rows are left alone
+    assert tags["999"] == ["done"]
+
+    # Nothing is left for a second run
+    assert seo_tagger.tag_unprocessed_products(chunk_size=3, workers=workers) == 0
+
+def test_retag_changed_rules_only_touches_affected_products(tagger_db, monkeypatch):
+    rules = {"iphone": ["apple"], "リュック": ["bag"]}
+    monkeypatch.setattr("seo_tagger.KEYWORD_TAG_MAP", rules)
+    # Baseline: the product tagged before rule versions existed is re-tagged
+    assert seo_tagger.retag_changed_rules() == 1
+    seo_tagger.tag_unprocessed_products(workers=1)
+    assert seo_tagger.retag_changed_rules() == 0  # unchanged
+
+    new_rules = {"iphone": ["apple", "smartphone"], "リュック": ["bag"], "古本": ["book"]}
+    monkeypatch.setattr("seo_tagger.KEYWORD_TAG_MAP", new_rules)
+    # 6 iPhone titles (changed tags) + 5 古本 titles (new keyword); the
+    # リュック and Switch titles are not touched
+    assert seo_tagger.retag_changed_rules() == 11
+
+    with tagger_db() as session:
+        products = {p.id: p for p in session.query(Product)}
+    new_version = seo_tagger.rules_version(new_rules)
+    assert products["000"].seo_tags == ["apple", "smartphone"]
+    assert products["002"].seo_tags == ["book"]
+    assert products["000"].tag_rules_version == new_version
+    assert products["001"].seo_tags == ["bag"]
+    assert products["001"].tag_rules_version == seo_tagger.rules_version(rules)
+    assert products["999"].seo_tags == ["apple", "smartphone"]
+
+def test_retag_finds_titles_in_other_widths_and_cases(tagger_db, monkeypatch):
+    with tagger_db() as session:
+        session.add_all([
+            Product(id="h1", title="ﾘｭｯｸ 黒", price=1.0, product_url="http://test.com/h1"),
+            Product(id="h2", title="ｉＰｈｏｎｅ　ケース", price=1.0, product_url="http://test.com/h2"),
+            Product(id="h3", title="CAFÉ mug", price=1.0, product_url="http://test.com/h3"),
+        ])
+        session.commit()
+    rules = {"iphone": ["apple"], "リュック": ["bag"], "café": ["cafe"]}
+    monkeypatch.setattr("seo_tagger.KEYWORD_TAG_MAP", rules)
+    seo_tagger.tag_unprocessed_products(workers=1)
+    seo_tagger.retag_changed_rules()
+
+    monkeypatch.setattr("seo_tagger.KEYWORD_TAG_MAP", {"iphone": ["ios"], "リュック": ["backpack"], "café": ["coffee"]})
+    seo_tagger.retag_changed_rules()
+    with tagger_db() as session:
+        tags = {p.id: p.seo_tags for p in session.query(Product).filter(Product.id.in_(["h1", "h2", "h3"]))}
+    assert tags == {"h1": ["backpack"], "h2": ["ios"], "h3": ["coffee"]}
+
+def test_title_patterns_cover_widths_for_the_index_lookup():
+    assert seo_tagger._title_patterns("バッグ") == {"バッグ", "ﾊﾞｯｸﾞ"}
+    assert seo_tagger._title_patterns("iphone") == {"iphone", "ｉｐｈｏｎｅ"}
+    assert seo_tagger._index_covers("リュック") and not seo_tagger._index_covers("café")
+
+def test_diff_rules_reports_added_removed_and_changed():
+    old = {"a": ["x"], "b": ["y"], "c": ["z"]}
+    new = {"a": ["x"], "b": ["y", "w"], "d": ["z"]}
+    assert seo_tagger.diff_rules(old, new) == ["b", "c", "d"]
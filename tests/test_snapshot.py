@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, PriceObservation, Product
+from snapshot import export_snapshot, import_snapshot, load_snapshot, search_snapshot
+
+@pytest.fixture
+def source(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/source.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([
+            Product(id=f"{i:03d}", title=f"iPhone {i}" if i % 2 else f"Switch {i}", price=1000.0 * i,
+                    seller_rating=4.0 + (i % 2), product_url=f"http://test.com/{i}",
+                    seo_tags=["tag", str(i)], updated_at=datetime(2026, 1, 1, 12, i))
+            for i in range(12)
+        ])
+        session.commit()
+    return engine
+
+def test_snapshot_round_trip(source, tmp_path):
+    path = str(tmp_path / "products.parquet")
+    assert export_snapshot(path, source, chunk_size=5) == 12
+
+    target = create_engine(f"sqlite:///{tmp_path}/target.db")
+    assert import_snapshot(path, target, batch_size=5) == 12
+    # Existing product_urls are skipped on a second import
+    assert import_snapshot(path, target) == 0
+
+    with sessionmaker(bind=target)() as session:
+        product = session.get(Product, "007")
+        assert product.title == "iPhone 7"
+        assert product.seo_tags == ["tag", "7"]
+        assert product.updated_at == datetime(2026, 1, 1, 12, 7)
+        # Imported prices start the target's price history
+        assert session.query(PriceObservation).count() == 12
+
+def test_untagged_products_round_trip_as_sql_null(source, tmp_path):
+    with sessionmaker(bind=source)() as session:
+        session.add(Product(id="untagged", title="Sony", price=1.0, product_url="http://test.com/untagged"))
+        session.commit()
+    path = str(tmp_path / "products.parquet")
+    export_snapshot(path, source)
+    target = create_engine(f"sqlite:///{tmp_path}/target.db")
+    import_snapshot(path, target)
+    with target.connect() as conn:
+        untagged = conn.execute(text("SELECT id FROM products WHERE seo_tags IS NULL")).scalars().all()
+    assert untagged == ["untagged"]
+
+def test_legacy_seo_tags_are_exported_as_lists(source, tmp_path):
+    legacy = {"000": '"apple, ios"', "001": '{"apple": 1, "ios": 2}', "002": "apple, ios", "003": "null"}
+    with source.begin() as conn:
+        for product_id, raw in legacy.items():
+            conn.execute(text("UPDATE products SET seo_tags = :raw WHERE id = :id"), {"raw": raw, "id": product_id})
+    path = str(tmp_path / "products.parquet")
+    assert export_snapshot(path, source) == 12
+    tags = dict(zip(*(load_snapshot(path, ["id", "seo_tags"]).column(c).to_pylist() for c in ("id", "seo_tags"))))
+    assert tags["000"] == tags["001"] == tags["002"] == ["apple", "ios"]
+    assert tags["003"] is None and tags["004"] == ["tag", "4"]
+
+def test_search_loaded_snapshot(source, tmp_path):
+    path = str(tmp_path / "products.parquet")
+    export_snapshot(path, source)
+    table = load_snapshot(path)
+    assert table.num_rows == 12
+
+    results = search_snapshot(table, keyword="iphone", max_price=5000, min_rating=5)
+    assert [p["id"] for p in results] == ["001", "003", "005"]
+    assert load_snapshot(path, columns=["id", "price"]).column_names == ["id", "price"]
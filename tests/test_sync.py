@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, Product, ensure_schema
+from sync import sync
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def engines(tmp_path):
+    local = create_engine(f"sqlite:///{tmp_path}/local.db")
+    remote = create_engine(f"sqlite:///{tmp_path}/remote.db")
+    Base.metadata.create_all(bind=local)
+    Base.metadata.create_all(bind=remote)
+    return local, remote
+
+def add(engine, id, url, price, updated_at):
+    with sessionmaker(bind=engine)() as session:
+        session.add(Product(id=id, title=f"item {id}", price=price, product_url=url, updated_at=updated_at))
+        session.commit()
+
+def set_price(engine, url, price, updated_at):
+    with sessionmaker(bind=engine)() as session:
+        p = session.query(Product).filter_by(product_url=url).one()
+        p.price = price
+        p.updated_at = updated_at
+        session.commit()
+
+def prices(engine):
+    with sessionmaker(bind=engine)() as session:
+        return {p.product_url: p.price for p in session.query(Product)}
+
+def test_bidirectional_sync_ships_only_changes(engines):
+    local, remote = engines
+    add(local, "l1", "u1", 100.0, T0)
+    add(remote, "r1", "u2", 200.0, T0)
+
+    results = sync(local, remote)
+    assert results["push"][0] == 1
+    assert prices(local) == prices(remote) == {"u1": 100.0, "u2": 200.0}
+
+    # The watermark follows when the local DB wrote a row, not the row's
+    # updated_at: a row arriving with an old updated_at (a peer's skewed
+    # clock, a snapshot import) still ships
+    set_price(local, "u1", 150.0, T0 + timedelta(hours=1))
+    add(local, "l0", "u0", 50.0, T0 - timedelta(days=1))
+    shipped, applied = sync(local, remote, direction="push")["push"]
+    assert applied == 2
+    assert prices(remote) == {"u0": 50.0, "u1": 150.0, "u2": 200.0}
+
+def test_last_writer_wins_on_conflict(engines):
+    local, remote = engines
+    add(local, "l1", "u1", 100.0, T0)
+    sync(local, remote)
+
+    set_price(local, "u1", 110.0, T0 + timedelta(hours=1))
+    set_price(remote, "u1", 120.0, T0 + timedelta(hours=2))
+    sync(local, remote)
+    assert prices(local)["u1"] == prices(remote)["u1"] == 120.0
+
+    # An older write never overwrites a newer one
+    set_price(local, "u1", 90.0, T0 + timedelta(minutes=30))
+    sync(local, remote, direction="push")
+    assert prices(remote)["u1"] == 120.0
+
+def test_changed_at_is_stamped_by_the_receiving_database(engines):
+    local, remote = engines
+    add(local, "l1", "u1", 100.0, T0)
+    with local.begin() as conn:
+        conn.execute(text("UPDATE products SET changed_at = '2000-01-01 00:00:00'"))
+    sync(local, remote, direction="push")
+    with remote.connect() as conn:
+        changed_at = conn.execute(text("SELECT changed_at FROM products")).scalar_one()
+    assert changed_at > "2020"
+
+def test_ensure_schema_skips_postgres_only_indexes_on_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    ensure_schema(engine)
+    ensure_schema(engine)
+    with engine.connect() as conn:
+        indexes = {name for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert {"ix_products_changed_at", "ix_products_deal_score"} <= indexes
+    assert not indexes & {"ix_products_title_trgm", "ix_products_seo_tags"}
+
+def test_rows_written_in_the_same_instant_page_through(engines):
+    local, remote = engines
+    with sessionmaker(bind=local)() as session:
+        session.add_all(Product(id=f"l{i}", title=f"item {i}", price=float(i), product_url=f"u{i}", updated_at=T0)
+                        for i in range(5))
+        session.commit()
+    shipped, applied = sync(local, remote, direction="push", batch_size=2)["push"]
+    assert (shipped, applied) == (5, 5)
+    assert len(prices(remote)) == 5
+
+def is_null_tags(engine, url):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT seo_tags IS NULL FROM products WHERE product_url = :u"), {"u": url}).scalar_one()
+
+def test_untagged_rows_stay_sql_null_on_the_target(engines):
+    local, remote = engines
+    add(local, "l1", "u1", 100.0, T0)
+    assert is_null_tags(local, "u1")
+    sync(local, remote, direction="push")
+    assert is_null_tags(remote, "u1")
+
+    # Rows an earlier sync stored as JSON 'null' are repaired
+    with remote.begin() as conn:
+        conn.execute(text("UPDATE products SET seo_tags = 'null'"))
+    sync(local, remote, direction="push")
+    assert is_null_tags(remote, "u1")
+
+def observed(engine, url):
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT o.price FROM price_observations o JOIN products p ON p.id = o.product_id "
+            "WHERE p.product_url = :url ORDER BY o.id"
+        ), {"url": url}).scalars().all()
+
+def test_synced_prices_join_the_targets_price_history(engines):
+    local, remote = engines
+    add(local, "l1", "u1", 100.0, T0)
+    sync(local, remote, direction="push")
+    set_price(local, "u1", 80.0, T0 + timedelta(hours=1))
+    sync(local, remote, direction="push")
+    assert observed(remote, "u1") == [100.0, 80.0]
+
+    # Recording the price leaves the row's stamps alone, so it doesn't ship back
+    assert sync(local, remote)["pull"][1] == 0
+    sync(local, remote, direction="push")
+    assert observed(remote, "u1") == [100.0, 80.0]
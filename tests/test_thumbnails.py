@@ -0,0 +1,102 @@
+import os
+import pytest
+from PIL import Image
+import thumbnails
+from thumbnails import FileFetcher, ThumbnailCache, _disk_bytes
+
+@pytest.fixture
+def images(tmp_path):
+    root = tmp_path / "images"
+    root.mkdir()
+    for i, color in enumerate(["red", "green", "blue", "yellow"]):
+        Image.new("RGB", (1200, 900), color).save(root / f"m{i}_1.jpg")
+    Image.new("RGB", (1200, 900), "red").save(root / "copy_of_m0.jpg")
+    return root
+
+def disk_usage(directory):
+    return sum(_disk_bytes(p) for p in directory.rglob("*") if p.is_file())
+
+def url(name):
+    return f"https://static.mercdn.net/item/detail/orig/photos/{name}"
+
+def test_fetches_once_and_resizes(images, tmp_path):
+    fetcher = FileFetcher(images)
+    cache = ThumbnailCache(tmp_path / "cache", fetcher=fetcher, size=(200, 200))
+    path = cache.get(url("m0_1.jpg"))
+    assert cache.get(url("m0_1.jpg")) == path
+    assert fetcher.calls == 1
+    with Image.open(path) as img:
+        assert img.size == (200, 150)
+
+    # A fresh instance on the same directory still hits the disk cache
+    assert ThumbnailCache(tmp_path / "cache", fetcher=fetcher).get(url("m0_1.jpg")) == path
+    assert fetcher.calls == 1
+
+def test_identical_images_share_content(images, tmp_path):
+    cache = ThumbnailCache(tmp_path / "cache", fetcher=FileFetcher(images))
+    assert cache.get(url("m0_1.jpg")) == cache.get(url("copy_of_m0.jpg"))
+    assert len(list((tmp_path / "cache").glob("*.jpg"))) == 1
+
+def test_lru_eviction_keeps_within_budget(images, tmp_path, monkeypatch):
+    # Deterministic mtimes: each touch is 10s after the previous one
+    clock = iter(range(1000, 2000, 10))
+    real_utime = os.utime
+    monkeypatch.setattr("thumbnails.os.utime", lambda p, times=None: real_utime(p, (t := next(clock), t)))
+
+    fetcher = FileFetcher(images)
+    cache = ThumbnailCache(tmp_path / "cache", fetcher=fetcher, size=(100, 100))
+    cache.get(url("m0_1.jpg"))
+    one = cache.total_bytes  # thumbnail plus its pointer file
+    cache.max_bytes = int(one * 2.5)
+
+    first = cache.get(url("m1_1.jpg"))
+    cache.get(url("m2_1.jpg"))
+    cache.get(url("m1_1.jpg"))  # touch: m1 is now more recent than m0 and m2
+    cache.get(url("m3_1.jpg"))
+
+    assert cache.total_bytes <= cache.max_bytes
+    assert first.exists()
+    assert disk_usage(tmp_path / "cache") == cache.total_bytes
+    # An evicted thumbnail is fetched again on demand
+    calls = fetcher.calls
+    assert cache.get(url("m0_1.jpg")).exists()
+    assert fetcher.calls == calls + 1
+
+def test_failed_fetch_returns_none(images, tmp_path):
+    cache = ThumbnailCache(tmp_path / "cache", fetcher=FileFetcher(images))
+    fetcher = cache.fetcher
+    assert cache.get(url("missing.jpg")) is None
+    assert cache.get(url("missing.jpg")) is None
+    # Failures are remembered instead of retried on every rerun
+    assert fetcher.calls == 1
+    assert cache.get(None) is None
+
+def test_failures_expire_and_are_dropped(images, tmp_path, monkeypatch):
+    cache = ThumbnailCache(tmp_path / "cache", fetcher=FileFetcher(images))
+    clock = [1000.0]
+    monkeypatch.setattr(thumbnails.time, "time", lambda: clock[0])
+    for i in range(3):
+        cache.get(url(f"missing{i}.jpg"))
+        clock[0] += 100
+    assert len(cache._failed) == 3
+
+    # Older failures are forgotten once they are due a retry
+    clock[0] = 1000.0 + thumbnails.FETCH_RETRY_AFTER + 150
+    assert cache.get(url("missing2.jpg")) is None
+    assert list(cache._failed) == [url("missing2.jpg")]
+    assert cache.fetcher.calls == 3
+
+def test_size_index_counts_pointers_and_survives_restart(images, tmp_path):
+    fetcher = FileFetcher(images)
+    cache = ThumbnailCache(tmp_path / "cache", fetcher=fetcher, size=(100, 100))
+    for name in ("m0_1.jpg", "m1_1.jpg", "copy_of_m0.jpg"):
+        cache.get(url(name))
+    # Two thumbnails, three pointers
+    assert len(cache._index) == 5
+    assert cache.total_bytes == disk_usage(tmp_path / "cache")
+    assert ThumbnailCache(tmp_path / "cache", fetcher=fetcher).total_bytes == cache.total_bytes
+
+    # A pointer to an evicted thumbnail is dropped on lookup
+    cache._forget(cache.get(url("m1_1.jpg")))
+    assert cache.get(url("m1_1.jpg")).exists()
+    assert cache.total_bytes == disk_usage(tmp_path / "cache")
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy import create_engine, text
+from streamlit.runtime.scriptrunner_utils.exceptions import RerunException, StopException
+import tracing
+
+@pytest.fixture
+def traces(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    tracing.enable(str(path), "jsonl")
+    yield path
+    tracing.disable()
+
+def read(path):
+    tracing.flush()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_nested_spans_and_traced_functions(traces):
+    @tracing.traced("work")
+    def work(x):
+        return x * 2
+
+    with tracing.span("request", term="bag") as root:
+        assert work(2) == 4
+        root.set(results=3)
+
+    spans = {s["name"]: s for s in read(traces)}
+    assert spans["request"]["attributes"] == {"term": "bag", "results": 3}
+    assert spans["work"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["work"]["trace_id"] == spans["request"]["trace_id"]
+    assert spans["request"]["parent_id"] is None
+
+def test_async_children_and_errors(traces):
+    @tracing.traced("fetch")
+    async def fetch():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    async def main():
+        with tracing.span("search"):
+            await asyncio.gather(fetch(), asyncio.to_thread(lambda: tracing.span("db").__enter__().end()),
+                                 return_exceptions=True)
+
+    asyncio.run(main())
+    spans = {s["name"]: s for s in read(traces)}
+    assert spans["fetch"]["parent_id"] == spans["search"]["span_id"]
+    assert spans["db"]["parent_id"] == spans["search"]["span_id"]
+    assert spans["fetch"]["status"] == "error"
+    assert "ValueError: boom" in spans["fetch"]["attributes"]["error"]
+
+def test_sql_statements_are_timed(traces, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    tracing.instrument_engine(engine)
+    with tracing.span("query"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    spans = read(traces)
+    sql = [s for s in spans if s["name"] == "sql"]
+    assert sql and sql[0]["attributes"]["db.statement"] == "SELECT 1"
+    assert sql[0]["parent_id"] == next(s for s in spans if s["name"] == "query")["span_id"]
+
+def test_otlp_export_and_profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "PROFILE_DIR", str(tmp_path / "profiles"))
+    path = tmp_path / "traces.otlp.jsonl"
+    tracing.enable(str(path), "otlp")
+    try:
+        root = tracing.start_span("streamlit.rerun", root=True, profile=True)
+        sum(range(1000))
+        root.end()
+        tracing.flush()
+    finally:
+        tracing.disable()
+    request = json.loads(path.read_text().splitlines()[0])
+    span = request["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "streamlit.rerun"
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    profile = next(a["value"]["stringValue"] for a in span["attributes"] if a["key"] == "profile")
+    assert profile.endswith(".prof") and (tmp_path / "profiles").exists()
+
+def test_disabled_tracing_is_a_no_op(tmp_path):
+    assert not tracing.enabled()
+    assert tracing.span("x") is tracing.NOOP
+    assert tracing.start_span("x", root=True) is tracing.NOOP
+    with tracing.span("x") as s:
+        s.set(a=1)
+    assert tracing.traced("y")(lambda: 5)() == 5
+
+def test_root_span_ends_and_stops_profiling_when_the_run_is_cut_short(traces, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "PROFILE_DIR", str(tmp_path / "profiles"))
+
+    stale = tracing.start_span("previous run")
+    with pytest.raises(StopException):
+        with tracing.span("streamlit.rerun", root=True, profile=True):
+            raise StopException()
+    stale.end()
+    spans = {s["name"]: s for s in read(traces)}
+    rerun = spans["streamlit.rerun"]
+    # st.stop() is a normal end of the run, not an error
+    assert rerun["parent_id"] is None and rerun["status"] == "ok"
+    with pytest.raises(RerunException):
+        with tracing.span("streamlit.rerun", root=True):
+            raise RerunException(None)
+    assert read(traces)[-1]["status"] == "ok"
+    assert rerun["attributes"]["profile"].endswith(".prof")
+    # The profiler was stopped, so another one can start
+    with tracing.span("next", root=True, profile=True):
+        pass
+    assert read(traces)[-1]["attributes"]["profile"].endswith(".prof")
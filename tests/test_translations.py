@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Product
+import translations
+
+engine = create_engine("sqlite:///:memory:")
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr("translations.SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr("translations.engine", engine)
+    monkeypatch.setattr("translations.llm_available", lambda: True)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    calls = []
+    def fake_translate_batch(items, dest_lang, provider=None):
+        calls.append(dict(items))
+        return {i: f"EN:{t}" for i, t in items.items()}
+    monkeypatch.setattr("translations.translate_batch", fake_translate_batch)
+    return calls
+
+def test_translate_texts_batches_and_caches(fake_llm):
+    texts = ["リュック", "バッグ", "リュック", "時計"]
+    result = translations.translate_texts(texts, "en", token_budget=20)
+
+    assert result == ["EN:リュック", "EN:バッグ", "EN:リュック", "EN:時計"]
+    # Duplicates are sent once and the small budget forces several batches
+    assert sum(len(c) for c in fake_llm) == 3
+    assert len(fake_llm) > 1
+
+    fake_llm.clear()
+    assert translations.translate_texts(["時計"], "en") == ["EN:時計"]
+    assert fake_llm == []
+
+def test_split_batches_respects_budget():
+    batches = translations.split_batches(["a" * 40] * 10, token_budget=40)
+    assert all(len(b) <= 2 for b in batches)
+    assert sum(len(b) for b in batches) == 10
+
+def test_translate_pending_titles_fills_title_en(fake_llm):
+    with TestingSessionLocal() as session:
+        session.add_all([
+            Product(id="1", title="リュック 黒", price=1000.0, product_url="http://test.com/1"),
+            Product(id="2", title="Nike Air", price=2000.0, product_url="http://test.com/2"),
+        ])
+        session.commit()
+
+    assert translations.translate_pending_titles() == 2
+
+    with TestingSessionLocal() as session:
+        titles = {p.id: p.title_en for p in session.query(Product)}
+    assert titles == {"1": "EN:リュック 黒", "2": "Nike Air"}
+    # English titles never reach the LLM
+    assert fake_llm == [{0: "リュック 黒"}]
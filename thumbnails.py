@@ -0,0 +1,211 @@
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+from PIL import Image, ImageOps
+from config import get_secret
+
+# Grid thumbnails: each image URL is fetched once, resized to grid size and
+# stored under the sha256 of the resized bytes, so identical images share a
+# file. A small url -> content pointer file maps URLs to their thumbnail.
+# The cache is bounded in bytes of disk use, pointer files included. Sizes
+# and recency are kept in an in-memory LRU index, built from one directory
+# scan (ordered by mtime, which every hit touches) when the cache is opened;
+# least recently used files are evicted first.
+
+THUMBNAIL_DIR = get_secret("THUMBNAIL_DIR", ".thumbnails")
+THUMBNAIL_CACHE_BYTES = int(get_secret("THUMBNAIL_CACHE_BYTES", 200 * 1024 * 1024))
+# Bounding box in px; 3-column grid cards are ~400px wide on desktop
+THUMBNAIL_SIZE = (400, 400)
+THUMBNAIL_QUALITY = 80
+FETCH_TIMEOUT = 10
+# Seconds before a URL that failed to fetch is tried again
+FETCH_RETRY_AFTER = 300
+# Directory of local images to serve instead of fetching (tests, benchmarks)
+THUMBNAIL_SOURCE_DIR = get_secret("THUMBNAIL_SOURCE_DIR")
+
+# Fetchers take a URL and return the original image bytes
+def http_fetcher(url):
+    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as resp:
+        return resp.read()
+
+# Local stand-in: serves the file in `root` named like the URL's last path segment
+class FileFetcher:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        return (self.root / Path(urlparse(url).path).name).read_bytes()
+
+def default_fetcher():
+    return FileFetcher(THUMBNAIL_SOURCE_DIR) if THUMBNAIL_SOURCE_DIR else http_fetcher
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail(size)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+def _sha(value):
+    return hashlib.sha256(value).hexdigest()
+
+# Bytes a file occupies on disk: a 64-byte pointer still takes a whole block
+def _disk_bytes(path):
+    st = path.stat()
+    return max(st.st_size, getattr(st, "st_blocks", 0) * 512)
+
+class ThumbnailCache:
+    def __init__(self, directory=THUMBNAIL_DIR, max_bytes=THUMBNAIL_CACHE_BYTES, fetcher=None,
+                 size=THUMBNAIL_SIZE):
+        self.dir = Path(directory)
+        self.urls_dir = self.dir / "urls"
+        self.urls_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher or default_fetcher()
+        self.size = size
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        # url -> time of the last failed fetch, oldest first, so reruns don't
+        # wait on it again; entries expire after FETCH_RETRY_AFTER
+        self._failed = OrderedDict()
+        self._pool = None
+        # path -> bytes on disk for thumbnails and pointers, least recently used first
+        self._index = OrderedDict()
+        self.total_bytes = 0
+        files = []
+        for path in itertools.chain(self.dir.glob("*.jpg"), self.urls_dir.iterdir()):
+            try:
+                files.append((path.stat().st_mtime, path, _disk_bytes(path)))
+            except FileNotFoundError:
+                continue
+        for _, path, size in sorted(files, key=lambda f: f[0]):
+            self._index[path] = size
+            self.total_bytes += size
+
+    def _content_path(self, digest):
+        return self.dir / f"{digest}.jpg"
+
+    def _pointer_path(self, url):
+        return self.urls_dir / _sha(url.encode("utf-8"))
+
+    # Record `path` as most recently used, adding it to the index if new
+    def _touch(self, path, size=None):
+        with self._lock:
+            if path in self._index:
+                self._index.move_to_end(path)
+            elif size is not None:
+                self._index[path] = size
+                self.total_bytes += size
+
+    def _forget(self, path):
+        path.unlink(missing_ok=True)
+        with self._lock:
+            self.total_bytes -= self._index.pop(path, 0)
+
+    def _lookup(self, url):
+        pointer = self._pointer_path(url)
+        try:
+            path = self._content_path(pointer.read_text().strip())
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # The thumbnail was evicted; drop the pointer to it
+            self._forget(pointer)
+            return None
+        self._touch(pointer)
+        self._touch(path)
+        return path
+
+    def _store(self, thumb):
+        path = self._content_path(_sha(thumb))
+        if not path.exists():
+            tmp = path.with_suffix(f".tmp{os.getpid()}-{threading.get_ident()}")
+            tmp.write_bytes(thumb)
+            os.replace(tmp, path)
+        os.utime(path)
+        self._touch(path, _disk_bytes(path))
+        return path
+
+    # Drop least recently used files until the cache fits, keeping `keep`
+    def _evict(self, keep=()):
+        with self._lock:
+            skipped = []
+            while self.total_bytes > self.max_bytes and self._index:
+                path, size = self._index.popitem(last=False)
+                if path in keep:
+                    skipped.append((path, size))
+                    continue
+                path.unlink(missing_ok=True)
+                self.total_bytes -= size
+            for path, size in skipped:
+                self._index[path] = size
+
+    # Whether `url` failed within FETCH_RETRY_AFTER; drops expired failures
+    def _recently_failed(self, url, failed_at=None):
+        now = time.time()
+        with self._lock:
+            if failed_at is not None:
+                self._failed[url] = failed_at
+                self._failed.move_to_end(url)
+            while self._failed and now - next(iter(self._failed.values())) >= FETCH_RETRY_AFTER:
+                self._failed.popitem(last=False)
+            return url in self._failed
+
+    # Local path of the thumbnail for `url`, fetching it on a miss.
+    # None if the image cannot be fetched or decoded.
+    def get(self, url):
+        if not url:
+            return None
+        path = self._lookup(url)
+        if path:
+            return path
+        if self._recently_failed(url):
+            return None
+
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        # Concurrent sessions asking for the same URL fetch it once
+        try:
+            with url_lock:
+                path = self._lookup(url)
+                if path:
+                    return path
+                try:
+                    thumb = make_thumbnail(self.fetcher(url), self.size)
+                except Exception as e:
+                    print(f"⚠️ Thumbnail failed for {url}: {e}")
+                    self._recently_failed(url, failed_at=time.time())
+                    return None
+                path = self._store(thumb)
+                pointer = self._pointer_path(url)
+                pointer.write_text(path.stem)
+                self._touch(pointer, _disk_bytes(pointer))
+        finally:
+            with self._lock:
+                self._url_locks.pop(url, None)
+        self._evict(keep=(path, pointer))
+        return path
+
+    # Warm the cache for URLs about to be shown (e.g. the next grid page)
+    def prefetch(self, urls, workers=4):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbs")
+        for url in urls:
+            if url:
+                self._pool.submit(self.get, url)
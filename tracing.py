@@ -0,0 +1,319 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from sqlalchemy import event
+
+# Lightweight spans for finding where a slow search spent its time.
+#
+#     with tracing.span("search", term=term):
+#         ...
+#     @tracing.traced("query.get_products")
+#     def get_products(...): ...
+#
+# Spans nest through a contextvar, so children follow asyncio tasks and
+# asyncio.to_thread. Finished spans are queued and written by a daemon
+# thread as JSONL (one span per line) or OTLP/JSON (one
+# ExportTraceServiceRequest per line, as the OpenTelemetry collector's file
+# exporter writes). Root spans opened with profile=True are run under
+# cProfile (or pyinstrument, if selected and installed) for a sampled
+# fraction of requests. Disabled, span() returns a shared no-op object and
+# traced functions pay one flag check.
+
+def _env(key, default=None):
+    # config imports this module, so read the environment directly
+    return os.environ.get(key, default)
+
+TRACE_ENABLED = _env("TRACE_ENABLED", "").lower() in ("1", "true", "yes")
+TRACE_FILE = _env("TRACE_FILE", "traces.jsonl")
+# "jsonl" or "otlp"
+TRACE_FORMAT = _env("TRACE_FORMAT", "jsonl")
+# Fraction of profile=True root spans that are profiled
+PROFILE_SAMPLE_RATE = float(_env("PROFILE_SAMPLE_RATE", 0))
+# "cprofile" or "pyinstrument"
+PROFILER = _env("PROFILER", "cprofile")
+PROFILE_DIR = _env("PROFILE_DIR", "profiles")
+# SQL text longer than this is cut in span attributes
+SQL_MAX_CHARS = 500
+
+_enabled = TRACE_ENABLED
+_current = contextvars.ContextVar("tracing_current_span", default=None)
+_queue = None
+_queue_lock = threading.Lock()
+
+def enabled():
+    return _enabled
+
+def enable(path=None, fmt=None):
+    global _enabled, TRACE_FILE, TRACE_FORMAT
+    TRACE_FILE = path or TRACE_FILE
+    TRACE_FORMAT = fmt or TRACE_FORMAT
+    _enabled = True
+
+def disable():
+    global _enabled
+    flush()
+    _enabled = False
+
+# st.stop() and st.rerun() end a script run by raising these; they are
+# matched by name so tracing doesn't have to import Streamlit
+_SCRIPT_CONTROL = ("StopException", "RerunException")
+
+def _is_script_control(exc_type):
+    return exc_type.__name__ in _SCRIPT_CONTROL and exc_type.__module__.startswith("streamlit.")
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "_t0", "_token",
+                 "_profiler", "status")
+
+    def __init__(self, name, parent=None, attributes=None, profile=False):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = self._t0 = None
+        self._token = None
+        self._profiler = _start_profiler() if profile and parent is None else None
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def start(self):
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def end(self, error=None):
+        duration_ns = time.perf_counter_ns() - self._t0
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Ended in a different context than it started in
+                _current.set(None)
+            self._token = None
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        if self._profiler is not None:
+            self.attributes["profile"] = _stop_profiler(self._profiler, self.trace_id)
+        _export(self._record(duration_ns))
+
+    def _record(self, duration_ns):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": duration_ns / 1e6,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(None if exc_type is not None and _is_script_control(exc_type) else exc)
+        return False
+
+class _NoopSpan:
+    def set(self, **attributes):
+        return self
+
+    def start(self):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP = _NoopSpan()
+
+# Context manager for a child of the current span (or a new trace).
+# root=True ignores any current span, e.g. for a Streamlit rerun whose
+# previous run was stopped before its span ended.
+def span(name, root=False, profile=False, **attributes):
+    if not _enabled:
+        return NOOP
+    return Span(name, None if root else _current.get(), attributes, profile)
+
+# Started span for code that can't be wrapped in a with-block; call .end()
+def start_span(name, root=False, profile=False, **attributes):
+    if not _enabled:
+        return NOOP
+    return Span(name, None if root else _current.get(), attributes, profile).start()
+
+def current_span():
+    return _current.get()
+
+def traced(name=None):
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with Span(span_name, _current.get()):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, _current.get()):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# SQL statement timing as "sql" child spans of whatever span runs the query
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _enabled:
+            conn.info.setdefault("trace_sql_start", []).append((time.time_ns(), time.perf_counter_ns()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("trace_sql_start")
+        if not (_enabled and starts):
+            return
+        start_ns, t0 = starts.pop()
+        parent = _current.get()
+        _export({
+            "trace_id": parent.trace_id if parent else _new_id(128),
+            "span_id": _new_id(64),
+            "parent_id": parent.span_id if parent else None,
+            "name": "sql",
+            "start_ns": start_ns,
+            "duration_ms": (time.perf_counter_ns() - t0) / 1e6,
+            "status": "ok",
+            "attributes": {
+                "db.system": engine.dialect.name,
+                "db.statement": statement[:SQL_MAX_CHARS],
+                "db.executemany": executemany,
+                "db.rowcount": cursor.rowcount,
+            },
+        })
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("trace_sql_start"):
+            conn.info["trace_sql_start"].pop()
+
+def _start_profiler():
+    if not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        return None
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this thread
+        return None
+    return profiler
+
+def _stop_profiler(profiler, trace_id):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path = os.path.join(PROFILE_DIR, f"{trace_id}.prof")
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, f"{trace_id}.html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
+
+def _export(record):
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = queue.Queue()
+                threading.Thread(target=_writer, args=(_queue,), daemon=True, name="trace-writer").start()
+    _queue.put(record)
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(records, service_name="mercari-explorer"):
+    spans = []
+    for r in records:
+        end_ns = r["start_ns"] + int(r["duration_ms"] * 1e6)
+        spans.append({
+            "traceId": r["trace_id"],
+            "spanId": r["span_id"],
+            "parentSpanId": r["parent_id"] or "",
+            "name": r["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(r["start_ns"]),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in r["attributes"].items()],
+            "status": {"code": 2 if r["status"] == "error" else 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+    }]}
+
+def _writer(q):
+    while True:
+        batch = [q.get()]
+        while not q.empty() and len(batch) < 500:
+            batch.append(q.get_nowait())
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                if TRACE_FORMAT == "otlp":
+                    f.write(json.dumps(to_otlp(batch), ensure_ascii=False, default=str) + "\n")
+                else:
+                    for record in batch:
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            print(f"⚠️ Could not write traces: {e}")
+        finally:
+            for _ in batch:
+                q.task_done()
+
+# Block until every finished span is written
+def flush():
+    if _queue is not None:
+        _queue.join()
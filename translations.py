@@ -0,0 +1,129 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from config import SessionLocal, engine, get_secret
+from models import Product, Translation, ensure_schema
+from llm_agent import translate_batch, estimate_tokens, llm_available
+from ranker import is_japanese
+import llm_metrics
+
+# Input tokens packed into one translate_batch request
+TRANSLATE_BATCH_TOKENS = int(get_secret("TRANSLATE_BATCH_TOKENS", 800))
+# Concurrent translate_batch requests
+TRANSLATE_WORKERS = int(get_secret("TRANSLATE_WORKERS", 4))
+# Products read per chunk when precomputing title_en
+TRANSLATE_CHUNK_SIZE = 200
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_cached(hashes, lang, session):
+    if not hashes:
+        return {}
+    rows = session.execute(
+        select(Translation.text_hash, Translation.translated_text)
+        .where(Translation.lang == lang, Translation.text_hash.in_(hashes))
+    )
+    return dict(rows.all())
+
+def put_cached(translations, lang, session):
+    # translations: {source_text: translated_text}
+    now = datetime.now(timezone.utc)
+    for source, translated in translations.items():
+        session.merge(Translation(
+            text_hash=text_hash(source),
+            lang=lang,
+            source_text=source,
+            translated_text=translated,
+            created_at=now,
+        ))
+
+# Split texts into batches whose estimated input stays under the token budget
+def split_batches(texts, token_budget=None):
+    token_budget = token_budget or TRANSLATE_BATCH_TOKENS
+    batches, batch, used = [], [], 0
+    for t in texts:
+        cost = estimate_tokens(t) + 8  # id and JSON framing
+        if batch and used + cost > token_budget:
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(t)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _translate_one_batch(batch, dest_lang, provider):
+    try:
+        result = translate_batch(dict(enumerate(batch)), dest_lang, provider=provider)
+    except Exception as e:
+        print(f"Translation batch of {len(batch)} failed: {e}")
+        return {}
+    return {batch[i]: translated for i, translated in result.items()}
+
+# Translate many texts, serving repeats from the persistent cache.
+# Returns translations in input order; texts that could not be translated
+# come back as None.
+def translate_texts(texts, dest_lang, provider=None, token_budget=None, workers=None):
+    workers = workers or TRANSLATE_WORKERS
+    unique = list(dict.fromkeys(t for t in texts if t))
+    hashes = {t: text_hash(t) for t in unique}
+
+    # Separate sessions before and after the LLM calls, so no DB connection
+    # (on SQLite, the single writer) is held while waiting on the network
+    with SessionLocal() as session:
+        cached = get_cached(list(hashes.values()), dest_lang, session)
+    done = {t: cached[h] for t, h in hashes.items() if h in cached}
+    missing = [t for t in unique if t not in done]
+    if done:
+        llm_metrics.record_cache_hit("translate_batch", len(done))
+
+    if missing and llm_available():
+        batches = split_batches(missing, token_budget)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda b: _translate_one_batch(b, dest_lang, provider), batches)
+            fresh = {}
+            for r in results:
+                fresh.update(r)
+        if fresh:
+            with SessionLocal() as session:
+                put_cached(fresh, dest_lang, session)
+                session.commit()
+        done.update(fresh)
+
+    return [done.get(t) if t else t for t in texts]
+
+# Fill Product.title_en for rows that don't have it yet, chunk by chunk
+def translate_pending_titles(provider=None, limit=None):
+    ensure_schema(engine)
+    translated = 0
+    last_id = ""
+    while limit is None or translated < limit:
+        size = TRANSLATE_CHUNK_SIZE if limit is None else min(TRANSLATE_CHUNK_SIZE, limit - translated)
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(Product.id, Product.title)
+                .where(Product.title_en.is_(None), Product.id > last_id)
+                .order_by(Product.id)
+                .limit(size)
+            ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        # Titles that are already English are copied without an LLM call
+        japanese = [r.title for r in rows if is_japanese(r.title)]
+        by_title = dict(zip(japanese, translate_texts(japanese, "en", provider=provider)))
+        titles = [by_title.get(r.title) if is_japanese(r.title) else r.title for r in rows]
+        with SessionLocal() as session:
+            for row, title_en in zip(rows, titles):
+                if title_en:
+                    session.query(Product).filter(Product.id == row.id).update({"title_en": title_en})
+                    translated += 1
+            session.commit()
+    print(f"✅ Translated {translated} product titles.")
+    return translated
+
+if __name__ == "__main__":
+    translate_pending_titles()